@@ -0,0 +1,92 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.agent.core import Agent
+from app.agent.tool_registry import tool_registry
+
+# (provider, model, temperature, toolset)
+ClientKey = Tuple[str, str, float, Tuple[str, ...]]
+
+class LLMClientPool:
+    """
+    Shares configured Agents (chat model + tool executor) across requests so
+    their HTTP connection pools stay warm. Agents hold no per-call state, so
+    one instance can serve concurrent calls. Least recently used entries are
+    dropped once the pool is full.
+    """
+
+    def __init__(self):
+        self.max_size = int(os.getenv("LLM_CLIENT_POOL_SIZE", "32"))
+        self._clients: "OrderedDict[ClientKey, Agent]" = OrderedDict()
+        self._build_ms: Dict[ClientKey, float] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "build_ms_total": 0.0}
+
+    def _key(self, provider: str, model_name: str, temperature: float, tools_enabled: bool) -> ClientKey:
+        # Tools are bound when the executor is built, so a newly registered tool needs a new client
+        toolset = tuple(sorted(t.name for t in tool_registry.get_all_tools())) if tools_enabled else ()
+        return (provider, model_name, round(float(temperature), 3), toolset)
+
+    def get(self, provider: str = "openai", model_name: str = "gpt-3.5-turbo",
+            temperature: float = 0.7, tools_enabled: bool = False) -> Agent:
+        key = self._key(provider, model_name, temperature, tools_enabled)
+        with self._lock:
+            agent = self._clients.get(key)
+            if agent is not None:
+                self._clients.move_to_end(key)
+                self._counters["hits"] += 1
+                return agent
+            self._counters["misses"] += 1
+
+        # Build outside the lock; constructing a client can take a while
+        start = time.perf_counter()
+        agent = Agent(provider=provider, model_name=model_name, temperature=temperature, tools_enabled=tools_enabled)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self._counters["build_ms_total"] += build_ms
+            existing = self._clients.get(key)
+            if existing is not None:
+                # Lost a race with another caller; keep theirs
+                return existing
+            self._clients[key] = agent
+            self._build_ms[key] = build_ms
+            while len(self._clients) > self.max_size:
+                old_key, _ = self._clients.popitem(last=False)
+                self._build_ms.pop(old_key, None)
+                self._counters["evictions"] += 1
+        return agent
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._build_ms.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            built = self._counters["misses"] or 1
+            return {
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "hits": self._counters["hits"],
+                "misses": self._counters["misses"],
+                "evictions": self._counters["evictions"],
+                "hit_rate": round(self._counters["hits"] / lookups, 3) if lookups else None,
+                "build_ms_avg": round(self._counters["build_ms_total"] / built, 2),
+                "clients": [
+                    {
+                        "provider": key[0],
+                        "model": key[1],
+                        "temperature": key[2],
+                        "tools": list(key[3]),
+                        "build_ms": round(self._build_ms.get(key, 0.0), 2),
+                    }
+                    for key in self._clients
+                ],
+            }
+
+# Global Instance
+client_pool = LLMClientPool()
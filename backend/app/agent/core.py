@@ -1,14 +1,17 @@
-from typing import Any, Dict, List, Optional
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_core.prompts import ChatPromptTemplate
+import os
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from app.agent.providers import providers
 from app.agent.tool_registry import tool_registry
+from app.agent.response_cache import response_cache
+from app.agent.scheduler import scheduler, estimate_tokens
+from app.agent.singleflight import singleflight
+from app.agent.usage import UsageCollector, record_usage
 
 class Agent:
     def __init__(self, provider: str = "openai", model_name: str = "gpt-3.5-turbo", temperature: float = 0.7, tools_enabled: bool = False):
+        # Lets a load test run every agent (supervisor, judge, workers) offline against the fake provider
+        provider = os.getenv("LLM_PROVIDER_OVERRIDE") or provider
         self.provider = provider
         self.model_name = model_name
         self.temperature = temperature
@@ -18,45 +21,154 @@ class Agent:
         # Determine strict list of tools based on config if needed, or allow all registered
         # For now, let's enable all registered tools if tools_enabled is True
         # In future, AgentDefinition will specify exact tools
-        self.tools = [t.func for t in tool_registry.get_all_tools()] if tools_enabled else []
+        registered = tool_registry.get_all_tools() if tools_enabled else []
+        self.tools = [t.func for t in registered]
+        self.tool_names = sorted(t.name for t in registered)
         
         if self.tools_enabled:
-            # Setup ReAct / Tool Calling Agent
+            # Setup ReAct / Tool Calling Agent (langchain.agents is heavy; only load it when tools are used)
+            from langchain.agents import AgentExecutor
+            from langchain.agents.format_scratchpad.tools import format_to_tool_messages
+            from langchain.agents.output_parsers.tools import ToolsAgentOutputParser
+            from langchain_core.prompts import ChatPromptTemplate
+            from langchain_core.runnables import RunnableLambda, RunnablePassthrough
             prompt = ChatPromptTemplate.from_messages([
                 ("system", "You are a helpful AI assistant. Use the available tools to answer the user's questions if needed."),
+                ("placeholder", "{chat_history}"),
                 ("human", "{input}"),
                 ("placeholder", "{agent_scratchpad}"),
             ])
-            self.agent_runnable = create_tool_calling_agent(self.llm, self.tools, prompt)
+            self.tool_llm = self.llm.bind_tools(self.tools)
+            # What create_tool_calling_agent builds, except that the model step goes through the
+            # scheduler: a throttled step is retried on its own and tool calls are never re-run
+            self.agent_runnable = (
+                RunnablePassthrough.assign(agent_scratchpad=lambda x: format_to_tool_messages(x["intermediate_steps"]))
+                | prompt
+                | RunnableLambda(self._call_model)
+                | ToolsAgentOutputParser()
+            )
             self.executor = AgentExecutor(agent=self.agent_runnable, tools=self.tools, verbose=True)
         
     def _get_llm(self, provider: str, model_name: str, temperature: float):
-        if provider == "openai":
-            return ChatOpenAI(model=model_name, temperature=temperature)
-        elif provider == "groq":
-            return ChatGroq(model_name=model_name, temperature=temperature)
-        elif provider == "gemini":
-            return ChatGoogleGenerativeAI(model=model_name, temperature=temperature)
-        else:
-            return ChatOpenAI(model=model_name, temperature=temperature)
+        # Provider SDKs are imported on first use; see app/agent/providers.py
+        return providers.create(provider, model_name, temperature)
+
+    def _messages(self, message: str, history: List[Dict[str, str]]) -> List[BaseMessage]:
+        messages = []
+        for msg in history:
+            if msg["role"] == "user":
+                messages.append(HumanMessage(content=msg["content"]))
+            elif msg["role"] == "assistant":
+                messages.append(AIMessage(content=msg["content"]))
+            elif msg["role"] == "system":
+                messages.append(SystemMessage(content=msg["content"]))
+        messages.append(HumanMessage(content=message))
+        return messages
+
+    def cache_identity(self) -> Dict[str, Any]:
+        """Everything besides the messages that determines a completion."""
+        return {
+            "provider": self.provider,
+            "model": self.model_name,
+            "temperature": self.temperature,
+            "tools": self.tool_names,
+        }
+
+    async def chat(self, message: str, history: List[Dict[str, str]] = [], use_cache: bool = True,
+                   json_mode: bool = False, cache_if: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        json_mode asks the provider for a JSON object reply where it supports that (ignored with tools).
+        cache_if, when given, must accept a reply before it is cached, so an unusable one is never replayed.
+        """
+        identity = self.cache_identity()
+        if json_mode:
+            identity["json_mode"] = True
+        cached = await response_cache.lookup(identity, message, history, bypass=not use_cache)
+        if cached is not None:
+            return cached
+
+        async def produce() -> str:
+            response = await self._generate(message, history, json_mode)
+            if use_cache and (cache_if is None or cache_if(response)):
+                await response_cache.store(identity, message, history, response)
+            return response
+
+        # Identical calls already in flight share one upstream request. Two cache_if predicates
+        # cannot be compared, so a call with one is never coalesced with another.
+        if cache_if is None and singleflight.applies(identity):
+            key = singleflight.make_key(identity, message, history, use_cache, json_mode)
+            return await singleflight.do(key, produce)
+        return await produce()
 
-    async def chat(self, message: str, history: List[Dict[str, str]] = []) -> str:
+    async def _call_model(self, prompt: Any, config: Dict[str, Any]) -> AIMessage:
+        """One model step of the tool-calling agent, with its own scheduler slot."""
+        messages = prompt.to_messages()
+        tokens = estimate_tokens(prompt.to_string())
+
+        async def call() -> AIMessage:
+            return await self.tool_llm.ainvoke(messages, config=config)
+
+        if (config.get("metadata") or {}).get("stream"):
+            # Tokens of a streamed step are already out; it cannot be replayed
+            async with scheduler.slot(self.provider, self.model_name, tokens):
+                return await call()
+        return await scheduler.run(self.provider, self.model_name, call, tokens)
+
+    def _prompt_text(self, message: str, history: List[Dict[str, str]]) -> str:
+        return "\n".join([m["content"] for m in history] + [message])
+
+    async def _generate(self, message: str, history: List[Dict[str, str]], json_mode: bool = False) -> str:
+        collector = UsageCollector()
+        config = {"callbacks": [collector]}
         if self.tools_enabled:
-            # Use AgentExecutor
-            response = await self.executor.ainvoke({"input": message})
-            return response["output"]
+            # Use AgentExecutor. Each model step is scheduled and retried in _call_model;
+            # the loop itself is never retried, so no tool call runs twice.
+            inputs = {"input": message, "chat_history": self._messages(message, history)[:-1]}
+            response = (await self.executor.ainvoke(inputs, config=config))["output"]
         else:
             # Standard Chat
-            messages = []
-            for msg in history:
-                if msg["role"] == "user":
-                    messages.append(HumanMessage(content=msg["content"]))
-                elif msg["role"] == "assistant":
-                    messages.append(SystemMessage(content=msg["content"]))
-            messages.append(HumanMessage(content=message))
-            response = await self.llm.ainvoke(messages)
-            return response.content
-
-    def update_config(self, provider: str, model_name: str, temperature: float, tools_enabled: bool = False):
-        # Re-init if config changes
-        self.__init__(provider, model_name, temperature, tools_enabled)
+            bind = providers.json_mode(self.provider) if json_mode else {}
+            llm = self.llm.bind(**bind) if bind else self.llm
+            async def call():
+                return (await llm.ainvoke(self._messages(message, history), config=config)).content
+            tokens = estimate_tokens(message) + sum(len(m["content"]) // 4 for m in history)
+            response = await scheduler.run(self.provider, self.model_name, call, tokens)
+        record_usage(self.provider, self.model_name, collector, self._prompt_text(message, history), response)
+        return response
+
+    async def astream(self, message: str, history: List[Dict[str, str]] = []) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields {"type": "token", "data": ...} as the model generates, plus
+        tool_start / tool_end events when the tool-calling executor is used.
+        """
+        collector = UsageCollector()
+        config = {"callbacks": [collector]}
+        completion: List[str] = []
+        try:
+            if not self.tools_enabled:
+                # A stream cannot be replayed once tokens are out, so it takes a slot without retries
+                tokens = estimate_tokens(message) + sum(len(m["content"]) // 4 for m in history)
+                async with scheduler.slot(self.provider, self.model_name, tokens):
+                    async for chunk in self.llm.astream(self._messages(message, history), config=config):
+                        if isinstance(chunk.content, str) and chunk.content:
+                            completion.append(chunk.content)
+                            yield {"type": "token", "data": chunk.content}
+            else:
+                # Each model step takes its own slot, without retries (see _call_model); tools run outside it
+                config["metadata"] = {"stream": True}
+                inputs = {"input": message, "chat_history": self._messages(message, history)[:-1]}
+                async for event in self.executor.astream_events(inputs, config=config, version="v1"):
+                    kind = event["event"]
+                    if kind == "on_chat_model_stream":
+                        content = event["data"]["chunk"].content
+                        # Tool-call deltas arrive with empty (or non-text) content
+                        if isinstance(content, str) and content:
+                            completion.append(content)
+                            yield {"type": "token", "data": content}
+                    elif kind == "on_tool_start":
+                        yield {"type": "tool_start", "tool": event["name"], "input": event["data"].get("input")}
+                    elif kind == "on_tool_end":
+                        yield {"type": "tool_end", "tool": event["name"], "output": str(event["data"].get("output"))}
+        finally:
+            # Also runs when the consumer stops early and closes the stream
+            record_usage(self.provider, self.model_name, collector, self._prompt_text(message, history), "".join(completion))
@@ -0,0 +1,253 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from pydantic import PrivateAttr
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+class FakeProviderError(Exception):
+    """An injected provider failure. Carries status_code/response like the real SDK errors."""
+
+    def __init__(self, message: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = type("FakeResponse", (), {"status_code": status_code, "headers": headers})()
+
+class FakeRateLimitError(FakeProviderError):
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__("Rate limit exceeded (fake provider)", 429, retry_after)
+
+def parse_latency(spec: str) -> Tuple[str, List[float]]:
+    """ "fixed:200", "uniform:100,300", "normal:200,50" or "lognormal:200,0.5" (milliseconds)."""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] if params else []
+    if kind not in ("fixed", "uniform", "normal", "lognormal") or not values:
+        raise ValueError(f"Invalid FAKE_LLM_LATENCY: {spec}")
+    return kind, values
+
+def _words(text: str) -> List[str]:
+    # One streamed "token" per word keeps token rates easy to reason about
+    return re.findall(r"\S+\s*", text) or [text]
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model for load tests. Answers from a script of regex rules
+    (FAKE_LLM_SCRIPT), recognises supervisor and judge prompts, emits tool
+    calls when tools are bound, and injects latency, token pacing and errors
+    as configured through FAKE_LLM_* environment variables.
+    """
+
+    model_name: str = "fake"
+    temperature: float = 0.0
+
+    _rng: random.Random = PrivateAttr()
+    _lock: Any = PrivateAttr()
+    _latency: Tuple[str, List[float]] = PrivateAttr()
+    _tokens_per_sec: float = PrivateAttr()
+    _error_rate: float = PrivateAttr()
+    _rate_limit_rate: float = PrivateAttr()
+    _supervisor_steps: int = PrivateAttr()
+    _supervisor_fanout: int = PrivateAttr()
+    _rules: List[Dict[str, Any]] = PrivateAttr()
+    _calls: int = PrivateAttr(default=0)
+    _tool_calls: int = PrivateAttr(default=0)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        # Same seed, same script, same answers: runs are repeatable unless a seed is picked
+        self._rng = random.Random(int(os.getenv("FAKE_LLM_SEED", "0")))
+        self._lock = threading.Lock()
+        self._latency = parse_latency(os.getenv("FAKE_LLM_LATENCY", "fixed:0"))
+        self._tokens_per_sec = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "0"))
+        self._error_rate = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+        self._rate_limit_rate = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+        self._supervisor_steps = int(os.getenv("FAKE_LLM_SUPERVISOR_STEPS", "2"))
+        # Workers per supervisor decision; 0 delegates to the whole team, 1 is one worker per step
+        self._supervisor_fanout = int(os.getenv("FAKE_LLM_SUPERVISOR_FANOUT", "0"))
+        self._rules = []
+        script = os.getenv("FAKE_LLM_SCRIPT")
+        if script:
+            with open(script) as f:
+                self._rules = json.load(f)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    # --- Behaviour ---
+
+    def _first_token_delay(self) -> float:
+        kind, values = self._latency
+        with self._lock:
+            if kind == "fixed":
+                ms = values[0]
+            elif kind == "uniform":
+                ms = self._rng.uniform(values[0], values[-1])
+            elif kind == "normal":
+                ms = self._rng.gauss(values[0], values[1] if len(values) > 1 else 0)
+            else:
+                # Parameterised by median and sigma, which is how latency is usually quoted
+                ms = values[0] * self._rng.lognormvariate(0, values[1] if len(values) > 1 else 0.5)
+        return max(0.0, ms) / 1000
+
+    def _maybe_fail(self):
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self._rate_limit_rate:
+            raise FakeRateLimitError(retry_after=None)
+        if roll < self._rate_limit_rate + self._error_rate:
+            raise FakeProviderError("Internal server error (fake provider)", 500)
+
+    def _call_id(self) -> str:
+        with self._lock:
+            self._tool_calls += 1
+            return f"call_{self._tool_calls:012d}"
+
+    def _supervisor_decision(self, prompt: str) -> str:
+        team = re.findall(r"\(ID: ([^)]+)\)", prompt)
+        # Decisions made so far = distinct step numbers in the history (parallel workers share one)
+        rounds = len(set(re.findall(r"^Step (\d+) - Agent", prompt, flags=re.MULTILINE)))
+        if not team or rounds >= self._supervisor_steps:
+            return json.dumps({"next_agent_id": "FINISH", "instruction": f"Final answer after {rounds} steps.", "reasoning": "Enough work done."})
+
+        if "delegations" not in prompt:
+            fanout = 1 # A prompt without the parallel protocol
+        elif self._supervisor_fanout <= 0:
+            fanout = len(team)
+        else:
+            fanout = min(self._supervisor_fanout, len(team))
+        decision = {
+            "next_agent_id": team[rounds % len(team)],
+            "instruction": f"Work on step {rounds + 1} of the goal.",
+            "reasoning": "Delegating the next step.",
+        }
+        if fanout > 1:
+            decision["delegations"] = [
+                {"agent_id": team[(rounds + j) % len(team)], "instruction": f"Work on part {j + 1} of step {rounds + 1}."}
+                for j in range(fanout)
+            ]
+        return json.dumps(decision)
+
+    def _plan(self, messages: List[BaseMessage], tools: List[Dict[str, Any]]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Returns (text, tool_call) for the conversation so far."""
+        last = messages[-1] if messages else None
+        if isinstance(last, ToolMessage):
+            return f"Tool result: {last.content}", None
+
+        prompt = str(last.content) if last else ""
+        with self._lock:
+            self._calls += 1
+            call = self._calls
+        values = {"input": prompt, "input_head": prompt[:80], "model": self.model_name, "n": call}
+
+        for rule in self._rules:
+            if re.search(rule.get("match", ""), prompt, flags=re.DOTALL):
+                if rule.get("tool_call") and tools:
+                    return "", dict(rule["tool_call"], id=self._call_id())
+                return rule.get("response", "").format(**values), None
+
+        # The supervisor sends its team and protocol as a system message
+        transcript = "\n".join(str(m.content) for m in messages)
+        if "next_agent_id" in transcript:
+            return self._supervisor_decision(transcript), None
+        if "Rate the Actual Output" in prompt:
+            with self._lock:
+                score = self._rng.randint(6, 10)
+            return f"Score: {score}\nReasoning: Fake judge verdict.", None
+        if tools:
+            # Call the first bound tool once, passing the prompt as its first argument
+            function = tools[0]["function"]
+            params = function.get("parameters", {}).get("properties", {})
+            args = {next(iter(params)): prompt} if params else {}
+            return "", {"name": function["name"], "args": args, "id": self._call_id()}
+        return f"Fake response from {self.model_name} to: {values['input_head']}", None
+
+    def _usage(self, messages: List[BaseMessage], text: str) -> Dict[str, int]:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(_words(text)) if text else 1
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    def _message(self, messages: List[BaseMessage], text: str, tool_call: Optional[Dict[str, Any]]) -> AIMessage:
+        return AIMessage(
+            content=text,
+            tool_calls=[tool_call] if tool_call else [],
+            usage_metadata=self._usage(messages, text),
+            response_metadata={"model_name": self.model_name},
+        )
+
+    def _generation_time(self, text: str) -> float:
+        if self._tokens_per_sec <= 0:
+            return 0.0
+        return len(_words(text)) / self._tokens_per_sec
+
+    # --- BaseChatModel ---
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._first_token_delay())
+        self._maybe_fail()
+        text, tool_call = self._plan(messages, kwargs.get("tools") or [])
+        time.sleep(self._generation_time(text))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, text, tool_call))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._first_token_delay())
+        self._maybe_fail()
+        text, tool_call = self._plan(messages, kwargs.get("tools") or [])
+        await asyncio.sleep(self._generation_time(text))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, text, tool_call))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # Sync callers get the whole answer as one chunk; the async path paces tokens
+        result = self._generate(messages, stop, run_manager, **kwargs)
+        message = result.generations[0].message
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content=message.content,
+            tool_call_chunks=self._tool_call_chunks(message),
+            usage_metadata=message.usage_metadata,
+        ))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._first_token_delay())
+        self._maybe_fail()
+        text, tool_call = self._plan(messages, kwargs.get("tools") or [])
+        if tool_call:
+            message = self._message(messages, text, tool_call)
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="", tool_call_chunks=self._tool_call_chunks(message), usage_metadata=message.usage_metadata,
+            ))
+            return
+
+        delay = 1 / self._tokens_per_sec if self._tokens_per_sec > 0 else 0
+        words = _words(text)
+        for i, word in enumerate(words):
+            if i and delay:
+                await asyncio.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                await run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+        # Usage arrives on a final empty chunk, as with OpenAI's stream_options
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, text)))
+
+    @staticmethod
+    def _tool_call_chunks(message: AIMessage) -> List[Dict[str, Any]]:
+        return [
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+            for i, call in enumerate(message.tool_calls)
+        ]
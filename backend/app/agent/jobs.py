@@ -0,0 +1,208 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from app.agent.orchestrator import EventCallback
+
+class JobQueueFullError(Exception):
+    """Raised when the workflow job queue is at its admission limit."""
+
+# Runs one workflow, reporting progress through the callback
+WorkflowRunner = Callable[[EventCallback], Awaitable[Dict[str, Any]]]
+
+FINISHED = ("completed", "failed", "cancelled")
+
+class WorkflowJob:
+    """
+    One background workflow. Its event log keeps the newest max_events events
+    and clips string fields to max_event_chars; the full outputs are in result.
+    """
+
+    def __init__(self, kind: str, request: Dict[str, Any], max_events: int = 1000, max_event_chars: int = 2000):
+        self.id = str(uuid.uuid4())
+        self.kind = kind # sequential | parallel | dag | supervisor
+        self.request = request
+        self.status = "queued" # queued -> running -> completed | failed | cancelled
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self.published = 0 # events ever published; the next event's seq
+        self.max_event_chars = max_event_chars
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def _clip(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        clipped = {}
+        for key, value in event.items():
+            if isinstance(value, str) and len(value) > self.max_event_chars:
+                value = f"{value[:self.max_event_chars]}... [{len(value) - self.max_event_chars} more chars]"
+                clipped["truncated"] = True
+            clipped[key] = value
+        return clipped
+
+    def publish(self, event: Dict[str, Any]):
+        event = dict(self._clip(event), seq=self.published)
+        self.published += 1
+        self.events.append(event)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A follower that fell this far behind catches up from the log instead
+                self._subscribers.discard(queue)
+
+    def to_dict(self, include_events: bool = False) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "events": self.published,
+            "events_dropped": self.published - len(self.events),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if include_events:
+            data["events"] = list(self.events)
+        return data
+
+class WorkflowJobQueue:
+    """
+    Runs agent workflows as background jobs so a long supervisor run doesn't
+    hold an HTTP connection open. At most max_concurrency workflows run at
+    once and at most max_queue_depth are admitted; finished jobs are kept
+    for job_ttl seconds for polling.
+    """
+
+    def __init__(self):
+        self.max_concurrency = int(os.getenv("WORKFLOW_MAX_CONCURRENCY", "4"))
+        self.max_queue_depth = int(os.getenv("WORKFLOW_MAX_QUEUE_DEPTH", "64"))
+        self.job_ttl = float(os.getenv("WORKFLOW_JOB_TTL", "3600"))
+        self.max_job_events = int(os.getenv("WORKFLOW_MAX_JOB_EVENTS", "1000"))
+        self.max_event_chars = int(os.getenv("WORKFLOW_EVENT_MAX_CHARS", "2000"))
+        self.subscriber_queue_size = int(os.getenv("WORKFLOW_SUBSCRIBER_QUEUE_SIZE", "256"))
+
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._pending = 0 # queued + running
+        self._running = 0
+        self._rejected = 0
+        self._jobs: Dict[str, WorkflowJob] = {}
+        # job id -> finished_at, oldest first, so pruning only looks at what has expired
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+
+    def submit(self, kind: str, request: Dict[str, Any], runner: WorkflowRunner) -> WorkflowJob:
+        """Queues a workflow and returns immediately; poll with get() or follow events()."""
+        self._prune()
+        if self._pending >= self.max_queue_depth:
+            self._rejected += 1
+            raise JobQueueFullError(f"Workflow queue is full ({self._pending} pending)")
+        self._pending += 1
+
+        job = WorkflowJob(kind, request, self.max_job_events, self.max_event_chars)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run_job(job, runner))
+        # A done callback rather than try/finally, so a job cancelled before it ever ran is accounted for too
+        job.task.add_done_callback(lambda task: self._finish(job, task))
+        return job
+
+    async def _run_job(self, job: WorkflowJob, runner: WorkflowRunner) -> Dict[str, Any]:
+        async with self._slots:
+            self._running += 1
+            job.status = "running"
+            job.started_at = time.time()
+            job.publish({"type": "job_started", "timestamp": job.started_at})
+            try:
+                return await runner(job.publish)
+            finally:
+                self._running -= 1
+
+    def _finish(self, job: WorkflowJob, task: asyncio.Task):
+        if task.cancelled():
+            job.status = "cancelled"
+        elif task.exception() is not None:
+            job.status = "failed"
+            job.error = str(task.exception())
+        else:
+            job.result = task.result()
+            job.status = "completed"
+        job.finished_at = time.time()
+        self._finished[job.id] = job.finished_at
+        self._pending -= 1
+        job.publish({"type": "job_finished", "timestamp": job.finished_at, "status": job.status, "error": job.error})
+
+    def get(self, job_id: str) -> Optional[WorkflowJob]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[WorkflowJob]:
+        """Cancels a queued or running job; in-flight LLM calls are cancelled with it."""
+        job = self.get(job_id)
+        if job and job.status not in FINISHED and job.task:
+            job.task.cancel()
+        return job
+
+    async def events(self, job: WorkflowJob) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Replays the job's events so far, then follows it live until it finishes.
+        A follower whose queue fills up is unsubscribed by publish(); it then
+        catches up from the event log and subscribes again.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        last_seq = -1
+        try:
+            while True:
+                # Snapshot and subscribe without an await in between, so no event is missed or repeated
+                backlog = [event for event in job.events if event["seq"] > last_seq]
+                finished = job.status in FINISHED
+                if not finished:
+                    job._subscribers.add(queue)
+                for event in backlog:
+                    yield event
+                    last_seq = event["seq"]
+                while not finished:
+                    if queue.empty() and queue not in job._subscribers:
+                        break
+                    event = await queue.get()
+                    if event["seq"] > last_seq:
+                        yield event
+                        last_seq = event["seq"]
+                    finished = event["type"] == "job_finished"
+                if finished:
+                    return
+        finally:
+            job._subscribers.discard(queue)
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        while self._finished:
+            jid, finished_at = next(iter(self._finished.items()))
+            if finished_at >= cutoff:
+                break
+            del self._finished[jid]
+            del self._jobs[jid]
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune()
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "pending": self._pending,
+            "running": self._running,
+            "rejected": self._rejected,
+            "retained": statuses,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_depth": self.max_queue_depth,
+            "job_ttl": self.job_ttl,
+        }
+
+# Global Instance
+workflow_jobs = WorkflowJobQueue()
@@ -1,29 +1,121 @@
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional
 from app.agent.registry import registry, AgentDefinition
 from app.agent.core import Agent
+from app.agent.client_pool import client_pool
+from app.observability.tracer import tracer
 import asyncio
+import re
+import time
 
 class WorkflowStep:
-    def __init__(self, agent_id: str, instruction: str):
+    def __init__(self, agent_id: str, instruction: str, timeout: Optional[float] = None):
         self.agent_id = agent_id
         self.instruction = instruction
+        self.timeout = timeout # seconds; None falls back to the workflow's step_timeout
+
+class DagNode:
+    def __init__(self, id: str, agent_id: str, instruction: str,
+                 depends_on: Optional[List[str]] = None, input_template: Optional[str] = None):
+        self.id = id
+        self.agent_id = agent_id
+        self.instruction = instruction
+        self.depends_on = depends_on or []
+        # "{input}" is the workflow input, "{<node id>}" a dependency's output
+        self.input_template = input_template
+
+class InvalidWorkflowError(ValueError):
+    pass
+
+# Receives progress events ({"type": "step_started" | "step_finished" | ..., ...}) while a workflow runs
+EventCallback = Callable[[Dict[str, Any]], None]
+
+def emit_event(on_event: Optional[EventCallback], event_type: str, **fields):
+    if on_event is not None:
+        on_event({"type": event_type, "timestamp": time.time(), **fields})
+
+def span_usage(span) -> Dict[str, Any]:
+    """Token usage the LLM call recorded on its span (absent for cache hits)."""
+    return {key: span.attributes.get(key) for key in ("prompt_tokens", "completion_tokens", "cost_usd")}
+
+PARALLEL_MODES = ("all", "first_k", "quorum")
+
+def normalize_answer(text: str) -> str:
+    """Voting key: case, whitespace and trailing punctuation don't split votes."""
+    return " ".join(text.lower().split()).strip(" .!")
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z0-9_\-]+)\}")
+
+def topological_order(nodes: List[DagNode]) -> List[str]:
+    """Node ids in dependency order; raises InvalidWorkflowError for unknown ids or cycles."""
+    if not nodes:
+        raise InvalidWorkflowError("Workflow has no nodes")
+    by_id: Dict[str, DagNode] = {}
+    for node in nodes:
+        if node.id in by_id or node.id == "input":
+            raise InvalidWorkflowError(f"Duplicate or reserved node id: {node.id}")
+        by_id[node.id] = node
+
+    pending = {}
+    for node in nodes:
+        for dep in node.depends_on:
+            if dep not in by_id:
+                raise InvalidWorkflowError(f"Node {node.id} depends on unknown node {dep}")
+        pending[node.id] = len(set(node.depends_on))
+
+    order = []
+    ready = [n.id for n in nodes if pending[n.id] == 0]
+    while ready:
+        node_id = ready.pop(0)
+        order.append(node_id)
+        for node in nodes:
+            if node_id in node.depends_on:
+                pending[node.id] -= 1
+                if pending[node.id] == 0:
+                    ready.append(node.id)
+    if len(order) != len(nodes):
+        cycle = sorted(set(by_id) - set(order))
+        raise InvalidWorkflowError(f"Workflow has a dependency cycle among: {', '.join(cycle)}")
+    return order
+
+def critical_path(nodes: List[DagNode], order: List[str], timings: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    The dependency chain with the largest summed run time; the workflow
+    cannot finish faster than this however much concurrency is allowed.
+    """
+    by_id = {n.id: n for n in nodes}
+    finish: Dict[str, float] = {}
+    via: Dict[str, Optional[str]] = {}
+    for node_id in order:
+        deps = by_id[node_id].depends_on
+        prev = max(deps, key=lambda d: finish[d]) if deps else None
+        via[node_id] = prev
+        finish[node_id] = (finish[prev] if prev else 0.0) + timings.get(node_id, {}).get("duration_ms", 0.0)
+
+    if not finish:
+        return {"nodes": [], "duration_ms": 0.0}
+    node_id = max(finish, key=finish.get)
+    path = []
+    while node_id:
+        path.append(node_id)
+        node_id = via[node_id]
+    end = path[0]
+    return {"nodes": list(reversed(path)), "duration_ms": round(finish[end], 2)}
 
 class Orchestrator:
     def __init__(self):
         self.active_agents: Dict[str, Agent] = {}
 
     def _get_or_create_agent(self, agent_def: AgentDefinition) -> Agent:
-        # In a real system, we might cache these or manage lifecycle better
-        # For now, we instantiate a new core Agent for each execution to ensure fresh state or we could cache.
-        # Let's instantiate fresh for simplicity and state safety.
-        return Agent(
-            provider=agent_def.provider, 
-            model_name=agent_def.model, 
+        # Agents keep no per-call state, so steps share pooled clients
+        return client_pool.get(
+            provider=agent_def.provider,
+            model_name=agent_def.model,
             temperature=agent_def.temperature,
             tools_enabled=(len(agent_def.tools) > 0)
         )
 
-    async def run_sequential(self, steps: List[WorkflowStep], initial_input: str) -> Dict[str, Any]:
+    async def run_sequential(self, steps: List[WorkflowStep], initial_input: str,
+                             on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
         """
         Executes a linear chain of agents. 
         Each agent's output becomes the context/input for the next, 
@@ -31,6 +123,7 @@ class Orchestrator:
         """
         results = []
         current_input = initial_input
+        root_span = tracer.start_trace("sequential_workflow")
         
         for i, step in enumerate(steps):
             agent_def = registry.get_agent(step.agent_id)
@@ -43,7 +136,18 @@ class Orchestrator:
             combined_prompt = f"{step.instruction}\n\nInput Context:\n{current_input}"
             
             print(f"--- Running Step {i+1}: {agent_def.name} ({agent_def.role}) ---")
-            response = await agent_instance.chat(combined_prompt)
+            emit_event(on_event, "step_started", step=i + 1, agent=agent_def.name)
+            span = tracer.start_span(f"step:{i + 1}", root_span.trace_id, root_span.id)
+            try:
+                with tracer.activate(span):
+                    response = await agent_instance.chat(combined_prompt)
+            except Exception as e:
+                emit_event(on_event, "step_finished", step=i + 1, agent=agent_def.name, status="failed", error=str(e))
+                raise
+            finally:
+                span.end()
+            emit_event(on_event, "step_finished", step=i + 1, agent=agent_def.name, status="completed", output=response,
+                       duration_ms=round((span.end_time - span.start_time) * 1000, 2), **span_usage(span))
             
             results.append({
                 "step": i + 1,
@@ -54,41 +158,263 @@ class Orchestrator:
             # Pass output to next agent
             current_input = response
             
+        root_span.end()
         return {
             "final_output": current_input,
-            "trace": results
+            "trace": results,
+            "trace_id": root_span.trace_id
         }
 
-    async def run_parallel(self, steps: List[WorkflowStep], initial_input: str) -> Dict[str, Any]:
+    async def run_parallel(self, steps: List[WorkflowStep], initial_input: str,
+                           step_timeout: Optional[float] = None, max_concurrency: Optional[int] = None,
+                           mode: str = "all", k: int = 1, quorum: Optional[int] = None,
+                           on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
         """
         Executes multiple agents in parallel with the same input.
         Useful for brainstorming, voting, or multi-perspective analysis.
+
+        A step that fails or exceeds its timeout is reported with its error
+        instead of failing the whole request. mode="first_k" returns once k
+        steps have succeeded; mode="quorum" once `quorum` steps (default: a
+        majority) agree on the same answer. Calls still running at that point
+        are cancelled, so their tokens are not spent.
         """
-        tasks = []
+        if mode not in PARALLEL_MODES:
+            raise InvalidWorkflowError(f"Unknown parallel mode: {mode}")
+        if not steps:
+            raise InvalidWorkflowError("Workflow has no steps")
+        needed = {"all": len(steps), "first_k": k, "quorum": quorum if quorum is not None else len(steps) // 2 + 1}[mode]
+        if not 1 <= needed <= len(steps):
+            raise InvalidWorkflowError(f"{mode} needs between 1 and {len(steps)} answers, got {needed}")
+
+        calls = []
         for step in steps:
             agent_def = registry.get_agent(step.agent_id)
             if not agent_def:
                 raise ValueError(f"Agent {step.agent_id} not found.")
-            
-            agent_instance = self._get_or_create_agent(agent_def)
+            calls.append((agent_def, self._get_or_create_agent(agent_def)))
+
+        root_span = tracer.start_trace("parallel_workflow")
+        root_span.set_attribute("mode", mode)
+        semaphore = asyncio.Semaphore(max_concurrency or len(steps))
+        started = time.perf_counter()
+        results: List[Dict[str, Any]] = [
+            {"step": "parallel", "agent": step.agent_id, "output": None, "status": "cancelled"} for step in steps
+        ]
+
+        async def run_step(i: int) -> Optional[str]:
+            step, (agent_def, agent) = steps[i], calls[i]
+            timeout = step.timeout if step.timeout is not None else step_timeout
             combined_prompt = f"{step.instruction}\n\nInput Context:\n{initial_input}"
-            tasks.append(agent_instance.chat(combined_prompt))
-            
+            async with semaphore:
+                step_started = time.perf_counter()
+                span = tracer.start_span(f"step:{i}", root_span.trace_id, root_span.id)
+                span.set_attribute("agent", agent_def.name)
+                emit_event(on_event, "step_started", step=i, agent=agent_def.name)
+                try:
+                    with tracer.activate(span):
+                        output = await asyncio.wait_for(agent.chat(combined_prompt), timeout)
+                    results[i].update(output=output, status="completed")
+                    return output
+                except asyncio.TimeoutError:
+                    results[i].update(status="timeout", error=f"Step exceeded {timeout}s")
+                except asyncio.CancelledError:
+                    emit_event(on_event, "step_finished", step=i, agent=agent_def.name, status="cancelled")
+                    raise
+                except Exception as e:
+                    results[i].update(status="failed", error=str(e))
+                finally:
+                    results[i]["duration_ms"] = round((time.perf_counter() - step_started) * 1000, 2)
+                    span.set_attribute("status", results[i]["status"])
+                    span.end()
+                    if results[i]["status"] != "cancelled":
+                        emit_event(on_event, "step_finished", step=i, agent=agent_def.name, **{
+                            key: results[i].get(key) for key in ("status", "output", "error", "duration_ms")
+                        }, **span_usage(span))
+            return None
+
         # Run all
-        print(f"--- Running {len(tasks)} Parallel Steps ---")
-        outputs = await asyncio.gather(*tasks)
-        
+        print(f"--- Running {len(steps)} Parallel Steps ({mode}) ---")
+        tasks = {asyncio.create_task(run_step(i)): i for i in range(len(steps))}
+        pending = set(tasks)
+        votes: Dict[str, List[int]] = {}
+        answer_step: Optional[int] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    output = task.result()
+                    if output is not None:
+                        votes.setdefault(normalize_answer(output), []).append(tasks[task])
+                succeeded = sum(len(v) for v in votes.values())
+                if mode == "first_k" and succeeded >= needed:
+                    break
+                if mode == "quorum":
+                    best = max(votes.values(), key=len, default=[])
+                    if len(best) >= needed:
+                        answer_step = best[0]
+                        break
+                    # Nothing can reach quorum any more
+                    if len(best) + len(pending) < needed:
+                        break
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+        counts = {}
+        for r in results:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        succeeded = counts.get("completed", 0)
+        root_span.set_attribute("statuses", counts)
+        root_span.end()
+
+        result = {
+            "mode": "parallel",
+            "strategy": mode,
+            "trace_id": root_span.trace_id,
+            "status": "completed" if (answer_step is not None if mode == "quorum" else succeeded >= needed) else ("partial" if succeeded else "failed"),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            "counts": counts,
+            "results": results,
+        }
+        if mode == "quorum":
+            result["quorum"] = needed
+            result["votes"] = {answer: len(idx) for answer, idx in votes.items()}
+            result["final_output"] = results[answer_step]["output"] if answer_step is not None else None
+        return result
+
+    def _render_dag_prompt(self, node: DagNode, initial_input: str, outputs: Dict[str, str]) -> str:
+        values = dict(outputs, input=initial_input)
+        if node.input_template is not None:
+            # Unknown placeholders are left alone so literal braces in templates survive
+            context = _PLACEHOLDER.sub(lambda m: values.get(m.group(1), m.group(0)), node.input_template)
+        elif not node.depends_on:
+            context = initial_input
+        elif len(node.depends_on) == 1:
+            context = outputs[node.depends_on[0]]
+        else:
+            context = "\n\n".join(f"[{dep}]\n{outputs[dep]}" for dep in node.depends_on)
+        return f"{node.instruction}\n\nInput Context:\n{context}"
+
+    async def run_dag(self, nodes: List[DagNode], initial_input: str,
+                      max_concurrency: int = 4, output_node: Optional[str] = None,
+                      on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
+        """
+        Executes a dependency graph of agents. Each node starts as soon as
+        all of its dependencies have finished, with at most max_concurrency
+        agent calls in flight. A failed node skips everything downstream of
+        it; independent branches keep running.
+        """
+        order = topological_order(nodes)
+        if output_node is not None and output_node not in order:
+            raise InvalidWorkflowError(f"Unknown output node: {output_node}")
+        agents = {}
+        for node in nodes:
+            agent_def = registry.get_agent(node.agent_id)
+            if not agent_def:
+                raise ValueError(f"Agent {node.agent_id} not found in registry.")
+            agents[node.id] = (agent_def, self._get_or_create_agent(agent_def))
+
+        root_span = tracer.start_trace("dag_workflow")
+        root_span.set_attribute("nodes", len(nodes))
+        root_span.set_attribute("max_concurrency", max_concurrency)
+
+        by_id = {n.id: n for n in nodes}
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        outputs: Dict[str, str] = {}
+        timings: Dict[str, Dict[str, Any]] = {}
+        started = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        def elapsed_ms() -> float:
+            return round((time.perf_counter() - started) * 1000, 2)
+
+        async def run_node(node: DagNode):
+            deps = [tasks[d] for d in node.depends_on]
+            if deps:
+                await asyncio.gather(*deps)
+            failed = [d for d in node.depends_on if timings[d]["status"] != "completed"]
+            ready_ms = elapsed_ms()
+            if failed:
+                timings[node.id] = {"status": "skipped", "reason": f"dependency failed: {', '.join(failed)}", "ready_ms": ready_ms}
+                emit_event(on_event, "step_finished", node=node.id, status="skipped", error=timings[node.id]["reason"])
+                return
+
+            agent_def, agent = agents[node.id]
+            async with semaphore:
+                start_ms = elapsed_ms()
+                span = tracer.start_span(f"node:{node.id}", root_span.trace_id, root_span.id)
+                span.set_attribute("agent", agent_def.name)
+                print(f"--- Running DAG Node {node.id}: {agent_def.name} ({agent_def.role}) ---")
+                emit_event(on_event, "step_started", node=node.id, agent=agent_def.name)
+                try:
+                    with tracer.activate(span):
+                        outputs[node.id] = await agent.chat(self._render_dag_prompt(node, initial_input, outputs))
+                    status, error = "completed", None
+                except Exception as e:
+                    status, error = "failed", str(e)
+                    span.set_attribute("error", error)
+                finally:
+                    span.end()
+                end_ms = elapsed_ms()
+
+            timings[node.id] = {
+                "status": status,
+                "ready_ms": ready_ms,
+                "start_ms": start_ms,
+                "end_ms": end_ms,
+                # Time spent waiting for a concurrency slot after the inputs were ready
+                "queued_ms": round(start_ms - ready_ms, 2),
+                "duration_ms": round(end_ms - start_ms, 2),
+            }
+            if error:
+                timings[node.id]["error"] = error
+            emit_event(on_event, "step_finished", node=node.id, agent=agent_def.name, status=status, output=outputs.get(node.id),
+                       error=error, duration_ms=timings[node.id]["duration_ms"], **span_usage(span))
+
+        # Created in dependency order, so every node finds its dependencies' tasks
+        for node_id in order:
+            tasks[node_id] = asyncio.create_task(run_node(by_id[node_id]))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        wall_ms = elapsed_ms()
+
+        # Default to the last-declared node that nothing depends on
+        sinks = [n.id for n in nodes if not any(n.id in other.depends_on for other in nodes)]
+        output_node = output_node or sinks[-1]
+        path = critical_path(nodes, order, timings)
+        root_span.set_attribute("critical_path", path["nodes"])
+        root_span.end()
+
         results = []
-        for i, output in enumerate(outputs):
+        for node_id in order:
+            node = by_id[node_id]
             results.append({
-                "step": "parallel",
-                "agent": steps[i].agent_id, 
-                "output": output
+                "node": node_id,
+                "agent": agents[node_id][0].name,
+                "depends_on": node.depends_on,
+                "output": outputs.get(node_id),
+                **timings[node_id],
             })
-            
+
         return {
-            "mode": "parallel",
-            "results": results
+            "mode": "dag",
+            "trace_id": root_span.trace_id,
+            "status": "completed" if len(outputs) == len(nodes) else "partial",
+            "final_output": outputs.get(output_node),
+            "output_node": output_node,
+            "results": results,
+            "timing": {
+                "wall_ms": wall_ms,
+                # What running every node one after another would have cost
+                "serial_ms": round(sum(t.get("duration_ms", 0.0) for t in timings.values()), 2),
+                "critical_path": path,
+            },
         }
 
 # Global Orchestrator
@@ -0,0 +1,94 @@
+import os
+import importlib
+from typing import Any, Callable, Dict, List, Optional
+
+# (model_name, temperature) -> LangChain chat model
+ProviderFactory = Callable[[str, float], Any]
+
+ENTRY_POINT_GROUP = "aio_sandbox.llm_providers"
+
+# Built-ins import their SDK inside the factory, so only providers actually used are loaded.
+# Retries are owned by the scheduler so it sees every 429.
+
+def _openai(model_name: str, temperature: float):
+    from langchain_openai import ChatOpenAI
+    # stream_usage makes streamed responses report token usage too
+    return ChatOpenAI(model=model_name, temperature=temperature, max_retries=0, stream_usage=True)
+
+def _groq(model_name: str, temperature: float):
+    from langchain_groq import ChatGroq
+    return ChatGroq(model_name=model_name, temperature=temperature, max_retries=0)
+
+def _gemini(model_name: str, temperature: float):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model_name, temperature=temperature, max_retries=0)
+
+def _fake(model_name: str, temperature: float):
+    # Offline provider for load tests; see FAKE_LLM_* settings
+    from app.agent.fake_llm import FakeChatModel
+    return FakeChatModel(model_name=model_name, temperature=temperature)
+
+class ProviderRegistry:
+    """
+    Maps provider names to chat model factories. Third-party providers are
+    found through the "aio_sandbox.llm_providers" entry point group or
+    LLM_PROVIDER_PLUGINS ("name=package.module:factory,..."), and are only
+    imported the first time they are asked for.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, ProviderFactory] = {}
+        self._json_modes: Dict[str, Dict[str, Any]] = {} # name -> kwargs to bind for JSON-only replies
+        self._lazy: Dict[str, str] = {} # name -> "module:attr", not imported yet
+        self._discovered = False
+
+    def register(self, name: str, factory: ProviderFactory, json_mode: Optional[Dict[str, Any]] = None):
+        self._factories[name] = factory
+        if json_mode is not None:
+            self._json_modes[name] = json_mode
+
+    def register_lazy(self, name: str, target: str):
+        self._lazy[name] = target
+
+    def _discover(self):
+        if self._discovered:
+            return
+        self._discovered = True
+        # importlib.metadata alone costs tens of ms; only pay it when a non-built-in provider is asked for
+        from importlib.metadata import entry_points
+        for spec in filter(None, os.getenv("LLM_PROVIDER_PLUGINS", "").split(",")):
+            name, _, target = spec.strip().partition("=")
+            self._lazy.setdefault(name, target)
+        for ep in entry_points(group=ENTRY_POINT_GROUP):
+            self._lazy.setdefault(ep.name, ep.value)
+
+    def _resolve(self, name: str) -> ProviderFactory:
+        if name in self._factories:
+            return self._factories[name]
+        self._discover()
+        if name not in self._lazy:
+            raise ValueError(f"Unknown LLM provider: {name}")
+        module, _, attr = self._lazy.pop(name).partition(":")
+        factory = getattr(importlib.import_module(module), attr)
+        # Plugins opt into JSON mode with a `json_mode` attribute on the factory
+        self.register(name, factory, getattr(factory, "json_mode", None))
+        return factory
+
+    def create(self, name: str, model_name: str, temperature: float):
+        return self._resolve(name)(model_name, temperature)
+
+    def json_mode(self, name: str) -> Dict[str, Any]:
+        """Bind kwargs that make the provider reply with a JSON object; empty if it has no such mode."""
+        self._resolve(name)
+        return self._json_modes.get(name, {})
+
+    def list_providers(self) -> List[str]:
+        self._discover()
+        return sorted(set(self._factories) | set(self._lazy))
+
+# Global Instance
+providers = ProviderRegistry()
+providers.register("openai", _openai, json_mode={"response_format": {"type": "json_object"}})
+providers.register("groq", _groq, json_mode={"response_format": {"type": "json_object"}})
+providers.register("gemini", _gemini)
+providers.register("fake", _fake)
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+class ResponseCache:
+    """
+    Cache for LLM completions, consulted by Agent.chat.
+    Exact tier: keyed by a hash of provider, model, temperature, tools and messages.
+    Semantic tier (optional): within the same provider/model/tools/history scope,
+    reuses the answer to a prompt whose embedding is close enough to this one.
+    Only low-temperature calls are cached; sampled outputs are meant to vary.
+    Tool-calling runs are not cached unless LLM_CACHE_TOOLS is set: their answer
+    depends on what the tools returned, and a hit would skip the tool calls.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.max_temperature = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.0"))
+        self.cache_tools = os.getenv("LLM_CACHE_TOOLS", "false").lower() in ("1", "true", "yes")
+        self.ttl = float(os.getenv("LLM_CACHE_TTL", "3600"))
+        self.max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+        self.semantic = os.getenv("LLM_CACHE_SEMANTIC", "false").lower() in ("1", "true", "yes")
+        self.similarity = float(os.getenv("LLM_CACHE_SIMILARITY", "0.95"))
+        self.max_semantic_entries = int(os.getenv("LLM_CACHE_SEMANTIC_MAX_ENTRIES", "256"))
+
+        # key -> (expires_at, response)
+        self._exact: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # scope -> [(expires_at, unit embedding, prompt, response)]; oldest first
+        self._semantic: "OrderedDict[str, List[Tuple[float, Any, str, str]]]" = OrderedDict()
+        self._semantic_count = 0
+        self._embedding_fn = None
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def _hash(material: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _keys(self, identity: Dict[str, Any], message: str, history: List[Dict[str, str]]) -> Tuple[str, str]:
+        scope = self._hash({**identity, "history": history})
+        return self._hash({"scope": scope, "message": message}), scope
+
+    def cacheable(self, identity: Dict[str, Any]) -> bool:
+        if identity.get("tools") and not self.cache_tools:
+            return False
+        return self.enabled and identity["temperature"] <= self.max_temperature
+
+    def _embed(self, text: str):
+        import numpy as np
+        if self._embedding_fn is None:
+            # Reuse the model already loaded for the vector store instead of loading a second one
+            from app.memory.vector_db import vector_store
+            self._embedding_fn = vector_store.embedding_fn
+        vector = np.asarray(self._embedding_fn([text])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _record(self, counter: str, outcome: str, **attributes):
+        from app.observability.tracer import tracer
+        with self._lock:
+            self._counters[counter] += 1
+        span = tracer.current_span()
+        if span is not None:
+            span.set_attribute("cache", outcome)
+            for key, value in attributes.items():
+                span.set_attribute(f"cache_{key}", value)
+
+    async def lookup(self, identity: Dict[str, Any], message: str, history: List[Dict[str, str]], bypass: bool = False) -> Optional[str]:
+        if bypass or not self.cacheable(identity):
+            self._record("bypassed", "bypass")
+            return None
+
+        key, scope = self._keys(identity, message, history)
+        now = time.time()
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry and entry[0] > now:
+                self._exact.move_to_end(key)
+                hit = entry[1]
+            else:
+                hit = None
+                if entry:
+                    del self._exact[key]
+        if hit is not None:
+            self._record("exact_hits", "exact")
+            return hit
+
+        if self.semantic:
+            match = await self._semantic_lookup(scope, message, now)
+            if match is not None:
+                response, score = match
+                self._record("semantic_hits", "semantic", similarity=round(score, 4))
+                return response
+
+        self._record("misses", "miss")
+        return None
+
+    async def _semantic_lookup(self, scope: str, message: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            candidates = [e for e in self._semantic.get(scope, []) if e[0] > now]
+        if not candidates:
+            return None
+        import numpy as np
+        # Embedding runs a local model; keep it off the event loop
+        query = await asyncio.to_thread(self._embed, message)
+        scores = np.stack([e[1] for e in candidates]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity:
+            return candidates[best][3], float(scores[best])
+        return None
+
+    async def store(self, identity: Dict[str, Any], message: str, history: List[Dict[str, str]], response: str):
+        if not self.cacheable(identity):
+            return
+        key, scope = self._keys(identity, message, history)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._exact[key] = (expires_at, response)
+            self._exact.move_to_end(key)
+            self._counters["stores"] += 1
+            while len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+                self._counters["evictions"] += 1
+
+        if self.semantic:
+            vector = await asyncio.to_thread(self._embed, message)
+            with self._lock:
+                self._semantic.setdefault(scope, []).append((expires_at, vector, message, response))
+                self._semantic.move_to_end(scope)
+                self._semantic_count += 1
+                # Drop the oldest entry of the least recently written scope
+                while self._semantic_count > self.max_semantic_entries:
+                    oldest_scope, entries = next(iter(self._semantic.items()))
+                    entries.pop(0)
+                    self._semantic_count -= 1
+                    if not entries:
+                        del self._semantic[oldest_scope]
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._semantic.clear()
+            self._semantic_count = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["exact_hits"] + self._counters["semantic_hits"] + self._counters["misses"]
+            hits = self._counters["exact_hits"] + self._counters["semantic_hits"]
+            return {
+                "enabled": self.enabled,
+                "semantic": self.semantic,
+                "max_temperature": self.max_temperature,
+                "cache_tools": self.cache_tools,
+                "ttl": self.ttl,
+                "exact_entries": len(self._exact),
+                "semantic_entries": self._semantic_count,
+                "hit_rate": round(hits / lookups, 3) if lookups else None,
+                **self._counters,
+            }
+
+# Global Instance
+response_cache = ResponseCache()
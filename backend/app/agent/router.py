@@ -1,8 +1,11 @@
+import json
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional
 from app.agent.registry import registry, AgentDefinition
-from app.agent.orchestrator import orchestrator, WorkflowStep
+from app.agent.orchestrator import orchestrator, WorkflowStep, DagNode, InvalidWorkflowError, topological_order
+from app.agent.jobs import workflow_jobs, JobQueueFullError, WorkflowRunner, FINISHED
 
 router = APIRouter(prefix="/agents", tags=["agents"])
 
@@ -10,6 +13,15 @@ class RunWorkflowRequest(BaseModel):
     steps: List[Dict[str, str]] # [{'agent_id': '...', 'instruction': '...'}]
     initial_input: str
 
+class ParallelWorkflowRequest(BaseModel):
+    steps: List[Dict[str, Any]] # [{'agent_id': '...', 'instruction': '...', 'timeout': 30}]
+    initial_input: str
+    step_timeout: Optional[float] = Field(None, gt=0) # seconds, for steps without their own timeout
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    mode: Literal["all", "first_k", "quorum"] = "all"
+    k: int = Field(1, ge=1) # first_k: successful answers to wait for
+    quorum: Optional[int] = Field(None, ge=1) # quorum: matching answers needed, default a majority
+
 @router.post("/register")
 def register_agent(agent: AgentDefinition):
     agent_id = registry.register_agent(agent)
@@ -36,14 +48,49 @@ async def run_sequential_workflow(request: RunWorkflowRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/workflow/parallel")
-async def run_parallel_workflow(request: RunWorkflowRequest):
+async def run_parallel_workflow(request: ParallelWorkflowRequest):
     try:
         workflow_steps = [
-            WorkflowStep(agent_id=step['agent_id'], instruction=step['instruction']) 
+            WorkflowStep(agent_id=step['agent_id'], instruction=step['instruction'], timeout=step.get('timeout'))
             for step in request.steps
         ]
-        result = await orchestrator.run_parallel(workflow_steps, request.initial_input)
+        result = await orchestrator.run_parallel(
+            workflow_steps, request.initial_input,
+            step_timeout=request.step_timeout, max_concurrency=request.max_concurrency,
+            mode=request.mode, k=request.k, quorum=request.quorum,
+        )
         return result
+    except InvalidWorkflowError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class DagNodeRequest(BaseModel):
+    id: str
+    agent_id: str
+    instruction: str
+    depends_on: List[str] = []
+    input_template: Optional[str] = None # e.g. "Draft:\n{draft}\n\nCritique:\n{critique}"
+
+class DagWorkflowRequest(BaseModel):
+    nodes: List[DagNodeRequest]
+    initial_input: str = ""
+    max_concurrency: int = Field(4, ge=1, le=64)
+    output_node: Optional[str] = None # Defaults to the last node nothing depends on
+
+@router.post("/workflow/dag")
+async def run_dag_workflow(request: DagWorkflowRequest):
+    try:
+        nodes = [
+            DagNode(id=n.id, agent_id=n.agent_id, instruction=n.instruction,
+                    depends_on=n.depends_on, input_template=n.input_template)
+            for n in request.nodes
+        ]
+        return await orchestrator.run_dag(nodes, request.initial_input, request.max_concurrency, request.output_node)
+    except InvalidWorkflowError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -59,3 +106,88 @@ class SupervisorRequest(BaseModel):
 async def run_supervisor_workflow(request: SupervisorRequest):
     result = await supervisor.run(request.goal, request.team)
     return result
+
+# Background jobs: the same workflows, run outside the request. Submit returns a job id
+# at once; poll GET /agents/jobs/{id} or follow GET /agents/jobs/{id}/events (SSE).
+
+def _check_agents(agent_ids: List[str]):
+    # Fail at submit time rather than minutes later in the job
+    missing = [aid for aid in agent_ids if not registry.get_agent(aid)]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Agents not found: {', '.join(missing)}")
+
+def _submit(kind: str, request: BaseModel, runner: WorkflowRunner):
+    try:
+        job = workflow_jobs.submit(kind, request.model_dump(), runner)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return {"job_id": job.id, "status": job.status}
+
+@router.post("/jobs/sequential")
+async def submit_sequential_job(request: RunWorkflowRequest):
+    _check_agents([step['agent_id'] for step in request.steps])
+    steps = [WorkflowStep(agent_id=step['agent_id'], instruction=step['instruction']) for step in request.steps]
+    return _submit("sequential", request, lambda on_event: orchestrator.run_sequential(
+        steps, request.initial_input, on_event=on_event))
+
+@router.post("/jobs/parallel")
+async def submit_parallel_job(request: ParallelWorkflowRequest):
+    _check_agents([step['agent_id'] for step in request.steps])
+    steps = [
+        WorkflowStep(agent_id=step['agent_id'], instruction=step['instruction'], timeout=step.get('timeout'))
+        for step in request.steps
+    ]
+    return _submit("parallel", request, lambda on_event: orchestrator.run_parallel(
+        steps, request.initial_input, step_timeout=request.step_timeout, max_concurrency=request.max_concurrency,
+        mode=request.mode, k=request.k, quorum=request.quorum, on_event=on_event))
+
+@router.post("/jobs/dag")
+async def submit_dag_job(request: DagWorkflowRequest):
+    _check_agents([n.agent_id for n in request.nodes])
+    nodes = [
+        DagNode(id=n.id, agent_id=n.agent_id, instruction=n.instruction,
+                depends_on=n.depends_on, input_template=n.input_template)
+        for n in request.nodes
+    ]
+    try:
+        topological_order(nodes)
+    except InvalidWorkflowError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _submit("dag", request, lambda on_event: orchestrator.run_dag(
+        nodes, request.initial_input, request.max_concurrency, request.output_node, on_event=on_event))
+
+@router.post("/jobs/supervisor")
+async def submit_supervisor_job(request: SupervisorRequest):
+    _check_agents(request.team)
+    return _submit("supervisor", request, lambda on_event: supervisor.run(
+        request.goal, request.team, on_event=on_event))
+
+@router.get("/jobs")
+def job_stats():
+    return workflow_jobs.stats()
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str, include_events: bool = False):
+    job = workflow_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict(include_events)
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = workflow_jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job.id, "status": job.status if job.status in FINISHED else "cancelling"}
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    job = workflow_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_source():
+        async for event in workflow_jobs.events(job):
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
@@ -0,0 +1,225 @@
+import os
+import re
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+def _env_limit(kind: str, provider: str, model: str, default: str) -> float:
+    # Most specific wins: LLM_RPM_OPENAI_GPT_4, then LLM_RPM_OPENAI, then LLM_DEFAULT_RPM
+    for name in (f"LLM_{kind}_{provider}_{model}", f"LLM_{kind}_{provider}"):
+        value = os.getenv(re.sub(r"[^A-Z0-9_]", "_", name.upper()))
+        if value:
+            return float(value)
+    return float(os.getenv(f"LLM_DEFAULT_{kind}", default))
+
+def status_code(error: BaseException) -> Optional[int]:
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+def is_rate_limited(error: BaseException) -> bool:
+    return status_code(error) == 429 or "RateLimit" in type(error).__name__ or "ResourceExhausted" in type(error).__name__
+
+def is_retryable(error: BaseException) -> bool:
+    if is_rate_limited(error) or isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if status_code(error) in (500, 502, 503, 504):
+        return True
+    name = type(error).__name__
+    return any(marker in name for marker in ("Timeout", "APIConnectionError", "InternalServerError", "ServiceUnavailable"))
+
+def retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute; a rate of 0 means unlimited."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = rate_per_minute
+        self.level = rate_per_minute
+        self.updated = time.monotonic()
+        self.waits = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    async def take(self, amount: float):
+        if self.capacity <= 0:
+            return
+        # A request larger than the whole budget can still go once the bucket is full
+        amount = min(amount, self.capacity)
+        # Holding the lock while sleeping keeps waiters first-come, first-served
+        async with self._lock:
+            self._refill()
+            while self.level < amount:
+                self.waits += 1
+                await asyncio.sleep((amount - self.level) * 60 / self.capacity)
+                self._refill()
+            self.level -= amount
+
+    def refund(self, amount: float):
+        if self.capacity > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+class ProviderLimiter:
+    """
+    Budget and concurrency for one provider/model. Concurrency follows AIMD:
+    +1/limit per success, halved on a 429, trimmed when latency runs over
+    target. Decreases are spaced out so one burst of 429s counts once.
+    """
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.requests = TokenBucket(_env_limit("RPM", provider, model, "500"))
+        self.tokens = TokenBucket(_env_limit("TPM", provider, model, "150000"))
+        self.min_limit = 1.0
+        self.max_limit = float(os.getenv("LLM_CONCURRENCY_MAX", "32"))
+        self.limit = min(self.max_limit, float(os.getenv("LLM_CONCURRENCY_INITIAL", "4")))
+        self.latency_target = float(os.getenv("LLM_LATENCY_TARGET_MS", "0")) / 1000
+        self.decrease_cooldown = float(os.getenv("LLM_CONCURRENCY_COOLDOWN", "1.0"))
+
+        self.inflight = 0
+        self.waiting = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+        self._counters = {"completed": 0, "failed": 0, "throttled": 0, "latency_total": 0.0}
+
+    async def acquire(self, tokens: float):
+        self.waiting += 1
+        try:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self.inflight < int(self.limit))
+                self.inflight += 1
+        finally:
+            self.waiting -= 1
+        try:
+            await self.requests.take(1)
+            await self.tokens.take(tokens)
+        except BaseException:
+            await self._free_slot()
+            raise
+
+    async def _free_slot(self):
+        async with self._cond:
+            self.inflight -= 1
+            self._cond.notify_all()
+
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self._last_decrease >= self.decrease_cooldown:
+            self.limit = max(self.min_limit, self.limit * factor)
+            self._last_decrease = now
+
+    async def release(self, latency: float, outcome: str):
+        if outcome == "ok":
+            self._counters["completed"] += 1
+            self._counters["latency_total"] += latency
+            if self.latency_target and latency > self.latency_target:
+                self._decrease(0.9)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif outcome == "throttled":
+            self._counters["throttled"] += 1
+            self._decrease(0.5)
+        else:
+            self._counters["failed"] += 1
+        await self._free_slot()
+
+    def stats(self) -> Dict[str, Any]:
+        completed = self._counters["completed"]
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "queue_depth": self.waiting,
+            "rpm": self.requests.capacity,
+            "tpm": self.tokens.capacity,
+            "rpm_waits": self.requests.waits,
+            "tpm_waits": self.tokens.waits,
+            "completed": completed,
+            "failed": self._counters["failed"],
+            "throttled": self._counters["throttled"],
+            "avg_latency_ms": round(self._counters["latency_total"] / completed * 1000, 2) if completed else None,
+        }
+
+class LLMScheduler:
+    """
+    Front door for every provider call: waits for the provider/model budget
+    and a concurrency slot, then retries rate limits and transient failures
+    with full-jitter exponential backoff (or the server's Retry-After).
+    """
+
+    def __init__(self):
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "4"))
+        self.backoff_base = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+        self.backoff_cap = float(os.getenv("LLM_BACKOFF_CAP", "20"))
+        self._limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+        self.retries = 0
+
+    def limiter(self, provider: str, model: str) -> ProviderLimiter:
+        key = (provider, model)
+        if key not in self._limiters:
+            self._limiters[key] = ProviderLimiter(provider, model)
+        return self._limiters[key]
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model: str, tokens: float = 0) -> AsyncIterator[None]:
+        """Holds a slot for one call. Used directly for streams, which cannot be retried."""
+        limiter = self.limiter(provider, model)
+        await limiter.acquire(tokens)
+        start = time.monotonic()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        except Exception as e:
+            if is_rate_limited(e):
+                outcome = "throttled"
+                # The provider did not count a rejected call against our token budget
+                limiter.tokens.refund(tokens)
+            raise
+        finally:
+            await limiter.release(time.monotonic() - start, outcome)
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        hinted = retry_after(error)
+        if hinted is not None:
+            return hinted + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def run(self, provider: str, model: str, call: Callable[[], Awaitable[T]], tokens: float = 0) -> T:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.slot(provider, model, tokens):
+                    return await call()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt, e))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retries": self.retries,
+            "max_retries": self.max_retries,
+            "providers": {f"{p}:{m}": limiter.stats() for (p, m), limiter in self._limiters.items()},
+        }
+
+def estimate_tokens(text: str, completion: int = 256) -> int:
+    """Rough budget charge before the call: ~4 chars per prompt token plus an expected completion."""
+    return len(text) // 4 + completion
+
+# Global Instance
+scheduler = LLMScheduler()
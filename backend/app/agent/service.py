@@ -1,51 +1,110 @@
-from app.agent.core import Agent
-from app.db.session import get_db, engine
-from app.db.models import Base, ChatLog
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import BaseModel, ConfigDict
+from app.agent.client_pool import client_pool
+from app.db.session import get_db
+from app.db.models import ChatLog
+from app.memory.history import session_history, count_tokens
 
-# Create tables if not exist (simple migration)
-Base.metadata.create_all(bind=engine)
+class AgentConfig(BaseModel):
+    """Per-request model settings. Frozen so a request can never see another's."""
+    model_config = ConfigDict(frozen=True)
+
+    provider: str = "openai"
+    model: str = "gpt-3.5-turbo"
+    temperature: float = 0.7
+    mode: str = "chat" # chat or agent
+
+    @property
+    def tools_enabled(self) -> bool:
+        return self.mode == "agent"
 
 class AgentService:
-    def __init__(self):
-        self.agent = Agent()
+    """Stateless between requests: each call resolves its own pooled client."""
+
+    def _log(self, db, role: str, content: str, config: AgentConfig, session_id: Optional[str] = None) -> int:
+        row = ChatLog(
+            session_id=session_id,
+            role=role,
+            content=content,
+            provider=config.provider,
+            model=config.model
+        )
+        db.add(row)
+        db.commit()
+        return row.id
+
+    def new_session(self) -> str:
+        """Issues a session id for a conversation that starts now."""
+        session_id = str(uuid.uuid4())
+        session_history.start(session_id)
+        return session_id
+
+    def _start_trace(self, name: str, message: str, config: AgentConfig):
+        from app.observability.tracer import tracer
+        root_span = tracer.start_trace(name)
+        root_span.set_attribute("message", message)
+        root_span.set_attribute("provider", config.provider)
+        root_span.set_attribute("model", config.model)
+        return root_span
+
+    def _retrieve(self, message: str, root_span) -> str:
+        from app.observability.tracer import tracer
+        rag_span = tracer.start_span("rag_retrieval", root_span.trace_id, root_span.id)
+        from app.memory.rag import rag
+        context = rag.retrieve_context(message)
         
-    async def process_message(self, message: str, use_rag: bool = False) -> str:
+        final_message = message
+        if context:
+            final_message = rag.format_prompt(message, context)
+            rag_span.set_attribute("context_length", len(context))
+            print(f"--- RAG Context Injected ---\n{context[:100]}...\n--------------------------")
+        
+        rag_span.end()
+        return final_message
+
+    async def _history(self, session_id: Optional[str], root_span) -> List[Dict[str, str]]:
+        if not session_id:
+            return []
+        from app.observability.tracer import tracer
+        span = tracer.start_span("history_window", root_span.trace_id, root_span.id)
+        history = await session_history.window(session_id)
+        span.set_attribute("turns", len(history))
+        span.set_attribute("tokens", sum(count_tokens(m["content"]) for m in history))
+        span.end()
+        return history
+
+    def _remember(self, session_id: Optional[str], message: str, response: str, config: AgentConfig,
+                  log_ids: Tuple[Optional[int], Optional[int]] = (None, None)):
+        if not session_id:
+            return
+        session_history.append(session_id, "user", message, log_ids[0])
+        session_history.append(session_id, "assistant", response, log_ids[1])
+        session_history.schedule_summary(session_id, config.provider, config.model)
+
+    async def process_message(self, message: str, config: AgentConfig = AgentConfig(), use_rag: bool = False,
+                              no_cache: bool = False, session_id: Optional[str] = None) -> str:
         from app.observability.tracer import tracer
+        agent = client_pool.get(config.provider, config.model, config.temperature, config.tools_enabled)
         
         # Start Root Trace
-        root_span = tracer.start_trace("chat_request")
-        root_span.set_attribute("message", message)
-        root_span.set_attribute("provider", self.agent.provider)
+        root_span = self._start_trace("chat_request", message, config)
+        db = None
         
         try:
             # Save User Message
             db = next(get_db())
-            user_log = ChatLog(
-                role="user", 
-                content=message, 
-                provider=self.agent.provider, 
-                model=self.agent.model_name
-            )
-            db.add(user_log)
-            db.commit()
+            history = await self._history(session_id, root_span)
+            user_log = self._log(db, "user", message, config, session_id)
 
             # RAG / Retrieval
-            final_message = message
-            if use_rag:
-                rag_span = tracer.start_span("rag_retrieval", root_span.trace_id, root_span.id)
-                from app.memory.rag import rag
-                context = rag.retrieve_context(message)
-                
-                if context:
-                    final_message = rag.format_prompt(message, context)
-                    rag_span.set_attribute("context_length", len(context))
-                    print(f"--- RAG Context Injected ---\n{context[:100]}...\n--------------------------")
-                
-                rag_span.end()
+            final_message = self._retrieve(message, root_span) if use_rag else message
 
             # Get Response
             llm_span = tracer.start_span("llm_generation", root_span.trace_id, root_span.id)
-            raw_response = await self.agent.chat(final_message)
+            with tracer.activate(llm_span):
+                raw_response = await agent.chat(final_message, history, use_cache=not no_cache)
             llm_span.set_attribute("response_length", len(raw_response))
             llm_span.end()
             
@@ -66,14 +125,8 @@ class AgentService:
             guard_span.end()
 
             # Save AI Message
-            ai_log = ChatLog(
-                role="assistant", 
-                content=response, 
-                provider=self.agent.provider, 
-                model=self.agent.model_name
-            )
-            db.add(ai_log)
-            db.commit()
+            assistant_log = self._log(db, "assistant", response, config, session_id)
+            self._remember(session_id, message, response, config, (user_log, assistant_log))
             
             root_span.end()
             return response
@@ -82,7 +135,105 @@ class AgentService:
             root_span.set_attribute("error", str(e))
             root_span.end()
             raise e
+        finally:
+            if db is not None:
+                db.close()
+
+    async def stream_message(self, message: str, config: AgentConfig = AgentConfig(), use_rag: bool = False,
+                             session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of process_message. Yields token / tool_start /
+        tool_end events, then "blocked" if a guardrail trips mid-stream, and
+        finally "done" with the full (sanitized) response.
+        """
+        from app.observability.tracer import tracer
+        from app.safety.guardrails import guardrails, StreamGuard
+        agent = client_pool.get(config.provider, config.model, config.temperature, config.tools_enabled)
+        root_span = self._start_trace("chat_stream_request", message, config)
+        llm_span = None
+        stream = None
+        db = None
 
-    def update_agent_config(self, provider: str, model: str, temperature: float, mode: str = "chat"):
-        tools_enabled = (mode == "agent")
-        self.agent.update_config(provider, model, temperature, tools_enabled)
+        try:
+            db = next(get_db())
+            history = await self._history(session_id, root_span)
+            user_log = self._log(db, "user", message, config, session_id)
+            final_message = self._retrieve(message, root_span) if use_rag else message
+
+            llm_span = tracer.start_span("llm_generation", root_span.trace_id, root_span.id)
+            llm_span.set_attribute("streaming", True)
+            guard = StreamGuard(guardrails)
+            emitted: List[str] = []
+            raw_length = 0
+            chunks = 0
+            first_token_at: Optional[float] = None
+
+            # Usage is recorded on the active span when the stream finishes
+            stream = agent.astream(final_message, history)
+            with tracer.activate(llm_span):
+                async for event in stream:
+                    if event["type"] != "token":
+                        llm_span.add_event(event["type"], {"tool": event["tool"]})
+                        yield event
+                        continue
+
+                    if first_token_at is None:
+                        first_token_at = time.time()
+                        llm_span.set_attribute("ttft_ms", round((first_token_at - llm_span.start_time) * 1000, 2))
+                    chunks += 1
+                    raw_length += len(event["data"])
+                    text = guard.feed(event["data"])
+                    if guard.blocked:
+                        break
+                    if text:
+                        emitted.append(text)
+                        yield {"type": "token", "data": text}
+                # Close now (not at garbage collection) so the provider slot is freed and usage lands on this span
+                await stream.aclose()
+                stream = None
+
+            if not guard.blocked:
+                tail = guard.flush()
+                if tail:
+                    emitted.append(tail)
+                    yield {"type": "token", "data": tail}
+
+            llm_span.end()
+            # Providers stream roughly one token per chunk
+            llm_span.set_attribute("output_chunks", chunks)
+            llm_span.set_attribute("response_length", raw_length)
+            if first_token_at is not None and llm_span.end_time > first_token_at:
+                llm_span.set_attribute("tokens_per_sec", round(chunks / (llm_span.end_time - first_token_at), 2))
+
+            if guard.blocked:
+                # Text already sent cannot be recalled; the client should discard it
+                response = f"[SAFETY BLOCKED]: {guard.blocked}"
+                root_span.set_attribute("blocked", True)
+                yield {"type": "blocked", "reason": guard.blocked}
+            else:
+                response = "".join(emitted)
+
+            assistant_log = self._log(db, "assistant", response, config, session_id)
+            self._remember(session_id, message, response, config, (user_log, assistant_log))
+            root_span.end()
+            yield {"type": "done", "response": response}
+
+        except Exception as e:
+            root_span.set_attribute("error", str(e))
+            root_span.end()
+            yield {"type": "error", "error": str(e)}
+        finally:
+            # The client disconnected mid-stream (GeneratorExit): release the scheduler slot and
+            # close the spans now instead of whenever the generators are garbage collected
+            disconnected = root_span.end_time is None
+            if stream is not None:
+                with tracer.activate(llm_span):
+                    await stream.aclose()
+            if llm_span is not None and llm_span.end_time is None:
+                llm_span.set_attribute("disconnected", disconnected)
+                llm_span.end()
+            if disconnected:
+                root_span.set_attribute("disconnected", True)
+                root_span.end()
+            if db is not None:
+                db.close()
@@ -0,0 +1,74 @@
+import os
+import json
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, List
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical LLM calls: the first caller starts the
+    upstream request and later callers with the same key await the same task.
+    A waiter that is cancelled only stops waiting; the upstream call is
+    cancelled once no waiters are left.
+    """
+
+    def __init__(self):
+        self.max_temperature = float(os.getenv("LLM_COALESCE_MAX_TEMPERATURE", "0.0"))
+        self._flights: Dict[str, _Flight] = {}
+        self._counters = {"leaders": 0, "coalesced": 0, "cancelled": 0}
+
+    @staticmethod
+    def make_key(identity: Dict[str, Any], message: str, history: List[Dict[str, str]],
+                 use_cache: bool = True, json_mode: bool = False) -> str:
+        # A joiner gets the leader's reply and cache write, so the call options are part of the key
+        options = {"use_cache": use_cache, "json_mode": json_mode}
+        material = json.dumps({"identity": identity, "history": history, "message": message, "options": options}, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def applies(self, identity: Dict[str, Any]) -> bool:
+        # Sampled calls are expected to differ (e.g. voting); only share deterministic ones
+        return identity["temperature"] <= self.max_temperature
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        from app.observability.tracer import tracer
+        flight = self._flights.get(key)
+        if flight is None:
+            # The task is owned by the flight, not by this caller, so it outlives a cancelled leader
+            flight = _Flight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self._flights[key] = flight
+            self._counters["leaders"] += 1
+        else:
+            self._counters["coalesced"] += 1
+            tracer.count("llm_coalesced")
+            span = tracer.current_span()
+            if span is not None:
+                span.set_attribute("coalesced", True)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Last one out: nobody wants the answer any more
+                self._forget(key, flight)
+                flight.task.cancel()
+                self._counters["cancelled"] += 1
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "max_temperature": self.max_temperature, **self._counters}
+
+# Global Instance
+singleflight = SingleFlight()
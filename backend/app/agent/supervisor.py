@@ -1,18 +1,163 @@
-from typing import List, Dict, Any, Optional
+from collections import deque
+from typing import Deque, List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
 from app.agent.core import Agent
+from app.agent.client_pool import client_pool
 from app.agent.registry import registry, AgentDefinition
-import json
+from app.agent.orchestrator import EventCallback, emit_event, span_usage
+from app.observability.tracer import tracer
+from app.observability.costs import count_tokens
+import os
+import asyncio
+import time
+
+class Delegation(BaseModel):
+    agent_id: str
+    instruction: str = ""
+
+class SupervisorDecision(BaseModel):
+    next_agent_id: Optional[str] = None
+    instruction: str = ""
+    reasoning: str = ""
+    delegations: List[Delegation] = []
+
+def parse_decision(raw: str, team_ids: List[str]) -> SupervisorDecision:
+    """Parses and checks a decision reply; raises ValueError describing what is wrong."""
+    text = raw.strip()
+    # Tolerate code fences and chatter around the object
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("Reply contains no JSON object")
+    decision = SupervisorDecision.model_validate_json(text[start:end + 1])
+
+    if decision.delegations:
+        unknown = [d.agent_id for d in decision.delegations if d.agent_id not in team_ids]
+    elif decision.next_agent_id == "FINISH":
+        unknown = []
+    elif decision.next_agent_id:
+        unknown = [decision.next_agent_id] if decision.next_agent_id not in team_ids else []
+    else:
+        raise ValueError("Reply needs next_agent_id (an agent ID or FINISH) or delegations")
+    if unknown:
+        raise ValueError(f"Unknown agent IDs {unknown}; valid IDs are {team_ids}")
+    return decision
+
+class SupervisorContext:
+    """
+    Step history for supervisor prompts, built incrementally. The last
+    `recent_steps` steps are kept in full; older ones are folded into a
+    one-line digest each, and the oldest digests are dropped once the whole
+    history would exceed `token_budget`. Every step is rendered and counted
+    once, so a long run costs the same per decision as a short one.
+    """
+
+    def __init__(self, token_budget: int, recent_steps: int, digest_chars: int):
+        self.token_budget = token_budget
+        self.recent_steps = recent_steps
+        self.digest_chars = digest_chars
+        self._recent: Deque[Tuple[Dict[str, Any], str, int]] = deque() # (record, text, tokens)
+        self._digests: Deque[Tuple[str, int]] = deque() # (line, tokens)
+        self._tokens = 0
+        self.omitted = 0 # steps dropped from the digest entirely
+        self._rendered: Optional[str] = None
+
+    def add(self, record: Dict[str, Any]):
+        # A single huge output may use at most half the budget (~4 characters per token)
+        output = str(record["output"])[:self.token_budget * 2]
+        text = f"Step {record['step']} - Agent {record['agent']}:\n{output}\n\n"
+        tokens = count_tokens(text)
+        self._recent.append((record, text, tokens))
+        self._tokens += tokens
+
+        while len(self._recent) > 1 and (len(self._recent) > self.recent_steps or self._tokens > self.token_budget):
+            old, _, old_tokens = self._recent.popleft()
+            digest = " ".join(str(old["output"]).split())[:self.digest_chars]
+            line = f"Step {old['step']} - Agent {old['agent']}: {digest}\n"
+            line_tokens = count_tokens(line)
+            self._digests.append((line, line_tokens))
+            self._tokens += line_tokens - old_tokens
+        while self._digests and self._tokens > self.token_budget:
+            _, line_tokens = self._digests.popleft()
+            self._tokens -= line_tokens
+            self.omitted += 1
+        self._rendered = None
+
+    def render(self) -> str:
+        if self._rendered is None:
+            parts = ["History:\n"]
+            if self._digests or self.omitted:
+                parts.append("Earlier steps (summarized):\n")
+                if self.omitted:
+                    parts.append(f"({self.omitted} earlier steps omitted)\n")
+                parts.extend(line for line, _ in self._digests)
+                parts.append("\n")
+            parts.extend(text for _, text, _ in self._recent)
+            self._rendered = "".join(parts)
+        return self._rendered
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens
 
 class SupervisorAgent:
     def __init__(self, model_name: str = "gpt-4"):
-        self.supervisor_model = Agent(
-            provider="openai",
-            model_name=model_name,
-            temperature=0.0
+        self.model_name = model_name
+        # Upper bound on workers running at once for a single decision
+        self.max_parallel = int(os.getenv("SUPERVISOR_MAX_PARALLEL", "4"))
+        self.context_tokens = int(os.getenv("SUPERVISOR_CONTEXT_TOKENS", "3000"))
+        self.recent_steps = int(os.getenv("SUPERVISOR_RECENT_STEPS", "4"))
+        self.digest_chars = int(os.getenv("SUPERVISOR_DIGEST_CHARS", "200"))
+        # Re-asks for a malformed decision, with only the bad reply and the error
+        self.repair_retries = int(os.getenv("SUPERVISOR_REPAIR_RETRIES", "2"))
+
+    def _worker(self, agent_def: AgentDefinition) -> Agent:
+        return client_pool.get(
+            provider=agent_def.provider,
+            model_name=agent_def.model,
+            temperature=agent_def.temperature,
+            tools_enabled=(len(agent_def.tools) > 0)
         )
+
+    @property
+    def supervisor_model(self) -> Agent:
+        return client_pool.get(provider="openai", model_name=self.model_name, temperature=0.0)
+
+    async def _decide(self, system_prompt: str, context: str, team_ids: List[str], span) -> SupervisorDecision:
+        model = self.supervisor_model
+
+        def usable(raw: str) -> bool:
+            # Only valid decisions are cached; a malformed one would come back on every identical step
+            try:
+                parse_decision(raw, team_ids)
+                return True
+            except ValueError:
+                return False
+
+        with tracer.activate(span):
+            # The system prompt is a separate, unchanging message so providers can cache the prefix
+            raw = await model.chat(f"{context}\n\nWhat is the next step?",
+                                   history=[{"role": "system", "content": system_prompt}], json_mode=True,
+                                   cache_if=usable)
+            for attempt in range(self.repair_retries + 1):
+                try:
+                    return parse_decision(raw, team_ids)
+                except ValueError as e:
+                    if attempt == self.repair_retries:
+                        raise ValueError(f"Unusable supervisor decision after {attempt} repairs: {e}")
+                    tracer.count("supervisor_repairs")
+                    span.set_attribute("repairs", attempt + 1)
+                    raw = await model.chat(
+                        "Your previous reply was not a valid decision.\n"
+                        f"Error: {e}\n\nPrevious reply:\n{raw}\n\n"
+                        'Reply with only a JSON object with the keys "next_agent_id" (an agent ID or "FINISH"), '
+                        '"instruction", "reasoning" and optionally "delegations" '
+                        '(a list of {"agent_id": ..., "instruction": ...}).',
+                        json_mode=True,
+                        cache_if=usable,
+                    )
     
-    async def run(self, goal: str, agent_ids: List[str], max_steps: int = 10) -> Dict[str, Any]:
+    async def run(self, goal: str, agent_ids: List[str], max_steps: int = 10,
+                  on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
         """
         Orchestrates a team of agents to achieve a goal.
         """
@@ -26,8 +171,15 @@ class SupervisorAgent:
         if not team:
             return {"error": "No valid agents found for the team."}
 
-        history = []
+        context = SupervisorContext(self.context_tokens, self.recent_steps, self.digest_chars)
+        team_ids = [a.id for a in team]
+        team_by_id = {a.id: a for a in team}
         final_output = ""
+        # Resolved once per run; the pool shares them across runs too
+        workers = {a.id: self._worker(a) for a in team}
+        semaphore = asyncio.Semaphore(max(1, self.max_parallel))
+        root_span = tracer.start_trace("supervisor_workflow")
+        root_span.set_attribute("goal", goal)
         
         # System Prompt for Supervisor
         team_desc = "\n".join([f"- {a.name} (ID: {a.id}): {a.role}" for a in team])
@@ -41,92 +193,106 @@ Protocol:
 1. Analyze the current state and history.
 2. Decide which agent to call next to make progress.
 3. Provide a clear instruction to that agent.
-4. If the goal is achieved, output "FINISH" with the final answer.
+4. If several subtasks are independent of each other, delegate them all at once in "delegations";
+   those agents work in parallel and you see all their outputs at the next step.
+5. If the goal is achieved, output "FINISH" with the final answer.
 
+Reply with only the JSON object.
 Output Format (JSON):
 {{
     "next_agent_id": "agent_id_or_FINISH",
     "instruction": "Instruction for the agent or Final Answer",
-    "reasoning": "Why you chose this step"
+    "reasoning": "Why you chose this step",
+    "delegations": [{{"agent_id": "agent_id", "instruction": "Independent subtask"}}]
 }}
+"delegations" is optional; when present it replaces next_agent_id/instruction for this step.
 """
 
         steps = []
         
         for i in range(max_steps):
-            # Form context
-            context = f"History:\n"
-            for step in history:
-                context += f"Step {step['step']} - Agent {step['agent']}:\n{step['output']}\n\n"
-            
-            supervisor_input = f"{system_prompt}\n\n{context}\n\nWhat is the next step?"
+            # History is maintained incrementally and stays within the token budget
+            history_text = context.render()
             
-            # Call Supervisor LLM
-            # We need to enforce JSON output. 
-            # (In a real system, we'd use json mode or function calling)
-            decision_raw = await self.supervisor_model.chat(supervisor_input)
+            # Call Supervisor LLM in JSON mode; malformed replies get cheap repair retries
+            decision_span = tracer.start_span(f"decision:{i + 1}", root_span.trace_id, root_span.id)
+            decision_span.set_attribute("context_tokens", context.tokens)
+            try:
+                decision = await self._decide(system_prompt, history_text, team_ids, decision_span)
+            except Exception as e:
+                print(f"Supervisor Error: {e}")
+                final_output = f"Error: {str(e)}"
+                break
+            finally:
+                decision_span.end()
             
             try:
-                # Naive JSON parsing/cleanup
-                decision_json = decision_raw.strip()
-                if decision_json.startswith("```json"):
-                    decision_json = decision_json[7:-3]
-                elif decision_json.startswith("```"):
-                     decision_json = decision_json[3:-3]
+                next_agent_id = decision.next_agent_id
+                instruction = decision.instruction
+                reasoning = decision.reasoning
+                delegations = [d.model_dump() for d in decision.delegations]
+                emit_event(on_event, "supervisor_decision", step=i + 1, next_agent_id=next_agent_id, instruction=instruction,
+                           reasoning=reasoning, delegations=delegations, **span_usage(decision_span))
                 
-                decision = json.loads(decision_json)
-                
-                next_agent_id = decision.get("next_agent_id")
-                instruction = decision.get("instruction")
-                reasoning = decision.get("reasoning")
-                
-                if next_agent_id == "FINISH":
+                if next_agent_id == "FINISH" and not delegations:
                     final_output = instruction
                     break
                 
-                # Check validity
-                agent_def = next((a for a in team if a.id == next_agent_id), None)
-                if not agent_def:
-                    # Supervisor hallucinated an ID? Retry or fail?
-                    # Let's just log and continue/stop
-                    break
+                if not delegations:
+                    delegations = [{"agent_id": next_agent_id, "instruction": instruction}]
+                # IDs were checked against the team when the decision was parsed
+                assignments = [(team_by_id[d["agent_id"]], d["instruction"]) for d in delegations]
 
-                # Execute Agent
-                worker_agent = Agent(
-                    provider=agent_def.provider,
-                    model_name=agent_def.model,
-                    temperature=agent_def.temperature
-                )
-                
-                # Context for worker? 
-                # Ideally worker gets history too, or just the instruction.
-                # Let's give specific instruction + relevant context summary potentially.
-                # For simplicity, just instruction.
-                worker_input = f"Supervisor Instruction: {instruction}\n\nContext:\n{context[-2000:]}" # Truncate context
-                
-                print(f"--- Supervisor calling {agent_def.name}: {instruction} ---")
-                worker_output = await worker_agent.chat(worker_input)
-                
-                step_record = {
-                    "step": i + 1,
-                    "agent": agent_def.name,
-                    "agent_id": agent_def.id,
-                    "instruction": instruction,
-                    "output": worker_output,
-                    "reasoning": reasoning
-                }
-                history.append(step_record)
-                steps.append(step_record)
+                async def delegate(agent_def: AgentDefinition, task: str) -> Dict[str, Any]:
+                    # Context for worker: the instruction plus the recent history
+                    worker_input = f"Supervisor Instruction: {task}\n\nContext:\n{history_text[-2000:]}" # Truncate context
+                    async with semaphore:
+                        print(f"--- Supervisor calling {agent_def.name}: {task} ---")
+                        emit_event(on_event, "step_started", step=i + 1, agent=agent_def.name, agent_id=agent_def.id, instruction=task)
+                        worker_span = tracer.start_span(f"step:{i + 1}:{agent_def.name}", root_span.trace_id, root_span.id)
+                        worker_span.set_attribute("agent", agent_def.name)
+                        try:
+                            with tracer.activate(worker_span):
+                                worker_output = await workers[agent_def.id].chat(worker_input)
+                            status = "completed"
+                        except Exception as e:
+                            # One failed worker shouldn't discard its siblings' work; the supervisor sees the error
+                            worker_output, status = f"Error: {e}", "failed"
+                        finally:
+                            worker_span.end()
+                    emit_event(on_event, "step_finished", step=i + 1, agent=agent_def.name, agent_id=agent_def.id, status=status,
+                               output=worker_output, duration_ms=round((worker_span.end_time - worker_span.start_time) * 1000, 2),
+                               **span_usage(worker_span))
+                    return {
+                        "step": i + 1,
+                        "agent": agent_def.name,
+                        "agent_id": agent_def.id,
+                        "instruction": task,
+                        "output": worker_output,
+                        "status": status,
+                        "reasoning": reasoning
+                    }
+
+                # Independent subtasks run concurrently; records are merged in delegation order
+                started = time.perf_counter()
+                records = await asyncio.gather(*(delegate(agent_def, task) for agent_def, task in assignments))
+                decision_span.set_attribute("parallel_workers", len(records))
+                decision_span.set_attribute("workers_wall_ms", round((time.perf_counter() - started) * 1000, 2))
+                for record in records:
+                    context.add(record)
+                steps.extend(records)
 
             except Exception as e:
                 print(f"Supervisor Error: {e}")
                 final_output = f"Error: {str(e)}"
                 break
         
+        root_span.end()
         return {
             "goal": goal,
             "steps": steps,
-            "final_output": final_output
+            "final_output": final_output,
+            "trace_id": root_span.trace_id
         }
 
 supervisor = SupervisorAgent()
@@ -1,38 +1,20 @@
-import docker
-import subprocess
 from typing import Optional
 
 class CodeExecutor:
-    def __init__(self, image: str = "python:3.11-slim"):
-        self.image = image
-        try:
-            self.client = docker.from_env()
-        except Exception:
-            self.client = None
-            print("Warning: Docker client not initialized.")
+    """
+    Runs Python for agent tools through the shared sandbox executor, so it
+    follows the deployment's backend (docker or process) and limits.
+    """
+    def __init__(self, language: str = "python", profile: Optional[str] = None):
+        self.language = language
+        self.profile = profile
 
     def run_code(self, code: str) -> str:
-        if not self.client:
-            return "Error: Docker not available."
-        
-        try:
-            # Simple ephemeral container execution
-            container = self.client.containers.run(
-                self.image,
-                command=["python", "-c", code],
-                detach=True,
-                network_disabled=True, # Isolation
-                mem_limit="128m",
-                cpu_quota=50000,
-            )
-            
-            exit_code = container.wait(timeout=10)
-            logs = container.logs().decode("utf-8")
-            container.remove()
-            
-            if exit_code['StatusCode'] != 0:
-                return f"Execution Error:\n{logs}"
-            return logs
-            
-        except Exception as e:
-            return f"System Error: {str(e)}"
+        from app.sandbox.executor import sandbox
+
+        result = sandbox.execute(self.language, code, profile=self.profile)
+        if result["status"] == "error":
+            return f"System Error: {result['output']}"
+        if result["exit_code"] != 0:
+            return f"Execution Error:\n{result['output']}"
+        return result["output"]
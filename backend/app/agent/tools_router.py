@@ -21,23 +21,26 @@ def list_tools():
 
 @router.post("/custom")
 def create_custom_tool(request: CustomToolRequest):
-    # DANGEROUS: Dynamic code loading.
-    # In a real secure system, we'd use the SandboxExecutor to run this.
-    # For this prototype, we will define a wrapper that calls the Sandbox.
+    # User code is never loaded into the API process: each custom tool is
+    # served by a persistent sandboxed worker that loads `run` once and takes
+    # JSON-framed calls (see app.sandbox.workers).
     
-    from app.sandbox.executor import sandbox
+    from app.sandbox.workers import tool_workers, ToolError
     from langchain_core.tools import tool
     
-    # We define a generic function that runs the code in the sandbox
+    tool_workers.register(request.name, request.code)
+    tool_name = request.name
+    
     @tool
     def dynamic_tool(input_str: str) -> str:
         """Dynamic custom tool."""
-        # We wrap the user code to handle the input
-        # This is a simplification. Ideally we parse the user code to find a function.
-        # Let's assume user code expects a variable 'input_var'
-        full_code = f"{request.code}\n\nprint(run('{input_str}'))"
-        result = sandbox.execute("python", full_code)
-        return result["output"]
+        # The user code is expected to define run(input_str)
+        try:
+            return str(tool_workers.call(tool_name, [input_str]))
+        except ToolError as e:
+            return f"Tool Error:\n{e}"
+        except Exception as e:
+            return f"System Error: {str(e)}"
     
     # Update metadata
     dynamic_tool.name = request.name
@@ -47,3 +50,8 @@ def create_custom_tool(request: CustomToolRequest):
     tool_registry.register_tool(request.name, request.description, dynamic_tool)
     
     return {"status": "created", "name": request.name}
+
+@router.get("/workers")
+def list_tool_workers():
+    from app.sandbox.workers import tool_workers
+    return tool_workers.stats()
@@ -0,0 +1,60 @@
+from typing import Any, Dict
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from app.observability.costs import count_tokens, usage_ledger
+
+class UsageCollector(BaseCallbackHandler):
+    """Sums provider-reported token usage over every LLM call in one run (tool loops make several)."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.reported = False
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        found = False
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    found = True
+                    self.prompt_tokens += usage.get("input_tokens", 0)
+                    self.completion_tokens += usage.get("output_tokens", 0)
+                    self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        if not found:
+            # Older integrations only report through llm_output
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            if usage:
+                found = True
+                self.prompt_tokens += usage.get("prompt_tokens", 0)
+                self.completion_tokens += usage.get("completion_tokens", 0)
+                self.cached_tokens += (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+        self.reported = self.reported or found
+
+def record_usage(provider: str, model: str, collector: UsageCollector, prompt_text: str, completion_text: str) -> Dict[str, Any]:
+    """Writes one call's usage to the ledger and adds it to the current span, estimating it if the provider was silent."""
+    from app.observability.tracer import tracer
+    if collector.reported:
+        prompt, completion, cached, source = collector.prompt_tokens, collector.completion_tokens, collector.cached_tokens, "provider"
+    else:
+        prompt, completion, cached, source = count_tokens(prompt_text, model), count_tokens(completion_text, model), 0, "estimate"
+
+    span = tracer.current_span()
+    entry = usage_ledger.record(provider, model, prompt, completion, cached, source, span.trace_id if span else None)
+    if span is not None:
+        # A span can cover several calls (tool loops, repair retries): add up, never overwrite
+        for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            span.add_to_attribute(key, entry[key])
+        if entry["cost_usd"] is not None:
+            span.set_attribute("cost_usd", round((span.attributes.get("cost_usd") or 0) + entry["cost_usd"], 6))
+        elif "cost_usd" not in span.attributes:
+            # Unpriced model
+            span.set_attribute("cost_usd", None)
+        span.add_to_attribute("llm_calls", 1)
+        for key, value in (("provider", provider), ("model", model), ("usage_source", source)):
+            previous = span.attributes.get(key)
+            span.set_attribute(key, value if previous in (None, value) else "mixed")
+    return entry
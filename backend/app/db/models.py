@@ -1,12 +1,41 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, func, inspect, text
 from app.db.session import Base
 
 class ChatLog(Base):
     __tablename__ = "chat_logs"
 
     id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, index=True, nullable=True)
     role = Column(String)
     content = Column(Text)
     provider = Column(String)
     model = Column(String)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+
+class ChatSummary(Base):
+    """Rolling summary of a chat session, covering its chat_logs rows up to through_id."""
+    __tablename__ = "chat_summaries"
+
+    session_id = Column(String, primary_key=True)
+    summary = Column(Text)
+    through_id = Column(Integer)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# Columns added after chat_logs was first created; create_all never alters an existing table
+ADDED_COLUMNS = {
+    "chat_logs": [
+        ("session_id", "VARCHAR", "CREATE INDEX IF NOT EXISTS ix_chat_logs_session_id ON chat_logs (session_id)"),
+    ],
+}
+
+def migrate(engine):
+    """Creates missing tables, then adds any columns an older schema lacks."""
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            for name, sql_type, index_sql in columns:
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}"))
+                    conn.execute(text(index_sql))
@@ -1,9 +1,10 @@
 from app.eval.core import TestCase
 from app.agent.core import Agent
+from app.agent.client_pool import client_pool
 
-# We need a judge agent. For simplicity, we create a fresh one or use a singleton.
-# Ideally, the judge should be a strong model (GPT-4).
-judge_agent = Agent(provider="openai", model_name="gpt-4", temperature=0.0)
+def judge_agent() -> Agent:
+    # The judge should be a strong model (GPT-4); the pooled client is shared across evaluations
+    return client_pool.get(provider="openai", model_name="gpt-4", temperature=0.0)
 
 async def calculate_score(test_case: TestCase, actual_output: str) -> tuple[float, str]:
     """
@@ -28,7 +29,7 @@ async def calculate_score(test_case: TestCase, actual_output: str) -> tuple[floa
     
     try:
         # In a real app we'd handle this more robustly or use a dedicated Judge class
-        evaluation = await judge_agent.chat(prompt)
+        evaluation = await judge_agent().chat(prompt)
         
         # Parse
         lines = evaluation.split('\n')
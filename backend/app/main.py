@@ -1,10 +1,13 @@
 from fastapi import FastAPI, HTTPException, Security, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security.api_key import APIKeyHeader
 from starlette.status import HTTP_403_FORBIDDEN
 from pydantic import BaseModel
-from app.agent.service import AgentService
+from app.agent.service import AgentService, AgentConfig
 from app.rl.router import router as rl_router
 import os
+import json
+from typing import Optional
 
 API_KEY_NAME = "X-Sandbox-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
@@ -44,12 +47,40 @@ app.include_router(memory_router)
 app.include_router(obs_router)
 agent_service = AgentService()
 
+@app.on_event("startup")
+def migrate_db():
+    # Create tables if not exist (simple migration); at startup rather than import so importing the app needs no database
+    from app.db.session import engine
+    from app.db.models import migrate
+    migrate(engine)
+
+@app.on_event("startup")
+def warm_sandbox():
+    # Runs in the background so the API can answer /health while images pull
+    from app.sandbox.warmup import sandbox_warmup
+    if sandbox_warmup.enabled:
+        sandbox_warmup.start_background()
+
+@app.on_event("shutdown")
+def shutdown_sandbox():
+    from app.sandbox.executor import sandbox
+    from app.sandbox.workers import tool_workers
+    tool_workers.shutdown()
+    sandbox.backend.shutdown()
+
 class ChatRequest(BaseModel):
     message: str
     provider: str = "openai"
     model: str = "gpt-3.5-turbo"
     temperature: float = 0.7
     mode: str = "chat" # chat or agent
+    use_rag: bool = False
+    no_cache: bool = False # Skip the LLM response cache
+    session_id: Optional[str] = None # Continue a conversation; without one the call is stateless
+    new_session: bool = False # Start a conversation; the issued session_id is returned
+
+    def config(self) -> AgentConfig:
+        return AgentConfig(provider=self.provider, model=self.model, temperature=self.temperature, mode=self.mode)
 
 @app.get("/")
 def read_root():
@@ -59,13 +90,36 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/ready")
+def readiness_check():
+    from app.sandbox.warmup import sandbox_warmup
+    status = sandbox_warmup.status()
+    if not sandbox_warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "sandbox": status})
+    return {"status": "ready", "sandbox": status}
+
 @app.post("/chat")
 @limiter.limit("10/minute")
 async def chat(request: ChatRequest, request_context: Request): # Request context needed for limiter
     try:
-        # Update config with mode
-        agent_service.agent.update_config(request.provider, request.model, request.temperature, request.mode == "agent")
-        response = await agent_service.process_message(request.message, use_rag=request.use_rag)
-        return {"response": response}
+        # Config travels with the request; the shared service holds no model state
+        session_id = request.session_id or (agent_service.new_session() if request.new_session else None)
+        response = await agent_service.process_message(
+            request.message, request.config(), use_rag=request.use_rag, no_cache=request.no_cache, session_id=session_id
+        )
+        return {"response": response, "session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/stream")
+@limiter.limit("10/minute")
+async def chat_stream(request: ChatRequest, request_context: Request):
+    session_id = request.session_id or (agent_service.new_session() if request.new_session else None)
+
+    async def event_source():
+        if session_id:
+            yield f"event: session\ndata: {json.dumps({'type': 'session', 'session_id': session_id})}\n\n"
+        async for event in agent_service.stream_message(request.message, request.config(), use_rag=request.use_rag, session_id=session_id):
+            yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
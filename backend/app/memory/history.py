@@ -0,0 +1,178 @@
+import os
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+from app.db.session import get_db
+from app.db.models import ChatLog, ChatSummary
+from app.observability.costs import count_tokens
+
+class SessionState:
+    def __init__(self, turns: List[Dict[str, Any]]):
+        self.turns = turns # {"id", "role", "content", "tokens"}, oldest first; id is the chat_logs row
+        self.summary = ""
+        self.summarized = 0 # leading turns already folded into the summary
+        self.summarizing = False
+        self.dropped = 0 # turns trimmed from the front so far
+
+class SessionHistory:
+    """
+    Recent turns per chat session, kept in an LRU and loaded from chat_logs
+    (plus the saved summary in chat_summaries) on a miss. window() assembles
+    the prompt history: a rolling summary of older turns followed by the
+    newest turns that fit the token budget. Turns that no longer fit are
+    folded into the summary in the background after a reply, so it never
+    adds latency to the request; until then they are simply left out.
+    """
+
+    def __init__(self):
+        self.max_sessions = int(os.getenv("CHAT_SESSION_CACHE_SIZE", "1000"))
+        self.max_turns = int(os.getenv("CHAT_SESSION_MAX_TURNS", "100"))
+        self.token_budget = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+        self.summary_provider = os.getenv("CHAT_SUMMARY_PROVIDER")
+        self.summary_model = os.getenv("CHAT_SUMMARY_MODEL")
+
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        self._counters = {"hits": 0, "loads": 0, "starts": 0, "evictions": 0, "summaries": 0, "summary_failures": 0}
+
+    def _load(self, session_id: str) -> SessionState:
+        db = next(get_db())
+        try:
+            saved = db.query(ChatSummary).filter(ChatSummary.session_id == session_id).first()
+            query = db.query(ChatLog).filter(ChatLog.session_id == session_id)
+            if saved and saved.through_id:
+                # Turns already folded into the summary are not needed again
+                query = query.filter(ChatLog.id > saved.through_id)
+            rows = query.order_by(ChatLog.id.desc()).limit(self.max_turns).all()
+        finally:
+            db.close()
+        turns = [{"id": r.id, "role": r.role, "content": r.content, "tokens": count_tokens(r.content)} for r in reversed(rows)]
+        state = SessionState(turns)
+        if saved:
+            state.summary = saved.summary or ""
+        return state
+
+    def _insert(self, session_id: str, state: SessionState, counter: str) -> SessionState:
+        with self._lock:
+            # Another request may have loaded it meanwhile; keep the first copy
+            state = self._sessions.setdefault(session_id, state)
+            self._sessions.move_to_end(session_id)
+            self._counters[counter] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._counters["evictions"] += 1
+        return state
+
+    def _cached(self, session_id: str) -> Optional[SessionState]:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self._sessions.move_to_end(session_id)
+                self._counters["hits"] += 1
+            return state
+
+    async def _state(self, session_id: str) -> SessionState:
+        state = self._cached(session_id)
+        if state is not None:
+            return state
+        # A blocking query; keep it off the event loop
+        return self._insert(session_id, await asyncio.to_thread(self._load, session_id), "loads")
+
+    def start(self, session_id: str):
+        """Registers a session id that was just issued, so its first turn needs no database lookup."""
+        self._insert(session_id, SessionState([]), "starts")
+
+    def _window_start(self, state: SessionState) -> int:
+        """
+        Index of the oldest turn that fits in the budget next to the summary,
+        moved forward to a user turn so the window never opens on a reply to
+        a question it left out. Unsummarized turns before it are due to be
+        folded into the summary.
+        """
+        budget = self.token_budget - (count_tokens(state.summary) if state.summary else 0)
+        start = len(state.turns)
+        while start > state.summarized and state.turns[start - 1]["tokens"] <= budget:
+            budget -= state.turns[start - 1]["tokens"]
+            start -= 1
+        while start < len(state.turns) and state.turns[start]["role"] != "user":
+            start += 1
+        return start
+
+    async def window(self, session_id: str) -> List[Dict[str, str]]:
+        state = await self._state(session_id)
+        history = []
+        if state.summary:
+            history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{state.summary}"})
+        # Turns that outgrew the budget are left out even before the summary covering them is done
+        history.extend({"role": t["role"], "content": t["content"]} for t in state.turns[self._window_start(state):])
+        return history
+
+    def append(self, session_id: str, role: str, content: str, log_id: Optional[int] = None):
+        state = self._cached(session_id)
+        if state is None:
+            # Evicted since window(); the turn is in chat_logs, so the next load picks it up
+            return
+        state.turns.append({"id": log_id, "role": role, "content": content, "tokens": count_tokens(content)})
+        overflow = len(state.turns) - self.max_turns
+        if overflow > 0:
+            del state.turns[:overflow]
+            state.summarized = max(0, state.summarized - overflow)
+            state.dropped += overflow
+
+    def schedule_summary(self, session_id: str, provider: str, model: str):
+        """Folds turns that fell out of the window into the summary, in the background."""
+        state = self._cached(session_id)
+        if state is None or state.summarizing or self._window_start(state) <= state.summarized:
+            return
+        state.summarizing = True
+        task = asyncio.create_task(self._summarize(session_id, state, self.summary_provider or provider, self.summary_model or model))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _save_summary(self, session_id: str, summary: str, through_id: Optional[int]):
+        db = next(get_db())
+        try:
+            db.merge(ChatSummary(session_id=session_id, summary=summary, through_id=through_id))
+            db.commit()
+        finally:
+            db.close()
+
+    async def _summarize(self, session_id: str, state: SessionState, provider: str, model: str):
+        from app.agent.client_pool import client_pool
+        try:
+            end = self._window_start(state)
+            dropped = state.dropped
+            turns = state.turns[state.summarized:end]
+            transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+            prompt = (
+                "Update the running summary of a conversation with the new turns below. "
+                "Keep facts, names, decisions and open questions; stay under 200 words.\n\n"
+                f"Current summary:\n{state.summary or '(none)'}\n\nNew turns:\n{transcript}\n\nUpdated summary:"
+            )
+            summary = (await client_pool.get(provider, model, 0.0).chat(prompt)).strip()
+            through_id = next((t["id"] for t in reversed(turns) if t.get("id") is not None), None)
+            # Saved next to the messages, so a reload (or another worker) starts from it
+            await asyncio.to_thread(self._save_summary, session_id, summary, through_id)
+            state.summary = summary
+            # Turns may have been trimmed from the front while we waited
+            state.summarized = max(0, end - (state.dropped - dropped))
+            self._counters["summaries"] += 1
+        except Exception as e:
+            self._counters["summary_failures"] += 1
+            print(f"Warning: failed to summarize chat history: {e}")
+        finally:
+            state.summarizing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "token_budget": self.token_budget,
+                **self._counters,
+            }
+
+# Global Instance
+session_history = SessionHistory()
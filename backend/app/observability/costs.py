@@ -0,0 +1,144 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# USD per 1M tokens: (input, cached input, output). Matched by exact model name, after
+# dropping a snapshot suffix ("gpt-4o-2024-08-06", "gpt-4-0613", "gemini-1.5-pro-002")
+# or resolving a provider alias. Anything else is unpriced rather than billed as a sibling.
+PRICES: Dict[str, tuple] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4-turbo": (10.00, 10.00, 30.00),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+    "llama-3.1-70b": (0.59, 0.59, 0.79),
+    "llama-3.1-8b": (0.05, 0.05, 0.08),
+    "llama3-70b": (0.59, 0.59, 0.79),
+    "llama3-8b": (0.05, 0.05, 0.08),
+    "mixtral-8x7b": (0.24, 0.24, 0.24),
+    "gemini-1.5-pro": (1.25, 0.3125, 5.00),
+    "gemini-1.5-flash": (0.075, 0.01875, 0.30),
+    "gemini-pro": (0.50, 0.50, 1.50),
+    "fake": (0.0, 0.0, 0.0),
+}
+
+# Provider model ids that are priced like one of the entries above
+ALIASES: Dict[str, str] = {
+    "gpt-4-turbo-preview": "gpt-4-turbo",
+    "gpt-4-1106-preview": "gpt-4-turbo",
+    "gpt-4-0125-preview": "gpt-4-turbo",
+    "llama-3.1-70b-versatile": "llama-3.1-70b",
+    "llama-3.1-8b-instant": "llama-3.1-8b",
+    "llama3-70b-8192": "llama3-70b",
+    "llama3-8b-8192": "llama3-8b",
+    "mixtral-8x7b-32768": "mixtral-8x7b",
+    "gemini-1.5-pro-latest": "gemini-1.5-pro",
+    "gemini-1.5-flash-latest": "gemini-1.5-flash",
+}
+
+# LLM_PRICES='{"my-model": [1.0, 0.5, 2.0]}' adds or overrides entries
+PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+_SNAPSHOT = re.compile(r"-(\d{4}-\d{2}-\d{2}|\d{4}|\d{3})$")
+
+def price_for(model: str) -> Optional[tuple]:
+    for name in (model, _SNAPSHOT.sub("", model)):
+        name = ALIASES.get(name, name)
+        if name in PRICES:
+            return PRICES[name]
+    return None
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+    price = price_for(model)
+    if price is None:
+        return None
+    input_price, cached_price, output_price = price
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+_encodings: Dict[str, Any] = {}
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """tiktoken when it is installed, otherwise ~4 characters per token."""
+    try:
+        import tiktoken
+    except ImportError:
+        return len(text) // 4 + 1
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Non-OpenAI models: cl100k is a reasonable approximation
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return len(_encodings[model].encode(text, disallowed_special=()))
+
+class UsageLedger:
+    """Recent per-call usage records for cost rollups by model and time window."""
+
+    def __init__(self):
+        self._records: Deque[Dict[str, Any]] = deque(maxlen=int(os.getenv("LLM_USAGE_LEDGER_SIZE", "100000")))
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, prompt_tokens: int, completion_tokens: int,
+               cached_tokens: int = 0, source: str = "provider", trace_id: Optional[str] = None) -> Dict[str, Any]:
+        entry = {
+            "timestamp": time.time(),
+            "provider": provider,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "source": source,
+            "cost_usd": cost_usd(model, prompt_tokens, completion_tokens, cached_tokens),
+            "trace_id": trace_id,
+        }
+        with self._lock:
+            self._records.append(entry)
+        return entry
+
+    def rollup(self, window: float = 3600, bucket: Optional[float] = None) -> Dict[str, Any]:
+        since = time.time() - window
+        with self._lock:
+            records = [r for r in self._records if r["timestamp"] >= since]
+
+        def empty() -> Dict[str, Any]:
+            return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0, "unpriced_calls": 0}
+
+        def add(total: Dict[str, Any], r: Dict[str, Any]):
+            total["calls"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                total[key] += r[key]
+            if r["cost_usd"] is None:
+                total["unpriced_calls"] += 1
+            else:
+                total["cost_usd"] += r["cost_usd"]
+
+        overall, by_model, by_trace, buckets = empty(), {}, {}, {}
+        for r in records:
+            add(overall, r)
+            add(by_model.setdefault(f"{r['provider']}:{r['model']}", empty()), r)
+            if r["trace_id"]:
+                add(by_trace.setdefault(r["trace_id"], empty()), r)
+            if bucket:
+                add(buckets.setdefault(int(r["timestamp"] // bucket * bucket), empty()), r)
+
+        def rounded(total: Dict[str, Any]) -> Dict[str, Any]:
+            return dict(total, cost_usd=round(total["cost_usd"], 6))
+
+        result = {
+            "window_s": window,
+            "total": rounded(overall),
+            "by_model": {k: rounded(v) for k, v in by_model.items()},
+            # Most expensive traces first: these are the workflows burning the budget
+            "top_traces": dict(sorted(((k, rounded(v)) for k, v in by_trace.items()), key=lambda kv: -kv[1]["cost_usd"])[:20]),
+        }
+        if bucket:
+            result["buckets"] = [dict(rounded(v), start=k) for k, v in sorted(buckets.items())]
+        return result
+
+# Global Instance
+usage_ledger = UsageLedger()
@@ -0,0 +1,82 @@
+"""
+Cold-start import cost of a module, from CPython's -X importtime output.
+
+    python -m app.observability.importtime --module app.main --budget-ms 1500
+
+Prints the most expensive modules and per-package totals as JSON and exits
+with status 1 when the total import time is over budget, so CI can hold
+worker boot time steady for autoscaling.
+"""
+import sys
+import json
+import argparse
+import subprocess
+from typing import Any, Dict, List
+
+def measure(module: str) -> List[Dict[str, Any]]:
+    """Imports `module` in a fresh interpreter and returns one record per imported module."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    records = []
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        records.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(parts[0]),
+            "cumulative_us": int(parts[1]),
+        })
+    return records
+
+def report(module: str, top: int = 25) -> Dict[str, Any]:
+    records = measure(module)
+    # Self times partition the whole import, so they sum to the total without double counting
+    total_us = sum(r["self_us"] for r in records)
+
+    packages: Dict[str, int] = {}
+    for r in records:
+        root = r["module"].split(".")[0]
+        packages[root] = packages.get(root, 0) + r["self_us"]
+
+    slowest = sorted(records, key=lambda r: -r["cumulative_us"])[:top]
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 2),
+        "modules_imported": len(records),
+        "by_package_ms": {k: round(v / 1000, 2) for k, v in sorted(packages.items(), key=lambda kv: -kv[1])[:top]},
+        "slowest_modules": [
+            {"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 2), "self_ms": round(r["self_us"] / 1000, 2)}
+            for r in slowest
+        ],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    try:
+        result = report(args.module, args.top)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(2)
+
+    if args.budget_ms is not None:
+        result["budget_ms"] = args.budget_ms
+        result["within_budget"] = result["total_ms"] <= args.budget_ms
+    print(json.dumps(result, indent=2))
+    if args.budget_ms is not None and not result["within_budget"]:
+        sys.exit(1)
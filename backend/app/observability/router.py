@@ -1,3 +1,4 @@
+from typing import Optional
 from fastapi import APIRouter
 from app.observability.tracer import tracer
 
@@ -7,6 +8,48 @@ router = APIRouter(prefix="/observability", tags=["observability"])
 def list_traces():
     return {"traces": tracer.get_traces()}
 
+@router.get("/clients")
+def client_pool_stats():
+    from app.agent.client_pool import client_pool
+    return client_pool.stats()
+
+@router.get("/providers")
+def llm_providers():
+    from app.agent.providers import providers
+    return {"providers": providers.list_providers()}
+
+@router.get("/llm_cache")
+def llm_cache_stats():
+    from app.agent.response_cache import response_cache
+    return response_cache.stats()
+
+@router.delete("/llm_cache")
+def clear_llm_cache():
+    from app.agent.response_cache import response_cache
+    response_cache.clear()
+    return {"status": "cleared"}
+
+@router.get("/scheduler")
+def scheduler_stats():
+    from app.agent.scheduler import scheduler
+    return scheduler.stats()
+
+@router.get("/counters")
+def counters():
+    from app.agent.singleflight import singleflight
+    return {"counters": tracer.counters, "singleflight": singleflight.stats()}
+
+@router.get("/sessions")
+def session_stats():
+    from app.memory.history import session_history
+    return session_history.stats()
+
+@router.get("/costs")
+def cost_rollup(window: float = 3600, bucket: Optional[float] = None):
+    """Token and cost totals over the last `window` seconds, by model and trace; `bucket` adds a time series."""
+    from app.observability.costs import usage_ledger
+    return usage_ledger.rollup(window, bucket)
+
 @router.get("/traces/{trace_id}")
 def get_trace(trace_id: str):
     return {"spans": tracer.get_trace_details(trace_id)}
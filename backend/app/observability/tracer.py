@@ -1,8 +1,13 @@
 import time
 import uuid
-from typing import List, Dict, Any, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Iterator, Optional
 from datetime import datetime
 
+# The span code deeper in the call stack (e.g. Agent.chat) should report into
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
 class Span:
     def __init__(self, trace_id: str, name: str, parent_id: Optional[str] = None):
         self.id = str(uuid.uuid4())
@@ -17,6 +22,10 @@ class Span:
     def set_attribute(self, key: str, value: Any):
         self.attributes[key] = value
 
+    def add_to_attribute(self, key: str, amount: float):
+        """Accumulates a numeric attribute, e.g. token counts over several LLM calls in one span."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
     def add_event(self, name: str, attributes: Dict[str, Any] = {}):
         self.events.append({
             "name": name,
@@ -44,6 +53,7 @@ class Tracer:
     def __init__(self):
         self._traces: Dict[str, List[Span]] = {}
         self._active_spans: Dict[str, Span] = {} # Map span_id -> Span
+        self.counters: Dict[str, int] = {} # Process-wide event counts (e.g. coalesced LLM calls)
 
     def start_trace(self, name: str) -> Span:
         trace_id = str(uuid.uuid4())
@@ -60,6 +70,21 @@ class Tracer:
         self._traces[trace_id].append(span)
         return span
 
+    @contextmanager
+    def activate(self, span: "Span") -> Iterator["Span"]:
+        """Makes span the current span for this task while the block runs."""
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    def current_span(self) -> Optional["Span"]:
+        return _current_span.get()
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
     def get_traces(self) -> List[Dict[str, Any]]:
         # Summarize traces
         summary = []
@@ -67,16 +92,13 @@ class Tracer:
             if not spans: continue
             root = next((s for s in spans if s.parent_id is None), spans[0])
             
-            # Calculate cost
+            # Cost and tokens as recorded on LLM spans from provider usage (see app/observability/costs.py)
             total_cost = 0.0
+            prompt_tokens = completion_tokens = 0
             for span in spans:
-                # Naive cost estimation: $0.03 per 1k chars for demo (approx GPT-4 pricing)
-                # In real app, we'd use token counts from provider response
-                if span.name == "llm_generation" or span.name == "agent_chat": # Match span names
-                    # Check for response length or prompt length attributes
-                    # For now we only have response_length stored in 'llm_generation' span
-                    resp_len = span.attributes.get("response_length", 0)
-                    total_cost += (resp_len / 4000) * 0.03 
+                total_cost += span.attributes.get("cost_usd") or 0.0
+                prompt_tokens += span.attributes.get("prompt_tokens", 0)
+                completion_tokens += span.attributes.get("completion_tokens", 0)
 
             summary.append({
                 "trace_id": trace_id,
@@ -84,7 +106,9 @@ class Tracer:
                 "start_time": root.start_time,
                 "duration": max((s.end_time or time.time()) for s in spans) - root.start_time,
                 "span_count": len(spans),
-                "cost": round(total_cost, 6)
+                "cost": round(total_cost, 6),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens
             })
         return sorted(summary, key=lambda x: x['start_time'], reverse=True)
 
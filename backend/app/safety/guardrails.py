@@ -27,5 +27,43 @@ class SafetyGuardrails:
                 return False, f"Blocked content detected: {term}"
         return True, None
 
+class StreamGuard:
+    """
+    Applies the guardrails to a token stream. Text is released only up to the
+    last whitespace, so a PII match split across chunks is still redacted,
+    and blocked terms are checked across chunk boundaries.
+    """
+
+    def __init__(self, rails: SafetyGuardrails):
+        self.rails = rails
+        self.pending = ""
+        self.window = ""
+        self.lookbehind = max((len(t) for t in rails.blocked_terms), default=0)
+        self.blocked: Optional[str] = None
+
+    def feed(self, chunk: str) -> str:
+        """Returns the sanitized text that is now safe to emit ("" if held back or blocked)."""
+        if self.blocked:
+            return ""
+        # Only the new chunk plus a term-length tail can contain a new match
+        self.window = (self.window + chunk)[-(len(chunk) + self.lookbehind):]
+        is_safe, error_msg = self.rails.validate_output(self.window)
+        if not is_safe:
+            self.blocked = error_msg
+            return ""
+
+        self.pending += chunk
+        cut = max(self.pending.rfind(" "), self.pending.rfind("\n"))
+        if cut < 0:
+            return ""
+        ready, self.pending = self.pending[:cut + 1], self.pending[cut + 1:]
+        return self.rails.sanitize(ready)
+
+    def flush(self) -> str:
+        if self.blocked:
+            return ""
+        ready, self.pending = self.pending, ""
+        return self.rails.sanitize(ready)
+
 # Global Instance
 guardrails = SafetyGuardrails()
@@ -1,10 +1,15 @@
+import os
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 # Initialize Limiter
 # Uses in-memory storage by default, keyed by remote IP address
-limiter = Limiter(key_func=get_remote_address)
+# RATE_LIMIT_ENABLED=false lifts the per-IP limits, e.g. for load tests from one host
+limiter = Limiter(
+    key_func=get_remote_address,
+    enabled=os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes"),
+)
 
 def get_limiter():
     return limiter
@@ -0,0 +1,139 @@
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+# Exit codes from coreutils `timeout` (124) and SIGKILL (137)
+TIMEOUT_EXIT_CODES = (124, 137)
+
+class Execution(ABC):
+    """Handle for one running snippet, returned by SandboxBackend.start()."""
+
+    @abstractmethod
+    def chunks(self) -> Iterator[Tuple[str, bytes]]:
+        """Yields ("stdout" | "stderr", bytes) as output is produced."""
+
+    @abstractmethod
+    def kill(self):
+        ...
+
+    @abstractmethod
+    def wait(self) -> Optional[int]:
+        """Exit code once the output is drained (124 on timeout, 137 when killed)."""
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        Resource usage after wait(): cpu_time_ms, peak_memory_bytes (with
+        peak_memory_source and peak_memory_scope, "run" or "container") and
+        oom_killed (with oom_source) where the backend can measure them.
+        """
+        return {}
+
+class Channel(ABC):
+    """
+    Byte pipe to a long-lived sandboxed process (its stdin/stdout), returned
+    by SandboxBackend.spawn(). Used for persistent tool workers.
+    """
+
+    @abstractmethod
+    def send(self, data: bytes):
+        ...
+
+    @abstractmethod
+    def recv_exactly(self, size: int, timeout: float) -> bytes:
+        """Raises EOFError if the process went away and TimeoutError on timeout."""
+
+    @abstractmethod
+    def close(self):
+        ...
+
+class SandboxBackend(ABC):
+    """
+    Where snippets actually run. SandboxExecutor owns languages, limits,
+    caching and output capping; a backend only provides isolated execution.
+    """
+    name = "base"
+
+    def unavailable_reason(self) -> Optional[str]:
+        """None when the backend can run code, otherwise a user-facing reason."""
+        return None
+
+    @abstractmethod
+    def image_id(self, language: str) -> str:
+        """Identifies the runtime a snippet executes on (used for cache keys)."""
+
+    @abstractmethod
+    def acquire(self, language: str, profile: Dict[str, Any]) -> Tuple[Any, bool]:
+        """
+        Returns (session, warm). A session is bound to one language and limits
+        profile and may be reused for several runs.
+        """
+
+    def release(self, session: Any):
+        pass
+
+    def needs_recycle(self, session: Any) -> bool:
+        return False
+
+    def invalidate(self, session: Any):
+        """Called when a run failed in a way that may have left the session unusable."""
+        pass
+
+    @abstractmethod
+    def start(self, session: Any, command: List[str], profile: Dict[str, Any]) -> Execution:
+        ...
+
+    @abstractmethod
+    def spawn(self, language: str, command: List[str], profile: Dict[str, Any]) -> Channel:
+        """Starts a long-lived process and returns a channel to its stdin/stdout."""
+
+    def prepare(self, language: str) -> Dict[str, Any]:
+        """Fetches whatever a language needs to run (images, binaries). Blocking."""
+        return {}
+
+    def prewarm(self, language: str, profile: Dict[str, Any]):
+        """Brings the backend to its steady state for a language before traffic arrives."""
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def shutdown(self):
+        pass
+
+class LatencyStats:
+    """Rolling latency samples (ms), split into cold and warm runs."""
+
+    def __init__(self, maxlen: int = 1000):
+        self._samples: Dict[str, Deque[float]] = {"cold": deque(maxlen=maxlen), "warm": deque(maxlen=maxlen)}
+        self._lock = threading.Lock()
+
+    def record(self, warm: bool, duration_ms: float):
+        with self._lock:
+            self._samples["warm" if warm else "cold"].append(duration_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        def summarize(samples: List[float]) -> Dict[str, Any]:
+            if not samples:
+                return {"count": 0}
+            ordered = sorted(samples)
+            pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+            return {
+                "count": len(ordered),
+                "mean_ms": round(sum(ordered) / len(ordered), 2),
+                "p50_ms": round(pick(0.50), 2),
+                "p95_ms": round(pick(0.95), 2),
+            }
+
+        with self._lock:
+            return {kind: summarize(list(s)) for kind, s in self._samples.items()}
+
+def create_backend(name: str, configs: Dict[str, Dict[str, Any]]) -> SandboxBackend:
+    # Imported lazily so a process-only deployment never needs the docker SDK
+    if name == "docker":
+        from app.sandbox.docker_backend import DockerBackend
+        return DockerBackend(configs)
+    if name == "process":
+        from app.sandbox.process_backend import ProcessBackend
+        return ProcessBackend(configs)
+    raise ValueError(f"Unknown sandbox backend: {name}")
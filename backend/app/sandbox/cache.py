@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+class ResultCache:
+    """
+    Content-addressed cache for deterministic sandbox runs.
+    Two tiers: an in-memory LRU and a directory of JSON files on disk.
+    Both tiers honour a TTL and a max-bytes budget.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("SANDBOX_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.ttl = float(os.getenv("SANDBOX_CACHE_TTL", "3600"))
+        self.max_memory_bytes = int(os.getenv("SANDBOX_CACHE_MAX_MEMORY_BYTES", str(64 * 1024 * 1024)))
+        self.max_disk_bytes = int(os.getenv("SANDBOX_CACHE_MAX_DISK_BYTES", str(512 * 1024 * 1024)))
+        self.cache_dir = os.getenv("SANDBOX_CACHE_DIR", "./sandbox_cache")
+
+        self._memory: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    @staticmethod
+    def make_key(language: str, image_digest: str, code: str, limits: Dict[str, Any]) -> str:
+        code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        material = json.dumps({
+            "language": language,
+            "image": image_digest,
+            "code": code_hash,
+            "limits": limits,
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _disk_entries(self):
+        """Yields (path, size, mtime) for every file in the disk tier."""
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield path, st.st_size, st.st_mtime
+
+    def _remember(self, key: str, expires_at: float, result: Dict[str, Any]):
+        # Caller holds the lock
+        size = len(json.dumps(result))
+        if size > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        self._memory[key] = (expires_at, size, result)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, old_size, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= old_size
+            self._counters["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                expires_at, size, result = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return dict(result)
+                del self._memory[key]
+                self._memory_bytes -= size
+
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except (FileNotFoundError, ValueError):
+            record = None
+
+        with self._lock:
+            if record and record.get("expires_at", 0) > now:
+                self._remember(key, record["expires_at"], record["result"])
+                self._counters["disk_hits"] += 1
+                return dict(record["result"])
+            self._counters["misses"] += 1
+
+        if record:
+            self._unlink(path)
+        return None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, result)
+            self._counters["stores"] += 1
+
+        payload = json.dumps({"expires_at": expires_at, "result": result})
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, "w") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += len(payload) - previous
+                over_budget = self._disk_bytes > self.max_disk_bytes
+            if over_budget:
+                self._evict_disk()
+        except OSError as e:
+            print(f"Warning: sandbox cache write failed: {e}")
+
+    def _unlink(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _evict_disk(self):
+        # Expired entries go first, then the least recently written
+        now = time.time()
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        for path, size, mtime in entries:
+            with self._lock:
+                if self._disk_bytes <= self.max_disk_bytes and mtime + self.ttl > now:
+                    continue
+                self._counters["evictions"] += 1
+            self._unlink(path)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        for path, _, _ in list(self._disk_entries()):
+            self._unlink(path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            lookups = hits + self._counters["misses"]
+            return {
+                "enabled": self.enabled,
+                "ttl": self.ttl,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                **self._counters,
+            }
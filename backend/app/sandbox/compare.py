@@ -0,0 +1,55 @@
+"""
+Side-by-side latency of the sandbox backends on this host.
+
+    python -m app.sandbox.compare --runs 20
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+from app.sandbox.executor import SandboxExecutor
+
+SNIPPETS = {
+    "python": "print('ok')",
+    "javascript": "console.log('ok')",
+    "bash": "echo ok",
+}
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def measure(backend: str, runs: int) -> Dict[str, Any]:
+    executor = SandboxExecutor(backend=backend)
+    reason = executor.backend.unavailable_reason()
+    if reason:
+        return {"error": reason}
+
+    report: Dict[str, Any] = {}
+    try:
+        for language, code in SNIPPETS.items():
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                result = executor.execute(language, code, no_cache=True)
+                if result["status"] == "error":
+                    report[language] = {"error": result["output"]}
+                    break
+                samples.append((time.perf_counter() - start) * 1000)
+            else:
+                report[language] = {
+                    "first_ms": round(samples[0], 2),
+                    "p50_ms": round(percentile(samples, 0.50), 2),
+                    "p95_ms": round(percentile(samples, 0.95), 2),
+                }
+    finally:
+        executor.backend.shutdown()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--backends", default="docker,process")
+    args = parser.parse_args()
+
+    print(json.dumps({name: measure(name, args.runs) for name in args.backends.split(",")}, indent=2))
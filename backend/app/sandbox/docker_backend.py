@@ -0,0 +1,217 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import os
+import time
+import socket
+from app.sandbox.backend import Channel, Execution, SandboxBackend, TIMEOUT_EXIT_CODES
+from app.sandbox.limits import container_limits
+from app.sandbox.pool import ContainerPool, PooledContainer
+
+class DockerExecution(Execution):
+    def __init__(self, api: Any, pool: ContainerPool, pooled: PooledContainer, command: List[str], timeout: int):
+        self.api = api
+        self.pool = pool
+        self.pooled = pooled
+        self.killed = False
+        self._before = pooled.cgroup
+        self._after: Optional[Dict[str, Any]] = None
+        # `timeout` keeps a stuck snippet from wedging the pooled container
+        self.exec_id = api.exec_create(
+            pooled.container.id,
+            ["timeout", "-k", "1", str(timeout)] + command,
+            stdout=True,
+            stderr=True,
+        )["Id"]
+
+    def chunks(self) -> Iterator[Tuple[str, bytes]]:
+        for stdout, stderr in self.api.exec_start(self.exec_id, stream=True, demux=True):
+            if stdout:
+                yield "stdout", stdout
+            if stderr:
+                yield "stderr", stderr
+
+    def kill(self):
+        # exec processes cannot be signalled individually; take the container down
+        self.killed = True
+        self.pooled.dirty = True
+        self.pooled.container.kill()
+
+    def wait(self) -> Optional[int]:
+        exit_code = self.api.exec_inspect(self.exec_id).get("ExitCode")
+        if exit_code is None or exit_code in TIMEOUT_EXIT_CODES:
+            self.pooled.dirty = True
+        elif exit_code != 0 and self.pool.recycle_on_failure:
+            self.pooled.dirty = True
+        if not self.killed:
+            # One exec both reads the cgroup counters and scrubs leftovers before the next run
+            self._after = self.pool.after_run(self.pooled)
+        return exit_code
+
+    def usage(self) -> Dict[str, Any]:
+        usage: Dict[str, Any] = {}
+        before, after = self._before, self._after
+        if before is None or not after:
+            return usage
+        if "cpu_ns" in after:
+            usage["cpu_time_ms"] = round((after["cpu_ns"] - before.get("cpu_ns", 0)) / 1e6, 2)
+        if "peak" in after:
+            usage["peak_memory_bytes"] = after["peak"]
+            usage["peak_memory_source"] = after["peak_source"]
+            # The mark covers the container's whole life: it is this run's peak only if this run raised it,
+            # otherwise it is an upper bound set by an earlier run
+            usage["peak_memory_scope"] = "run" if after["peak"] > before.get("peak", 0) else "container"
+        if "oom_kill" in after:
+            usage["oom_killed"] = after["oom_kill"] > before.get("oom_kill", 0)
+            usage["oom_source"] = after["oom_source"]
+        return usage
+
+class DockerChannel(Channel):
+    """stdin/stdout of a dedicated container, over the attach socket."""
+
+    def __init__(self, container: Any, on_close: Optional[Callable[[], None]] = None):
+        from docker.errors import DockerException
+        from docker.utils.socket import SocketError, next_frame_header, read_exactly
+        self._next_frame_header = next_frame_header
+        self._read_exactly = read_exactly
+        self._errors = (SocketError, DockerException, ConnectionError)
+
+        self.container = container
+        self.on_close = on_close
+        self.sock = container.attach_socket(params={"stdin": 1, "stdout": 1, "stream": 1})
+        self.raw = getattr(self.sock, "_sock", self.sock)
+        self.buffer = b""
+
+    def send(self, data: bytes):
+        self.raw.sendall(data)
+
+    def recv_exactly(self, size: int, timeout: float) -> bytes:
+        self.raw.settimeout(timeout)
+        try:
+            # Without a TTY the attach stream is multiplexed into 8-byte-header frames
+            while len(self.buffer) < size:
+                stream, length = self._next_frame_header(self.sock)
+                if length < 0:
+                    raise EOFError("Worker container exited")
+                payload = self._read_exactly(self.sock, length)
+                if stream == 1:
+                    self.buffer += payload
+        except socket.timeout:
+            raise TimeoutError("Worker did not answer in time")
+        except self._errors as e:
+            raise EOFError(str(e))
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        try:
+            self.sock.close()
+        finally:
+            try:
+                self.container.remove(force=True)
+            except Exception as e:
+                print(f"Warning: failed to remove worker container: {e}")
+            finally:
+                if self.on_close:
+                    self.on_close()
+
+class DockerBackend(SandboxBackend):
+    name = "docker"
+
+    def __init__(self, configs: Dict[str, Dict[str, Any]], client: Any = None):
+        self.configs = configs
+        self.client = client
+        if self.client is None:
+            try:
+                # A missing SDK is treated like a missing daemon
+                import docker
+                self.client = docker.from_env()
+            except Exception:
+                print("Warning: Docker client not initialized.")
+
+        self.pool = ContainerPool(self.client, configs) if self.client else None
+        # image -> (expires_at, id); a tag can be re-pushed, so ids are looked up again after a while
+        self.image_id_ttl = float(os.getenv("SANDBOX_IMAGE_ID_TTL", "60"))
+        self._image_ids: Dict[str, Tuple[float, str]] = {}
+
+    def unavailable_reason(self) -> Optional[str]:
+        return None if self.client else "Docker not available"
+
+    def image_id(self, language: str) -> str:
+        image = self.configs[language]["image"]
+        entry = self._image_ids.get(image)
+        if entry is None or entry[0] <= time.monotonic():
+            # A tag can move; key on the image id actually being run
+            self._remember_image_id(image, self.client.images.get(image).id)
+        return self._image_ids[image][1]
+
+    def _remember_image_id(self, image: str, image_id: str):
+        # A digest reference always names the same image, so it never needs another lookup
+        ttl = float("inf") if "@sha256:" in image else self.image_id_ttl
+        self._image_ids[image] = (time.monotonic() + ttl, image_id)
+
+    def acquire(self, language: str, profile: Dict[str, Any]) -> Tuple[PooledContainer, bool]:
+        return self.pool.acquire(language, profile)
+
+    def release(self, session: PooledContainer):
+        self.pool.release(session)
+
+    def needs_recycle(self, session: PooledContainer) -> bool:
+        return session.dirty or session.runs >= self.pool.max_runs
+
+    def invalidate(self, session: PooledContainer):
+        session.dirty = True
+
+    def start(self, session: PooledContainer, command: List[str], profile: Dict[str, Any]) -> DockerExecution:
+        session.runs += 1
+        return DockerExecution(self.client.api, self.pool, session, command, profile["timeout"])
+
+    def spawn(self, language: str, command: List[str], profile: Dict[str, Any]) -> DockerChannel:
+        # Worker containers count against the same live-container limit as the pool
+        self.pool.claim()
+        try:
+            container = self.client.containers.run(
+                self.configs[language]["image"],
+                command=command,
+                detach=True,
+                stdin_open=True,
+                network_disabled=True, # Security
+                labels={"aio-sandbox.worker": language},
+                **container_limits(profile),
+            )
+        except Exception:
+            self.pool.unclaim()
+            raise
+        try:
+            return DockerChannel(container, on_close=self.pool.unclaim)
+        except Exception:
+            try:
+                container.remove(force=True)
+            finally:
+                self.pool.unclaim()
+            raise
+
+    def prepare(self, language: str) -> Dict[str, Any]:
+        """
+        Pulls the language image and pins the config to its digest, so a tag
+        that moves after startup cannot change what we run (or trigger a pull
+        inside a request).
+        """
+        config = self.configs[language]
+        reference = config["image"]
+        image = self.client.images.pull(reference)
+        if "@sha256:" not in reference:
+            repository = reference.rsplit(":", 1)[0] if ":" in reference.split("/")[-1] else reference
+            digests = [d for d in image.attrs.get("RepoDigests") or [] if d.startswith(f"{repository}@")]
+            if digests:
+                config["image"] = digests[0]
+        self._remember_image_id(config["image"], image.id)
+        return {"image": config["image"], "requested": reference, "image_id": image.id}
+
+    def prewarm(self, language: str, profile: Dict[str, Any]):
+        self.pool.warm(language, profile)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pool": self.pool.stats()} if self.pool else {}
+
+    def shutdown(self):
+        if self.pool:
+            self.pool.shutdown()
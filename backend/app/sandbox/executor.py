@@ -1,63 +1,322 @@
-import docker
 import asyncio
-from typing import Dict, Any, Optional
+import codecs
+import os
+import time
+import threading
+from collections import deque
+from typing import Deque, Dict, Any, Iterator, List, Optional, Tuple
+from app.sandbox.backend import LatencyStats, TIMEOUT_EXIT_CODES, create_backend
+from app.sandbox.cache import ResultCache
+from app.sandbox.limits import LIMIT_PROFILES, get_profile
 
 class SandboxExecutor:
-    def __init__(self):
-        try:
-            self.client = docker.from_env()
-        except Exception:
-            self.client = None
-            print("Warning: Docker client not initialized.")
-            
+    def __init__(self, backend: Optional[str] = None):
+        # Images can be pinned by digest per deployment, e.g.
+        # SANDBOX_IMAGE_PYTHON=python:3.11-slim@sha256:...; warmup pins the rest.
         self.configs = {
             "python": {
-                "image": "python:3.11-slim",
+                "image": os.getenv("SANDBOX_IMAGE_PYTHON", "python:3.11-slim"),
                 "command": ["python", "-c"],
                 "file_ext": "py"
             },
             "javascript": {
-                "image": "node:18-slim",
+                "image": os.getenv("SANDBOX_IMAGE_JAVASCRIPT", "node:18-slim"),
                 "command": ["node", "-e"],
                 "file_ext": "js"
             },
             "bash": {
-                "image": "ubuntu:latest",
+                "image": os.getenv("SANDBOX_IMAGE_BASH", "ubuntu:latest"),
                 "command": ["bash", "-c"],
                 "file_ext": "sh"
             }
         }
+        # Memory/CPU/timeout limits come from named profiles (see app.sandbox.limits)
+        self.profiles = LIMIT_PROFILES
+        # Hard cap on captured output; the snippet is killed once it is exceeded
+        self.max_output_bytes = int(os.getenv("SANDBOX_MAX_OUTPUT_BYTES", str(1024 * 1024)))
+        # "docker" (default) or "process"; chosen per deployment
+        self.backend = create_backend(backend or os.getenv("SANDBOX_BACKEND", "docker"), self.configs)
+        self.cache = ResultCache()
+        self.latency = LatencyStats()
 
-    def execute(self, language: str, code: str) -> Dict[str, Any]:
-        if not self.client:
-            return {"status": "error", "output": "Docker not available"}
-            
-        config = self.configs.get(language.lower())
-        if not config:
+    def _check(self, language: str, profile: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        reason = self.backend.unavailable_reason()
+        if reason:
+            return {"status": "error", "output": reason}
+        if language.lower() not in self.configs:
             return {"status": "error", "output": f"Language {language} not supported"}
-            
-        try:
-            container = self.client.containers.run(
-                config["image"],
-                command=config["command"] + [code],
-                detach=True,
-                network_disabled=True, # Security
-                mem_limit="128m",
-                cpu_quota=50000,
-            )
-            
-            exit_code = container.wait(timeout=10)
-            logs = container.logs().decode("utf-8")
-            container.remove()
-            
-            return {
-                "status": "success" if exit_code['StatusCode'] == 0 else "failure",
-                "output": logs,
-                "exit_code": exit_code['StatusCode']
+        if profile is not None and profile not in self.profiles:
+            return {"status": "error", "output": f"Unknown limits profile: {profile}"}
+        return None
+
+    def _cache_key(self, language: str, code: str, profile: Dict[str, Any]) -> Optional[str]:
+        try:
+            digest = self.backend.image_id(language)
+        except Exception:
+            # Image not present locally yet; just skip the cache for this run
+            return None
+        limits = dict(profile, max_output_bytes=self.max_output_bytes)
+        return ResultCache.make_key(language, f"{self.backend.name}:{digest}", code, limits)
+
+    def _cached(self, language: str, code: str, profile: Dict[str, Any], no_cache: bool,
+                lookup: bool = True) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Returns (key, hit). key is None when the cache does not apply; lookup=False only computes the key."""
+        if no_cache or not self.cache.enabled:
+            return None, None
+        key = self._cache_key(language.lower(), code, profile)
+        if key is None or not lookup:
+            return key, None
+        hit = self.cache.get(key)
+        if hit is not None:
+            hit["cached"] = True
+        return key, hit
+
+    def _store(self, key: Optional[str], result: Dict[str, Any]):
+        # Timeouts and system errors are not reproducible; never cache them
+        if key is None or result["status"] == "error" or result.get("timed_out") or result.get("oom_killed"):
+            return
+        self.cache.put(key, dict(result, cached=False))
+
+    def _stream_in(self, language: str, session: Any, warm: bool, code: str, profile: Dict[str, Any],
+                   max_output_bytes: Optional[int] = None,
+                   cancel: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Runs one snippet in a backend session and yields demultiplexed
+        {"type": "stdout" | "stderr", "data": ...} chunks as they are produced,
+        followed by a final {"type": "exit", ...} event.
+        """
+        config = self.configs[language]
+        limit = min(max_output_bytes or self.max_output_bytes, self.max_output_bytes)
+        start = time.time()
+        total_bytes = 0
+        truncated = False
+        decoders = {
+            "stdout": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            "stderr": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+        }
+
+        execution = None
+        finished = False
+        watcher = None
+        try:
+            execution = self.backend.start(session, config["command"] + [code], profile)
+            if cancel is not None:
+                watcher = self._kill_on_cancel(cancel, execution)
+
+            for name, chunk in execution.chunks():
+                room = limit - total_bytes
+                total_bytes += len(chunk)
+                if total_bytes > limit:
+                    chunk = chunk[:max(room, 0)]
+                    truncated = True
+                data = decoders[name].decode(chunk)
+                if data:
+                    yield {"type": name, "data": data}
+                if truncated or (cancel is not None and cancel.is_set()):
+                    # Runaway output or a dropped client: kill the snippet
+                    execution.kill()
+                    break
+
+            exit_code = execution.wait()
+            finished = True
+            if watcher is not None:
+                # The run is over; a late disconnect must not kill (and dirty) a clean session
+                watcher.set()
+            duration_ms = (time.time() - start) * 1000
+            self.latency.record(warm, duration_ms)
+
+            usage = execution.usage()
+            timed_out = exit_code == 124 or (exit_code in TIMEOUT_EXIT_CODES and duration_ms >= profile["timeout"] * 1000)
+            # Only the backend can tell an OOM kill from any other SIGKILL (e.g. the snippet's own kill -9)
+            oom_killed = usage.pop("oom_killed", False)
+
+            if truncated:
+                status = "failure"
+            else:
+                status = "success" if exit_code == 0 else "failure"
+
+            yield {
+                "type": "exit",
+                "status": status,
+                "exit_code": exit_code,
+                "output_bytes": total_bytes,
+                "truncated": truncated,
+                "timed_out": timed_out,
+                "oom_killed": oom_killed,
+                "profile": profile["name"],
+                "usage": {
+                    "wall_time_ms": round(duration_ms, 2),
+                    "cpu_time_ms": usage.get("cpu_time_ms"),
+                    "peak_memory_bytes": usage.get("peak_memory_bytes"),
+                    "peak_memory_source": usage.get("peak_memory_source"),
+                    "peak_memory_scope": usage.get("peak_memory_scope"),
+                    "oom_source": usage.get("oom_source"),
+                },
+                "backend": self.backend.name,
+                "warm": warm,
+                "duration_ms": round(duration_ms, 2)
             }
-            
+
+        except Exception as e:
+            self.backend.invalidate(session)
+            yield {"type": "error", "status": "error", "output": str(e)}
+        finally:
+            if watcher is not None:
+                watcher.set()
+            if execution is not None and not finished:
+                # The consumer closed the stream mid-run (GeneratorExit) or the run raised:
+                # stop the snippet and reap it before the session goes back to the pool
+                self._abort(session, execution)
+
+    def _kill_on_cancel(self, cancel: threading.Event, execution: Any) -> threading.Event:
+        """
+        Kills the execution as soon as `cancel` is set, even while the run
+        thread is blocked waiting for output. Set the returned event once the
+        run is over to stop watching.
+        """
+        done = threading.Event()
+
+        def watch():
+            while not done.is_set():
+                if cancel.wait(0.05):
+                    if not done.is_set():
+                        execution.kill()
+                    return
+
+        threading.Thread(target=watch, name="sandbox-cancel", daemon=True).start()
+        return done
+
+    def _abort(self, session: Any, execution: Any):
+        try:
+            execution.kill()
+            execution.wait()
+        except Exception as e:
+            print(f"Warning: failed to stop an abandoned sandbox run: {e}")
+        finally:
+            self.backend.invalidate(session)
+
+    def _run_in(self, language: str, session: Any, warm: bool, code: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        chunks: List[str] = []
+        for event in self._stream_in(language, session, warm, code, profile):
+            if event["type"] in ("stdout", "stderr"):
+                chunks.append(event["data"])
+            elif event["type"] == "error":
+                return {"status": "error", "output": event["output"]}
+            else:
+                result = {k: v for k, v in event.items() if k != "type"}
+                result["output"] = "".join(chunks)
+                return result
+        return {"status": "error", "output": "Execution produced no result"}
+
+    def cached(self, language: str, code: str, profile: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The cached result of this run, if there is one; never touches a container."""
+        if self._check(language, profile):
+            return None
+        return self._cached(language, code, get_profile(profile), no_cache=False)[1]
+
+    def execute(self, language: str, code: str, no_cache: bool = False, profile: Optional[str] = None,
+                cache_checked: bool = False) -> Dict[str, Any]:
+        """cache_checked: the caller already missed with cached(), so only store the result."""
+        error = self._check(language, profile)
+        if error:
+            return error
+
+        limits = get_profile(profile)
+        key, hit = self._cached(language, code, limits, no_cache, lookup=not cache_checked)
+        if hit is not None:
+            return hit
+
+        try:
+            session, warm = self.backend.acquire(language.lower(), limits)
         except Exception as e:
             return {"status": "error", "output": str(e)}
 
+        try:
+            result = self._run_in(language.lower(), session, warm, code, limits)
+        finally:
+            self.backend.release(session)
+        self._store(key, result)
+        return result
+
+    def stream(self, language: str, code: str, max_output_bytes: Optional[int] = None,
+               cancel: Optional[threading.Event] = None, profile: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Streaming variant of execute(); see _stream_in for the event shape."""
+        error = self._check(language, profile)
+        if error:
+            yield dict(error, type="error")
+            return
+
+        limits = get_profile(profile)
+        try:
+            session, warm = self.backend.acquire(language.lower(), limits)
+        except Exception as e:
+            yield {"type": "error", "status": "error", "output": str(e)}
+            return
+
+        try:
+            yield from self._stream_in(language.lower(), session, warm, code, limits, max_output_bytes, cancel)
+        finally:
+            self.backend.release(session)
+
+    def execute_many(self, language: str, work: Deque[Tuple[int, str, bool]],
+                     profile: Optional[str] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Drains (index, code, no_cache) items from a shared deque using a single container,
+        so several workers can split one batch. Each item still runs in its own
+        exec with its own exit code and timeout; a dirty container is swapped out.
+        """
+        results: List[Tuple[int, Dict[str, Any]]] = []
+        error = self._check(language, profile)
+        limits = None if error else get_profile(profile)
+        session = None
+        warm = False
+
+        try:
+            while True:
+                try:
+                    index, code, no_cache = work.popleft()
+                except IndexError:
+                    break
+
+                if error:
+                    results.append((index, error))
+                    continue
+
+                key, hit = self._cached(language, code, limits, no_cache)
+                if hit is not None:
+                    results.append((index, hit))
+                    continue
+
+                if session is None or self.backend.needs_recycle(session):
+                    if session is not None:
+                        self.backend.release(session)
+                        session = None
+                    try:
+                        session, warm = self.backend.acquire(language.lower(), limits)
+                    except Exception as e:
+                        results.append((index, {"status": "error", "output": str(e)}))
+                        continue
+
+                result = self._run_in(language.lower(), session, warm, code, limits)
+                self._store(key, result)
+                results.append((index, result))
+                # Subsequent items reuse an already running container
+                warm = True
+        finally:
+            if session is not None:
+                self.backend.release(session)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "profiles": self.profiles,
+            "latency": self.latency.summary(),
+            **self.backend.stats(),
+        }
+
 # Global Instance
 sandbox = SandboxExecutor()
+
+from app.sandbox.queue import SandboxJobQueue
+sandbox_queue = SandboxJobQueue(sandbox)
@@ -0,0 +1,22 @@
+import os
+from typing import Any, Dict
+
+# Named resource profiles callers can pick per execution.
+# mem_limit/cpu_quota use docker's units (cpu_quota is per 100ms period).
+LIMIT_PROFILES: Dict[str, Dict[str, Any]] = {
+    "small": {"mem_limit": "64m", "cpu_quota": 25000, "timeout": 5},
+    "medium": {"mem_limit": "128m", "cpu_quota": 50000, "timeout": 10},
+    "large": {"mem_limit": "512m", "cpu_quota": 100000, "timeout": 30},
+}
+
+DEFAULT_PROFILE = os.getenv("SANDBOX_DEFAULT_PROFILE", "medium")
+
+def get_profile(name: str = None) -> Dict[str, Any]:
+    name = name or DEFAULT_PROFILE
+    if name not in LIMIT_PROFILES:
+        raise ValueError(f"Unknown limits profile: {name}")
+    return dict(LIMIT_PROFILES[name], name=name)
+
+def container_limits(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """The subset of a profile that is applied to the container itself."""
+    return {"mem_limit": profile["mem_limit"], "cpu_quota": profile["cpu_quota"]}
@@ -0,0 +1,311 @@
+import os
+import time
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.sandbox.limits import container_limits, get_profile
+
+# Exit code of the scrub when it had to kill processes a snippet left behind
+LEFTOVER_EXIT_CODE = 3
+
+# Prints the container's own cgroup counters as key=value lines, using only sh builtins.
+# v2: memory.peak (kernel 5.19+) and the oom_kill count in memory.events.
+# v1: memory.max_usage_in_bytes and oom_kill in memory.oom_control (kernel 4.13+).
+# The cgroup mount is read-only inside the container, so neither mark can be reset here.
+SAMPLE_SCRIPT = """
+cg=/sys/fs/cgroup
+if [ -f $cg/memory.events ]; then
+  echo "cgroup=v2"
+  [ -f $cg/memory.peak ] && read peak < $cg/memory.peak && echo "peak=$peak" && echo "peak_source=memory.peak"
+  while read key value; do [ "$key" = oom_kill ] && echo "oom_kill=$value" && echo "oom_source=memory.events"; done < $cg/memory.events
+  while read key value; do [ "$key" = usage_usec ] && echo "cpu_ns=${value}000"; done < $cg/cpu.stat
+elif [ -d $cg/memory ]; then
+  echo "cgroup=v1"
+  read peak < $cg/memory/memory.max_usage_in_bytes && echo "peak=$peak" && echo "peak_source=memory.max_usage_in_bytes"
+  while read key value; do [ "$key" = oom_kill ] && echo "oom_kill=$value" && echo "oom_source=memory.oom_control"; done < $cg/memory/memory.oom_control
+  for file in $cg/cpuacct/cpuacct.usage $cg/cpu,cpuacct/cpuacct.usage; do
+    [ -f $file ] && read ns < $file && echo "cpu_ns=$ns" && break
+  done
+fi
+true
+"""
+
+def parse_cgroup_sample(output: bytes) -> Dict[str, Any]:
+    """key=value lines from SAMPLE_SCRIPT; counters become ints, source names stay strings."""
+    sample: Dict[str, Any] = {}
+    for line in output.decode("utf-8", "replace").splitlines():
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            continue
+        sample[key] = int(value) if value.isdigit() else value
+    return sample
+
+# Runs after every snippet. PID 1 is `sleep infinity` and never reaps orphans,
+# so a non-empty process tree means the container is recycled, not reused.
+SCRUB_SCRIPT = """
+left=0
+for dir in /proc/[0-9]*; do
+  pid=${dir#/proc/}
+  [ "$pid" = 1 ] || [ "$pid" = $$ ] || { kill -9 "$pid" 2>/dev/null && left=1; }
+done
+for path in %s; do
+  rm -rf "$path"/* "$path"/.[!.]* "$path"/..?* || exit 1
+done
+[ "$left" = 0 ] || exit %d
+"""
+
+class PooledContainer:
+    """A long-lived, network-disabled container that runs snippets via exec."""
+
+    def __init__(self, container: Any, language: str, profile: str):
+        self.container = container
+        self.language = language
+        self.profile = profile
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.runs = 0
+        self.dirty = False
+        # cgroup counters after the last run: the baseline for the next one (a fresh container starts at zero)
+        self.cgroup: Optional[Dict[str, Any]] = {}
+
+class PoolExhaustedError(Exception):
+    """Raised when the sandbox is at its limit of live containers."""
+
+class ContainerPool:
+    def __init__(self, client: Any, configs: Dict[str, Dict[str, Any]]):
+        self.client = client
+        self.configs = configs
+
+        # Pool tuning (per language)
+        self.size = int(os.getenv("SANDBOX_POOL_SIZE", "2"))
+        # Upper bound on containers alive at once (idle, running a snippet or serving a tool worker)
+        self.max_live = int(os.getenv("SANDBOX_POOL_MAX", "16"))
+        self.acquire_timeout = float(os.getenv("SANDBOX_POOL_ACQUIRE_TIMEOUT", "30"))
+        self.max_runs = int(os.getenv("SANDBOX_POOL_MAX_RUNS", "50"))
+        self.idle_timeout = float(os.getenv("SANDBOX_POOL_IDLE_TIMEOUT", "300"))
+        self.max_age = float(os.getenv("SANDBOX_POOL_MAX_AGE", "1800"))
+        # Snippets run here; with a read-only root it and /tmp are the only writable paths
+        self.workdir = os.getenv("SANDBOX_POOL_WORKDIR", "/sandbox")
+        self.read_only = os.getenv("SANDBOX_POOL_READ_ONLY", "true").lower() in ("1", "true", "yes")
+        self.tmpfs_size = os.getenv("SANDBOX_POOL_TMPFS_SIZE", "64m")
+        # A failed run may have left state the scrub cannot see (e.g. a half-written file it was killed over)
+        self.recycle_on_failure = os.getenv("SANDBOX_POOL_RECYCLE_ON_FAILURE", "true").lower() in ("1", "true", "yes")
+
+        # Keyed by (language, profile name): memory/cpu limits are fixed per container
+        self._idle: Dict[Tuple[str, str], Deque[PooledContainer]] = {}
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock)
+        self._live = 0
+        self._counters = {"started": 0, "recycled": 0, "evicted": 0, "scrub_failed": 0, "exhausted": 0}
+
+    def _idle_for(self, language: str, profile: str) -> Deque[PooledContainer]:
+        # Caller holds the lock
+        return self._idle.setdefault((language, profile), deque())
+
+    def _writable_paths(self) -> List[str]:
+        paths = [self.workdir, "/tmp", "/dev/shm"]
+        return paths if self.read_only else paths + ["/var/tmp"]
+
+    def _oldest_idle(self) -> Optional[PooledContainer]:
+        # Caller holds the lock
+        oldest = None
+        for idle in self._idle.values():
+            if idle and (oldest is None or idle[0].last_used < oldest[0].last_used):
+                oldest = idle
+        return oldest.popleft() if oldest else None
+
+    def claim(self, timeout: Optional[float] = None, make_room: bool = True):
+        """
+        Reserves room for one more live container; pair it with unclaim() once
+        the container is removed. At the limit an idle container of another
+        language/profile is removed to make room, otherwise this waits up to
+        `timeout` (default acquire_timeout) and raises PoolExhaustedError.
+        """
+        deadline = time.monotonic() + (self.acquire_timeout if timeout is None else timeout)
+        while True:
+            with self._lock:
+                if self._live < self.max_live:
+                    self._live += 1
+                    return
+                victim = self._oldest_idle() if make_room else None
+                if victim is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["exhausted"] += 1
+                        raise PoolExhaustedError(f"Sandbox is at its limit of {self.max_live} live containers")
+                    self._freed.wait(remaining)
+                    continue
+                self._counters["evicted"] += 1
+            self._destroy(victim)
+
+    def unclaim(self):
+        with self._lock:
+            self._live -= 1
+            self._freed.notify()
+
+    def _start(self, language: str, profile: Dict[str, Any], **claim) -> PooledContainer:
+        config = self.configs[language]
+        tmpfs = {path: f"rw,size={self.tmpfs_size},mode=1777" for path in (self.workdir, "/tmp")}
+        self.claim(**claim)
+        try:
+            # Keep the container alive; snippets are run inside it with exec
+            container = self.client.containers.run(
+                config["image"],
+                command=["sleep", "infinity"],
+                detach=True,
+                network_disabled=True, # Security
+                working_dir=self.workdir,
+                # Nothing a snippet writes outside the scrubbed tmpfs mounts can outlive it
+                read_only=self.read_only,
+                tmpfs=tmpfs if self.read_only else None,
+                labels={"aio-sandbox.pool": language, "aio-sandbox.profile": profile["name"]},
+                **container_limits(profile),
+            )
+        except Exception:
+            self.unclaim()
+            raise
+        with self._lock:
+            self._counters["started"] += 1
+        return PooledContainer(container, language, profile["name"])
+
+    def _is_expired(self, pc: PooledContainer, now: float) -> bool:
+        return (
+            pc.dirty
+            or pc.runs >= self.max_runs
+            or now - pc.created_at >= self.max_age
+        )
+
+    def after_run(self, pc: PooledContainer) -> Optional[Dict[str, Any]]:
+        """
+        Samples the container's cgroup counters and, unless it is already
+        marked dirty, scrubs it: kills whatever the last snippet left running
+        and wipes the writable directories, so the next run starts clean. The
+        container is marked dirty (and recycled) if anything was left running
+        or the wipe fails. Returns the sample, or None if it could not be taken.
+        """
+        scrub = not pc.dirty
+        script = SAMPLE_SCRIPT
+        if scrub:
+            script += SCRUB_SCRIPT % (" ".join(self._writable_paths()), LEFTOVER_EXIT_CODE)
+        try:
+            result = pc.container.exec_run(["sh", "-c", script], stderr=False)
+            exit_code, sample = result.exit_code, parse_cgroup_sample(result.output or b"")
+        except Exception as e:
+            print(f"Warning: failed to scrub pooled container: {e}")
+            exit_code, sample = None, None
+
+        pc.cgroup = sample
+        if scrub and exit_code != 0:
+            pc.dirty = True
+            if exit_code != LEFTOVER_EXIT_CODE:
+                with self._lock:
+                    self._counters["scrub_failed"] += 1
+        return sample
+
+    def _destroy(self, pc: PooledContainer):
+        try:
+            pc.container.remove(force=True)
+        except Exception as e:
+            print(f"Warning: failed to remove pooled container: {e}")
+        finally:
+            self.unclaim()
+
+    def acquire(self, language: str, profile: Dict[str, Any]) -> Tuple[PooledContainer, bool]:
+        """
+        Returns (container, warm). Falls back to starting a fresh container
+        when no healthy idle one is available, within the max_live limit.
+        """
+        self.evict_idle()
+        now = time.time()
+        stale: List[PooledContainer] = []
+        pc: Optional[PooledContainer] = None
+
+        with self._lock:
+            idle = self._idle_for(language, profile["name"])
+            while idle:
+                candidate = idle.popleft()
+                if self._is_expired(candidate, now):
+                    stale.append(candidate)
+                    continue
+                pc = candidate
+                break
+
+        for old in stale:
+            self._destroy(old)
+
+        if pc is not None:
+            return pc, True
+        return self._start(language, profile), False
+
+    def release(self, pc: PooledContainer):
+        pc.last_used = time.time()
+
+        if not self._is_expired(pc, pc.last_used):
+            with self._lock:
+                idle = self._idle_for(pc.language, pc.profile)
+                if len(idle) < self.size:
+                    idle.append(pc)
+                    return
+
+        with self._lock:
+            self._counters["recycled"] += 1
+        self._destroy(pc)
+
+    def warm(self, language: str, profile: Optional[Dict[str, Any]] = None, count: Optional[int] = None):
+        """Pre-start containers until the idle pool for a language/profile is full."""
+        profile = profile or get_profile()
+        target = self.size if count is None else min(count, self.size)
+        while True:
+            with self._lock:
+                if len(self._idle_for(language, profile["name"])) >= target:
+                    return
+            try:
+                # Warming never waits for, or evicts, containers that are already there
+                pc = self._start(language, profile, timeout=0, make_room=False)
+            except PoolExhaustedError:
+                return
+            with self._lock:
+                self._idle_for(language, profile["name"]).append(pc)
+
+    def evict_idle(self):
+        """Drops containers that sat idle too long or outlived max age."""
+        now = time.time()
+        evicted: List[PooledContainer] = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = deque()
+                for pc in idle:
+                    if now - pc.last_used >= self.idle_timeout or self._is_expired(pc, now):
+                        evicted.append(pc)
+                    else:
+                        keep.append(pc)
+                self._idle[key] = keep
+            self._counters["evicted"] += len(evicted)
+
+        for pc in evicted:
+            self._destroy(pc)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "config": {
+                    "size": self.size,
+                    "max_live": self.max_live,
+                    "max_runs": self.max_runs,
+                    "idle_timeout": self.idle_timeout,
+                    "max_age": self.max_age,
+                    "read_only": self.read_only,
+                    "recycle_on_failure": self.recycle_on_failure,
+                },
+                "live": self._live,
+                "idle": {f"{lang}:{profile}": len(idle) for (lang, profile), idle in self._idle.items()},
+                "counters": dict(self._counters),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            pooled = [pc for idle in self._idle.values() for pc in idle]
+            for idle in self._idle.values():
+                idle.clear()
+        for pc in pooled:
+            self._destroy(pc)
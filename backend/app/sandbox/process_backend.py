@@ -0,0 +1,340 @@
+import os
+import pwd
+import sys
+import time
+import shutil
+import signal
+import resource
+import selectors
+import tempfile
+import subprocess
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.sandbox.backend import Channel, Execution, SandboxBackend
+
+# Only a fixed PATH is exposed to snippets; nothing is inherited from the API process
+SANDBOX_ENV = {"PATH": "/usr/local/bin:/usr/bin:/bin", "LANG": "C.UTF-8"}
+
+def parse_bytes(value: Any) -> int:
+    """Parses docker-style sizes ("128m", "1g") into bytes."""
+    if isinstance(value, int):
+        return value
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    value = str(value).strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+RLIMIT_NAMES = {
+    resource.RLIMIT_CPU: "cpu",
+    resource.RLIMIT_FSIZE: "fsize",
+    resource.RLIMIT_NPROC: "nproc",
+    resource.RLIMIT_CORE: "core",
+    resource.RLIMIT_AS: "as",
+}
+
+# Fallback when util-linux prlimit is missing: sets the limits on itself, then execs the command
+RLIMIT_WRAPPER = """
+import os, sys, resource
+split = sys.argv.index("--")
+for spec in sys.argv[1:split]:
+    name, value = spec.split("=")
+    resource.setrlimit(getattr(resource, "RLIMIT_" + name.upper()), (int(value), int(value)))
+os.execvp(sys.argv[split + 1], sys.argv[split + 1:])
+"""
+
+def with_rlimits(command: List[str], rlimits: Dict[int, int]) -> List[str]:
+    """
+    Prefixes `command` with a tiny exec wrapper that applies the rlimits,
+    so nothing has to run in the child between fork and exec (preexec_fn is
+    not safe in a threaded server).
+    """
+    prlimit = shutil.which("prlimit")
+    if prlimit:
+        return [prlimit] + [f"--{RLIMIT_NAMES[limit]}={value}:{value}" for limit, value in rlimits.items()] + ["--"] + command
+    specs = [f"{RLIMIT_NAMES[limit]}={value}" for limit, value in rlimits.items()]
+    return [sys.executable, "-I", "-S", "-c", RLIMIT_WRAPPER] + specs + ["--"] + command
+
+def spawn_sandboxed(command: List[str], workdir: str, rlimits: Dict[int, int],
+                    user: Optional[Tuple[int, int]] = None, **popen_kwargs) -> subprocess.Popen:
+    if user is not None:
+        uid, gid = user
+        # The child drops to this uid before exec, so it cannot read the server's /proc/<pid>/environ
+        popen_kwargs.update(user=uid, group=gid, extra_groups=[])
+    return subprocess.Popen(
+        with_rlimits(command, rlimits),
+        cwd=workdir,
+        env=dict(SANDBOX_ENV, HOME=workdir, TMPDIR=workdir),
+        # Its own session and process group, so the whole tree can be killed with killpg
+        start_new_session=True,
+        close_fds=True,
+        **popen_kwargs,
+    )
+
+def resolve_user(value: str) -> Tuple[int, int]:
+    """(uid, gid) for a user name or numeric uid."""
+    try:
+        entry = pwd.getpwuid(int(value)) if value.isdigit() else pwd.getpwnam(value)
+    except KeyError:
+        raise ValueError(f"Unknown sandbox user: {value}")
+    return entry.pw_uid, entry.pw_gid
+
+class ProcessExecution(Execution):
+    def __init__(self, command: List[str], workdir: str, timeout: int, rlimits: Dict[int, int],
+                 user: Optional[Tuple[int, int]] = None):
+        self.workdir = workdir
+        self.deadline = time.monotonic() + timeout
+        self.timed_out = False
+        self.killed = False
+        self.rusage = None
+        # kill() may come from another thread; never signal the group once its leader is reaped
+        self._reap_lock = threading.Lock()
+        self._reaped = False
+        self.proc = spawn_sandboxed(
+            command, workdir, rlimits, user,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+    def chunks(self) -> Iterator[Tuple[str, bytes]]:
+        selector = selectors.DefaultSelector()
+        selector.register(self.proc.stdout, selectors.EVENT_READ, "stdout")
+        selector.register(self.proc.stderr, selectors.EVENT_READ, "stderr")
+        try:
+            while selector.get_map():
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timed_out = True
+                    self._kill_group()
+                    break
+                for key, _ in selector.select(timeout=remaining):
+                    data = os.read(key.fileobj.fileno(), 65536)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        continue
+                    yield key.data, data
+        finally:
+            selector.close()
+
+    def _kill_group(self):
+        with self._reap_lock:
+            if self._reaped:
+                return
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def kill(self):
+        self.killed = True
+        self._kill_group()
+
+    def wait(self) -> Optional[int]:
+        try:
+            # Block until exit without reaping: the zombie keeps the pid (and process group) reserved
+            os.waitid(os.P_PID, self.proc.pid, os.WEXITED | os.WNOWAIT)
+            with self._reap_lock:
+                # Anything the snippet left running in the background goes with it
+                try:
+                    os.killpg(self.proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                # wait4 gives us the child's own rusage, not the whole API process
+                _, status, self.rusage = os.wait4(self.proc.pid, 0)
+                self._reaped = True
+            self.proc.returncode = os.waitstatus_to_exitcode(status)
+        except ChildProcessError:
+            self.proc.wait()
+        finally:
+            self.proc.stdout.close()
+            self.proc.stderr.close()
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+        if self.timed_out:
+            return 124
+        code = self.proc.returncode
+        # Mirror the shell convention used by the docker backend (128 + signal)
+        return 128 - code if code < 0 else code
+
+    def usage(self) -> Dict[str, Any]:
+        if self.rusage is None:
+            return {}
+        # No cgroup here: RLIMIT_AS makes allocations fail inside the snippet, there is no OOM kill to report.
+        # ru_maxrss is no use for peak memory either: the child is spawned with vfork and the
+        # high-water mark survives exec, so it reports the server's RSS at spawn time.
+        return {
+            "cpu_time_ms": round((self.rusage.ru_utime + self.rusage.ru_stime) * 1000, 2),
+            "peak_memory_bytes": None,
+            "peak_memory_source": "unavailable",
+            "peak_memory_scope": "run",
+        }
+
+class ProcessChannel(Channel):
+    def __init__(self, command: List[str], workdir: str, rlimits: Dict[int, int],
+                 user: Optional[Tuple[int, int]] = None):
+        self.workdir = workdir
+        self.proc = spawn_sandboxed(
+            command, workdir, rlimits, user,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.buffer = b""
+
+    def send(self, data: bytes):
+        try:
+            self.proc.stdin.write(data)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, ValueError) as e:
+            raise EOFError(str(e))
+
+    def recv_exactly(self, size: int, timeout: float) -> bytes:
+        deadline = time.monotonic() + timeout
+        fd = self.proc.stdout.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while len(self.buffer) < size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(timeout=remaining):
+                    raise TimeoutError("Worker did not answer in time")
+                data = os.read(fd, 65536)
+                if not data:
+                    raise EOFError("Worker process exited")
+                self.buffer += data
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.proc.wait()
+        self.proc.stdin.close()
+        self.proc.stdout.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+class ProcessBackend(SandboxBackend):
+    """
+    Runs interpreters as local subprocesses: no daemon round-trips and no
+    Docker requirement, at the cost of weaker isolation (a dedicated uid,
+    rlimits, a private temp dir, a scrubbed environment and optionally a
+    network namespace).
+
+    Snippets run as SANDBOX_PROCESS_USER, which needs the server to run as
+    root. Running them as the server's own user lets them read its
+    environment and signal it, so that is refused unless explicitly enabled
+    with SANDBOX_PROCESS_INSECURE=true (local development only).
+    """
+    name = "process"
+
+    def __init__(self, configs: Dict[str, Dict[str, Any]]):
+        self.configs = configs
+        self.workdir_root = os.getenv("SANDBOX_PROCESS_WORKDIR") or tempfile.gettempdir()
+        self.unshare = os.getenv("SANDBOX_PROCESS_UNSHARE", "false").lower() in ("1", "true", "yes")
+        # RLIMIT_NPROC counts every process of the uid, so leave headroom when not running as a dedicated user
+        self.max_procs = int(os.getenv("SANDBOX_PROCESS_NPROC", "64"))
+        self.max_file_bytes = parse_bytes(os.getenv("SANDBOX_PROCESS_FSIZE", "16m"))
+        self.insecure = os.getenv("SANDBOX_PROCESS_INSECURE", "false").lower() in ("1", "true", "yes")
+        self.user: Optional[Tuple[int, int]] = None
+        self._user_error: Optional[str] = None
+        user = os.getenv("SANDBOX_PROCESS_USER")
+        if user:
+            try:
+                self.user = resolve_user(user)
+            except ValueError as e:
+                self._user_error = str(e)
+
+        self.interpreters: Dict[str, Optional[str]] = {}
+        for language, config in configs.items():
+            binary = config["command"][0]
+            path = shutil.which(binary)
+            if path is None and binary == "python":
+                path = sys.executable
+            self.interpreters[language] = path
+
+    def unavailable_reason(self) -> Optional[str]:
+        if self._user_error:
+            return self._user_error
+        if self.user is None or self.user[0] == os.geteuid():
+            if self.insecure:
+                return None
+            return ("Process backend needs SANDBOX_PROCESS_USER (a dedicated uid), "
+                    "or SANDBOX_PROCESS_INSECURE=true to run snippets as the server's own user")
+        if os.geteuid() != 0:
+            return "Process backend must run as root to switch to SANDBOX_PROCESS_USER"
+        return None
+
+    def _workdir(self, prefix: str) -> str:
+        workdir = tempfile.mkdtemp(prefix=prefix, dir=self.workdir_root)
+        if self.user is not None and self.user[0] != os.geteuid():
+            os.chown(workdir, *self.user)
+        return workdir
+
+    def image_id(self, language: str) -> str:
+        path = os.path.realpath(self.interpreters[language] or "")
+        st = os.stat(path)
+        return f"process:{path}:{st.st_size}:{int(st.st_mtime)}"
+
+    def acquire(self, language: str, profile: Dict[str, Any]) -> Tuple[str, bool]:
+        if not self.interpreters.get(language):
+            raise RuntimeError(f"No local interpreter for {language}")
+        # Nothing to keep warm; the session is just the language
+        return language, False
+
+    def _rlimits(self, language: str, profile: Dict[str, Any], cpu_seconds: Optional[int] = None) -> Dict[int, int]:
+        # cpu_quota has no rlimit equivalent; CPU time is capped at the wall timeout instead
+        limits = {
+            resource.RLIMIT_CPU: cpu_seconds or profile["timeout"],
+            resource.RLIMIT_FSIZE: self.max_file_bytes,
+            resource.RLIMIT_NPROC: self.max_procs,
+            resource.RLIMIT_CORE: 0,
+        }
+        # V8 reserves far more address space than it uses; node is capped via --max-old-space-size instead
+        if language != "javascript":
+            limits[resource.RLIMIT_AS] = parse_bytes(profile["mem_limit"])
+        return limits
+
+    def _argv(self, language: str, command: List[str], profile: Dict[str, Any]) -> List[str]:
+        argv = [self.interpreters[language]] + command[1:]
+        if language == "javascript":
+            mem_mb = parse_bytes(profile["mem_limit"]) // (1024 * 1024)
+            argv.insert(1, f"--max-old-space-size={mem_mb}")
+        if self.unshare:
+            argv = ["unshare", "--net", "--map-root-user", "--"] + argv
+        return argv
+
+    def start(self, session: str, command: List[str], profile: Dict[str, Any]) -> ProcessExecution:
+        language = session
+        argv = self._argv(language, command, profile)
+        workdir = self._workdir("sandbox-")
+        try:
+            return ProcessExecution(argv, workdir, profile["timeout"], self._rlimits(language, profile), self.user)
+        except Exception:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+
+    def spawn(self, language: str, command: List[str], profile: Dict[str, Any]) -> ProcessChannel:
+        if not self.interpreters.get(language):
+            raise RuntimeError(f"No local interpreter for {language}")
+        argv = self._argv(language, command, profile)
+        workdir = self._workdir("sandbox-worker-")
+        # Long-lived: the CPU budget covers the worker's whole life, not one call
+        cpu_seconds = int(os.getenv("SANDBOX_WORKER_CPU_SECONDS", "300"))
+        try:
+            return ProcessChannel(argv, workdir, self._rlimits(language, profile, cpu_seconds), self.user)
+        except Exception:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+
+    def prepare(self, language: str) -> Dict[str, Any]:
+        if not self.interpreters.get(language):
+            raise RuntimeError(f"No local interpreter for {language}")
+        return {"interpreter": self.interpreters[language], "image_id": self.image_id(language)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interpreters": self.interpreters,
+            "unshare": self.unshare,
+        }
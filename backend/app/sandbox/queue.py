@@ -0,0 +1,235 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+class QueueFullError(Exception):
+    """Raised when the sandbox queue is at its admission limit."""
+
+class SandboxJob:
+    def __init__(self, language: str, code: str, options: Dict[str, Any]):
+        self.id = str(uuid.uuid4())
+        self.language = language
+        self.code = code
+        self.options = options # executor kwargs: no_cache, profile
+        self.status = "queued" # queued -> running -> completed | failed
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "language": self.language,
+            "profile": self.options.get("profile"),
+            "status": self.status,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class SandboxJobQueue:
+    def __init__(self, executor: Any):
+        self.executor = executor
+        self.max_concurrency = int(os.getenv("SANDBOX_MAX_CONCURRENCY", "8"))
+        self.max_per_language = int(os.getenv("SANDBOX_MAX_PER_LANGUAGE", "4"))
+        self.max_queue_depth = int(os.getenv("SANDBOX_MAX_QUEUE_DEPTH", "64"))
+        self.job_ttl = float(os.getenv("SANDBOX_JOB_TTL", "600"))
+        self.max_batch_size = int(os.getenv("SANDBOX_MAX_BATCH_SIZE", "500"))
+
+        self._global = asyncio.Semaphore(self.max_concurrency)
+        self._per_language: Dict[str, asyncio.Semaphore] = {}
+        self._pending = 0 # queued + running
+        self._running = 0
+        self._rejected = 0
+        self._jobs: Dict[str, SandboxJob] = {}
+        self._finished: "OrderedDict[str, float]" = OrderedDict() # finish order, for pruning
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _language_slot(self, language: str):
+        key = language.lower()
+        if key not in self.executor.configs:
+            # The executor rejects it straight away; a semaphore per made-up name would never be freed
+            return nullcontext()
+        if key not in self._per_language:
+            self._per_language[key] = asyncio.Semaphore(self.max_per_language)
+        return self._per_language[key]
+
+    def is_full(self) -> bool:
+        return self._pending >= self.max_queue_depth
+
+    def _admit(self, count: int = 1):
+        if self._pending + count > self.max_queue_depth:
+            self._rejected += 1
+            raise QueueFullError(f"Sandbox queue is full ({self._pending} pending)")
+        self._pending += count
+
+    async def _execute(self, language: str, code: str, options: Dict[str, Any], job: Optional[SandboxJob] = None) -> Dict[str, Any]:
+        # Take the language slot first so we never park a global slot on a busy language
+        async with self._language_slot(language):
+            async with self._global:
+                self._running += 1
+                if job:
+                    job.status = "running"
+                    job.started_at = time.time()
+                try:
+                    # Docker calls are blocking; keep them off the event loop
+                    return await asyncio.to_thread(self.executor.execute, language, code, **options)
+                finally:
+                    self._running -= 1
+
+    async def _cache_hit(self, language: str, code: str, options: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Looks the run up in the result cache before it takes any queue capacity.
+        Returns (hit, options); on a miss the options tell the executor not to look again.
+        """
+        if options.get("no_cache") or not self.executor.cache.enabled:
+            return None, options
+        # The image id behind the cache key may need a Docker call; keep it off the event loop
+        hit = await asyncio.to_thread(self.executor.cached, language, code, options.get("profile"))
+        return hit, dict(options, cache_checked=True)
+
+    async def run(self, language: str, code: str, **options) -> Dict[str, Any]:
+        """Runs a snippet under the concurrency caps and waits for the result."""
+        hit, options = await self._cache_hit(language, code, options)
+        if hit is not None:
+            return hit
+        self._admit()
+        try:
+            return await self._execute(language, code, options)
+        finally:
+            self._pending -= 1
+
+    async def stream(self, language: str, code: str, max_output_bytes: Optional[int] = None,
+                     profile: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Streams execution events under the same concurrency caps as run()."""
+        self._admit()
+        try:
+            async with self._language_slot(language):
+                async with self._global:
+                    self._running += 1
+                    cancel = threading.Event()
+                    events = self.executor.stream(language, code, max_output_bytes, cancel, profile)
+                    loop = asyncio.get_running_loop()
+                    step: Optional[asyncio.Future] = None
+                    try:
+                        while True:
+                            step = loop.run_in_executor(None, next, events, None)
+                            # Shielded so a cancelled request leaves us a handle on the worker thread
+                            event = await asyncio.shield(step)
+                            step = None
+                            if event is None:
+                                break
+                            yield event
+                    finally:
+                        # The client went away (or the stream ended): the cancel flag makes the
+                        # executor kill the snippet even if it is blocked waiting for output.
+                        cancel.set()
+                        try:
+                            if step is not None:
+                                # Keep the slot until the worker thread has left the generator
+                                await asyncio.wait([step])
+                            await asyncio.to_thread(events.close)
+                        finally:
+                            self._running -= 1
+        finally:
+            self._pending -= 1
+
+    async def run_batch(self, items: List[Tuple[str, str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Runs many (language, code, options) items and returns results in input order.
+        Items are grouped by language and limits profile and drained by up to max_per_language
+        workers, each holding one container, so wall time scales with the
+        worker count rather than the item count. Every item counts against
+        the queue depth, so one batch cannot crowd out max_queue_depth runs.
+        """
+        # A batch deeper than the queue could never be admitted; that is a bad request, not a busy queue
+        limit = min(self.max_batch_size, self.max_queue_depth)
+        if len(items) > limit:
+            raise ValueError(f"Batch too large ({len(items)} > {limit})")
+
+        self._admit(len(items))
+        try:
+            groups: Dict[Tuple[str, Optional[str]], deque] = {}
+            for index, (language, code, options) in enumerate(items):
+                key = (language.lower(), options.get("profile"))
+                groups.setdefault(key, deque()).append((index, code, options.get("no_cache", False)))
+
+            async def worker(language: str, profile: Optional[str], work: deque):
+                async with self._language_slot(language):
+                    async with self._global:
+                        self._running += 1
+                        try:
+                            return await asyncio.to_thread(self.executor.execute_many, language, work, profile)
+                        finally:
+                            self._running -= 1
+
+            workers = []
+            for (language, profile), work in groups.items():
+                count = min(self.max_per_language, self.max_concurrency, len(work))
+                workers.extend(worker(language, profile, work) for _ in range(count))
+
+            results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+            for chunk in await asyncio.gather(*workers):
+                for index, result in chunk:
+                    results[index] = result
+            return results
+        finally:
+            self._pending -= len(items)
+
+    def submit(self, language: str, code: str, **options) -> SandboxJob:
+        """Queues a snippet and returns immediately; poll with get()."""
+        self._prune()
+        self._admit()
+        job = SandboxJob(language, code, options)
+        self._jobs[job.id] = job
+
+        task = asyncio.create_task(self._run_job(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run_job(self, job: SandboxJob):
+        try:
+            hit, options = await self._cache_hit(job.language, job.code, job.options)
+            job.result = hit if hit is not None else await self._execute(job.language, job.code, options, job)
+            job.status = "failed" if job.result.get("status") == "error" else "completed"
+        except Exception as e:
+            job.result = {"status": "error", "output": str(e)}
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._finished[job.id] = job.finished_at
+            self._pending -= 1
+
+    def get(self, job_id: str) -> Optional[SandboxJob]:
+        # Expired jobs go on lookup too, so a queue that is only polled does not keep them forever
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        while self._finished:
+            jid, finished_at = next(iter(self._finished.items()))
+            if finished_at >= cutoff:
+                break
+            del self._finished[jid]
+            del self._jobs[jid]
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune()
+        return {
+            "jobs": len(self._jobs),
+            "pending": self._pending,
+            "running": self._running,
+            "rejected": self._rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_per_language": self.max_per_language,
+            "max_queue_depth": self.max_queue_depth,
+        }
@@ -1,20 +1,104 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Any, Dict
-from app.sandbox.executor import sandbox
+from typing import Any, Dict, List, Optional
+import json
+from app.sandbox.executor import sandbox, sandbox_queue
+from app.sandbox.queue import QueueFullError
 
 router = APIRouter(prefix="/sandbox", tags=["sandbox"])
 
 class ExecuteRequest(BaseModel):
     language: str
     code: str
+    no_cache: bool = False # Bypass the result cache for non-deterministic code
+    profile: Optional[str] = None # small | medium | large, defaults to SANDBOX_DEFAULT_PROFILE
+
+    def options(self) -> Dict[str, Any]:
+        return {"no_cache": self.no_cache, "profile": self.profile}
+
+class StreamExecuteRequest(ExecuteRequest):
+    max_output_bytes: Optional[int] = None
+
+class BatchExecuteRequest(BaseModel):
+    items: List[ExecuteRequest]
+
+def _queue_full(e: QueueFullError) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
 
 @router.post("/run")
-def run_code(request: ExecuteRequest):
-    result = sandbox.execute(request.language, request.code)
-    if result["status"] == "error":
-        # We return 200 with error details usually for sandbox to show them, 
-        # or 400 if it's a system error.
-        # Let's return 200 with failure content for compilation/runtime errors
-        pass
+async def run_code(request: ExecuteRequest):
+    try:
+        result = await sandbox_queue.run(request.language, request.code, **request.options())
+    except QueueFullError as e:
+        raise _queue_full(e)
+    # Compile and runtime errors come back as 200 with the failure in the result
     return result
+
+@router.post("/run/stream")
+async def run_code_stream(request: StreamExecuteRequest):
+    # Fail fast with a 429 instead of opening a stream we cannot serve
+    if sandbox_queue.is_full():
+        raise _queue_full(QueueFullError("Sandbox queue is full"))
+
+    async def event_source():
+        try:
+            async for event in sandbox_queue.stream(request.language, request.code, request.max_output_bytes, request.profile):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except QueueFullError as e:
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'status': 'error', 'output': str(e)})}\n\n"
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
+
+@router.post("/run_batch")
+async def run_batch(request: BatchExecuteRequest):
+    try:
+        results = await sandbox_queue.run_batch([(item.language, item.code, item.options()) for item in request.items])
+    except QueueFullError as e:
+        raise _queue_full(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results}
+
+@router.post("/jobs")
+async def submit_job(request: ExecuteRequest):
+    try:
+        job = sandbox_queue.submit(request.language, request.code, **request.options())
+    except QueueFullError as e:
+        raise _queue_full(e)
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = sandbox_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.get("/queue/stats")
+def queue_stats():
+    return sandbox_queue.stats()
+
+@router.get("/cache/stats")
+def cache_stats():
+    return sandbox.cache.stats()
+
+@router.delete("/cache")
+def clear_cache():
+    sandbox.cache.clear()
+    return {"status": "cleared"}
+
+@router.get("/profiles")
+def list_profiles():
+    return {"profiles": sandbox.profiles}
+
+@router.get("/stats")
+def executor_stats():
+    return sandbox.stats()
+
+@router.get("/pool/stats")
+def pool_stats():
+    pool = getattr(sandbox.backend, "pool", None)
+    if not pool:
+        raise HTTPException(status_code=503, detail="Container pool not available")
+    return {**pool.stats(), "latency": sandbox.latency.summary()}
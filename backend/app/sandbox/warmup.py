@@ -0,0 +1,120 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from app.sandbox.limits import get_profile
+
+# Trivial snippet per language; proves the image, interpreter and exec path all work
+PROBES = {
+    "python": ("print('ok')", "ok"),
+    "javascript": ("console.log('ok')", "ok"),
+    "bash": ("echo ok", "ok"),
+}
+
+class SandboxWarmup:
+    """
+    Startup phase for the sandbox: pull and pin images in parallel, run a
+    probe snippet per language and fill the container pool. Drives
+    /health/ready, which stays red until every language is warm (or warmup
+    is switched off with SANDBOX_WARMUP=false). A language whose pull or
+    probe fails is retried with exponential backoff.
+    """
+
+    def __init__(self, executor: Any):
+        self.executor = executor
+        self.enabled = os.getenv("SANDBOX_WARMUP", "true").lower() in ("1", "true", "yes")
+        configured = os.getenv("SANDBOX_WARMUP_LANGUAGES")
+        self.languages: List[str] = (
+            [lang.strip().lower() for lang in configured.split(",") if lang.strip()]
+            if configured else list(executor.configs.keys())
+        )
+        # Fail at startup rather than with a KeyError in the background thread
+        unknown = [lang for lang in self.languages if lang not in executor.configs or lang not in PROBES]
+        if unknown:
+            raise ValueError(f"SANDBOX_WARMUP_LANGUAGES has unsupported languages: {', '.join(unknown)}")
+        self.max_attempts = int(os.getenv("SANDBOX_WARMUP_MAX_ATTEMPTS", "8"))
+        self.backoff = float(os.getenv("SANDBOX_WARMUP_BACKOFF", "2"))
+        self.max_backoff = float(os.getenv("SANDBOX_WARMUP_MAX_BACKOFF", "60"))
+        # pending -> warming -> ready | failed; "disabled" when SANDBOX_WARMUP is off
+        self.state = "pending" if self.enabled else "disabled"
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        # Without warmup the first requests just take the cold path
+        return self.state in ("ready", "disabled")
+
+    def _warm_language(self, language: str) -> Dict[str, Any]:
+        """Warms one language, retrying failed pulls and probes with exponential backoff."""
+        for attempt in range(1, self.max_attempts + 1):
+            report = self._attempt(language)
+            report["attempts"] = attempt
+            if report["ready"] or attempt == self.max_attempts:
+                return report
+            delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+            print(f"Sandbox warmup for {language} failed (attempt {attempt}), retrying in {delay:.0f}s: {report['error']}")
+            time.sleep(delay)
+        return {"ready": False, "error": "No warmup attempts configured"}
+
+    def _attempt(self, language: str) -> Dict[str, Any]:
+        report: Dict[str, Any] = {"ready": False}
+        try:
+            start = time.time()
+            report.update(self.executor.backend.prepare(language))
+            report["prepare_ms"] = round((time.time() - start) * 1000, 2)
+
+            snippet, expected = PROBES[language]
+            start = time.time()
+            result = self.executor.execute(language, snippet, no_cache=True)
+            report["probe_ms"] = round((time.time() - start) * 1000, 2)
+            if result["status"] != "success" or expected not in result.get("output", ""):
+                raise RuntimeError(f"Probe failed: {result.get('output', '')[:200]}")
+
+            self.executor.backend.prewarm(language, get_profile())
+            report["ready"] = True
+        except Exception as e:
+            report["error"] = str(e)
+        return report
+
+    def run(self):
+        with self._lock:
+            if self.state == "warming":
+                return
+            self.state = "warming"
+            self.started_at = time.time()
+
+        reason = self.executor.backend.unavailable_reason()
+        if reason:
+            self.results = {lang: {"ready": False, "error": reason} for lang in self.languages}
+        else:
+            # Image pulls are network bound; do all languages at once
+            with ThreadPoolExecutor(max_workers=max(1, len(self.languages))) as pool:
+                reports = pool.map(self._warm_language, self.languages)
+                self.results = dict(zip(self.languages, reports))
+
+        self.finished_at = time.time()
+        self.state = "ready" if all(r["ready"] for r in self.results.values()) else "failed"
+        print(f"Sandbox warmup {self.state} in {self.finished_at - self.started_at:.1f}s")
+
+    def start_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name="sandbox-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "backend": self.executor.backend.name,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "languages": self.results,
+        }
+
+# Global Instance
+from app.sandbox.executor import sandbox
+sandbox_warmup = SandboxWarmup(sandbox)
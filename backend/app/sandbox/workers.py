@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import struct
+import threading
+from typing import Any, Dict, List, Optional
+from app.sandbox.backend import Channel
+from app.sandbox.limits import get_profile
+
+# Runs inside the sandbox. Loads the tool code once, then answers framed
+# requests: 4-byte big-endian length + UTF-8 JSON, in both directions.
+HARNESS = r'''
+import os, sys, json, struct, traceback
+# The frames move to private descriptors and fds 0/1 are repointed, so nothing the
+# tool does (print, os.write(1, ...), C extensions, child processes) can touch them
+_in, _out = os.fdopen(os.dup(0), "rb"), os.fdopen(os.dup(1), "wb")
+os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+os.dup2(2, 1)
+sys.stdin, sys.stdout = open(os.devnull), sys.stderr
+
+def _read():
+    header = _in.read(4)
+    if len(header) < 4:
+        return None
+    (size,) = struct.unpack(">I", header)
+    return json.loads(_in.read(size))
+
+def _write(message):
+    data = json.dumps(message, default=str).encode("utf-8")
+    _out.write(struct.pack(">I", len(data)) + data)
+    _out.flush()
+
+init = _read()
+namespace = {"__name__": "__tool__"}
+try:
+    exec(compile(init["code"], "<tool>", "exec"), namespace)
+    fn = namespace[init.get("entrypoint", "run")]
+    _write({"ok": True})
+except Exception:
+    _write({"ok": False, "error": traceback.format_exc(limit=5)})
+    sys.exit(1)
+
+while True:
+    request = _read()
+    if request is None:
+        break
+    try:
+        args = request.get("args", [])
+        result = fn(**args) if isinstance(args, dict) else fn(*args)
+        _write({"ok": True, "result": result})
+    except Exception:
+        _write({"ok": False, "error": traceback.format_exc(limit=5)})
+'''
+
+class ToolError(Exception):
+    """The tool code raised, or failed to load."""
+
+class ToolWorker:
+    """One long-lived sandboxed interpreter serving calls for one custom tool."""
+
+    def __init__(self, name: str, channel: Channel):
+        self.name = name
+        self.channel = channel
+        self.started_at = time.time()
+        self.last_used = self.started_at
+        self.calls = 0
+        self.active = 0 # calls holding this worker; guarded by the pool lock
+        self.lock = threading.Lock()
+
+    def send(self, message: Dict[str, Any]):
+        data = json.dumps(message).encode("utf-8")
+        self.channel.send(struct.pack(">I", len(data)) + data)
+
+    def receive(self, timeout: float) -> Dict[str, Any]:
+        (size,) = struct.unpack(">I", self.channel.recv_exactly(4, timeout))
+        return json.loads(self.channel.recv_exactly(size, timeout))
+
+    def close(self):
+        try:
+            self.channel.close()
+        except Exception as e:
+            print(f"Warning: failed to stop tool worker {self.name}: {e}")
+
+class ToolWorkerPool:
+    """
+    Keeps one persistent worker per custom tool so invocations cost a frame
+    round-trip instead of a container start. Idle workers are evicted and a
+    worker that crashed or hung is replaced on the next call.
+    """
+
+    def __init__(self, executor: Any, language: str = "python"):
+        self.executor = executor
+        self.language = language
+        self.idle_timeout = float(os.getenv("SANDBOX_TOOL_WORKER_IDLE_TIMEOUT", "600"))
+        self.profile = get_profile(os.getenv("SANDBOX_TOOL_WORKER_PROFILE") or None)
+
+        self._code: Dict[str, str] = {}
+        self._workers: Dict[str, ToolWorker] = {}
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "spawned": 0, "restarts": 0, "evicted": 0}
+
+    def register(self, name: str, code: str):
+        with self._lock:
+            self._code[name] = code
+            # Code changed: drop the worker holding the old definition
+            old = self._workers.pop(name, None)
+        if old:
+            old.close()
+
+    def _spawn(self, name: str) -> ToolWorker:
+        command = self.executor.configs[self.language]["command"] + [HARNESS]
+        channel = self.executor.backend.spawn(self.language, command, self.profile)
+        worker = ToolWorker(name, channel)
+        try:
+            worker.send({"code": self._code[name], "entrypoint": "run"})
+            ready = worker.receive(self.profile["timeout"])
+        except Exception:
+            worker.close()
+            raise
+        if not ready.get("ok"):
+            worker.close()
+            raise ToolError(ready.get("error", "Tool failed to load"))
+        with self._lock:
+            self._counters["spawned"] += 1
+        return worker
+
+    def _get_worker(self, name: str) -> ToolWorker:
+        """Returns the tool's worker marked as in use; hand it back with _release()."""
+        with self._lock:
+            worker = self._workers.get(name)
+            if worker:
+                worker.active += 1
+                return worker
+
+        spawned = self._spawn(name)
+        with self._lock:
+            worker = self._workers.setdefault(name, spawned)
+            worker.active += 1
+        if worker is not spawned:
+            # Lost a race with another caller; keep theirs
+            spawned.close()
+        return worker
+
+    def _release(self, worker: ToolWorker):
+        with self._lock:
+            worker.active -= 1
+            worker.last_used = time.time()
+
+    def _discard(self, worker: ToolWorker):
+        with self._lock:
+            if self._workers.get(worker.name) is worker:
+                del self._workers[worker.name]
+        worker.close()
+
+    def call(self, name: str, args: List[Any]) -> Any:
+        if name not in self._code:
+            raise KeyError(f"Tool {name} is not registered")
+        self.evict_idle()
+        with self._lock:
+            self._counters["calls"] += 1
+
+        for attempt in range(2):
+            worker = self._get_worker(name)
+            try:
+                with worker.lock:
+                    try:
+                        worker.send({"args": args})
+                        reply = worker.receive(self.profile["timeout"])
+                    except TimeoutError:
+                        # A hung call leaves the worker in an unknown state
+                        self._discard(worker)
+                        raise
+                    except (EOFError, OSError):
+                        # Crashed (e.g. the tool called sys.exit); restart once and retry
+                        self._discard(worker)
+                        with self._lock:
+                            self._counters["restarts"] += 1
+                        if attempt == 0:
+                            continue
+                        raise
+                    worker.calls += 1
+            finally:
+                self._release(worker)
+
+            if not reply.get("ok"):
+                raise ToolError(reply.get("error", "Tool call failed"))
+            return reply.get("result")
+
+    def evict_idle(self):
+        now = time.time()
+        with self._lock:
+            # A worker that is in use (or about to be) is never idle, however long its call runs
+            idle = [w for w in self._workers.values() if not w.active and now - w.last_used >= self.idle_timeout]
+            for worker in idle:
+                del self._workers[worker.name]
+            self._counters["evicted"] += len(idle)
+        for worker in idle:
+            worker.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": {
+                    name: {"calls": w.calls, "age_s": round(time.time() - w.started_at, 1)}
+                    for name, w in self._workers.items()
+                },
+                **self._counters,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            worker.close()
+
+# Global Instance
+from app.sandbox.executor import sandbox
+tool_workers = ToolWorkerPool(sandbox)
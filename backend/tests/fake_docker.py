@@ -0,0 +1,138 @@
+"""
+Stand-in for the docker SDK client, covering exactly what DockerBackend uses.
+Exec commands run as local subprocesses and container start is simulated
+with a fixed delay, so the sandbox can be benchmarked on hosts without Docker.
+"""
+import os
+import time
+import uuid
+import signal
+import selectors
+import subprocess
+import threading
+from collections import namedtuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.sandbox.pool import LEFTOVER_EXIT_CODE
+
+ExecResult = namedtuple("ExecResult", "exit_code output")
+
+class FakeImage:
+    def __init__(self, reference: str):
+        self.id = "sha256:" + uuid.uuid5(uuid.NAMESPACE_URL, reference).hex
+        repository = reference.split("@")[0].rsplit(":", 1)[0]
+        self.attrs = {"RepoDigests": [f"{repository}@{self.id}"]}
+
+class FakeImages:
+    def get(self, reference: str) -> FakeImage:
+        return FakeImage(reference)
+
+    def pull(self, reference: str, tag: Optional[str] = None) -> FakeImage:
+        return FakeImage(reference)
+
+class FakeContainer:
+    def __init__(self, client: "FakeDockerClient"):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.running = True
+        # cgroup v2 counters reported by the pool's sample script; tests can bump them
+        self.cpu_ns = 0
+        self.memory_peak = 0
+        self.oom_kills = 0
+
+    def kill(self):
+        self.running = False
+        # A container kill takes every process down, including ones the snippet forked
+        pgids = [proc.pid for proc in self.client.api.processes_for(self.id)] + self.client.api.groups_for(self.id)
+        for pgid in pgids:
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def remove(self, force: bool = False):
+        self.kill()
+
+    def exec_run(self, cmd: Any, stderr: bool = True, **kwargs) -> ExecResult:
+        # Only the pool's after-run script uses this: report the counters, then scrub if asked to
+        sample = (
+            f"cgroup=v2\npeak={self.memory_peak}\npeak_source=memory.peak\n"
+            f"oom_kill={self.oom_kills}\noom_source=memory.events\ncpu_ns={self.cpu_ns}\n"
+        ).encode()
+        if "rm -rf" not in cmd[-1]:
+            return ExecResult(0, sample)
+        left = False
+        for pgid in self.client.api.groups_for(self.id):
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+                left = True
+            except ProcessLookupError:
+                pass
+        return ExecResult(LEFTOVER_EXIT_CODE if left else 0, sample)
+
+class FakeContainers:
+    def __init__(self, client: "FakeDockerClient"):
+        self.client = client
+
+    def run(self, image: str, command: Any = None, detach: bool = True, **kwargs) -> FakeContainer:
+        time.sleep(self.client.start_latency)
+        return FakeContainer(self.client)
+
+class FakeAPI:
+    def __init__(self, client: "FakeDockerClient"):
+        self.client = client
+        self._execs: Dict[str, Dict[str, Any]] = {}
+        # Process groups of finished execs, which may still have background children
+        self._groups: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def processes_for(self, container_id: str) -> List[subprocess.Popen]:
+        with self._lock:
+            return [e["proc"] for e in self._execs.values() if e["container"] == container_id and e["proc"]]
+
+    def groups_for(self, container_id: str) -> List[int]:
+        with self._lock:
+            return self._groups.pop(container_id, [])
+
+    def exec_create(self, container_id: str, cmd: List[str], stdout: bool = True, stderr: bool = True) -> Dict[str, str]:
+        exec_id = uuid.uuid4().hex
+        with self._lock:
+            self._execs[exec_id] = {"container": container_id, "cmd": cmd, "proc": None}
+        return {"Id": exec_id}
+
+    def exec_start(self, exec_id: str, stream: bool = True, demux: bool = True) -> Iterator[Tuple[Optional[bytes], Optional[bytes]]]:
+        time.sleep(self.client.exec_latency)
+        entry = self._execs[exec_id]
+        proc = subprocess.Popen(entry["cmd"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=dict(os.environ),
+                                start_new_session=True)
+        entry["proc"] = proc
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(proc.stdout, selectors.EVENT_READ, 0)
+            selector.register(proc.stderr, selectors.EVENT_READ, 1)
+            while selector.get_map():
+                for key, _ in selector.select():
+                    data = os.read(key.fileobj.fileno(), 65536)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        continue
+                    yield (data, None) if key.data == 0 else (None, data)
+
+    def exec_inspect(self, exec_id: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._execs.pop(exec_id)
+            if entry["proc"]:
+                self._groups.setdefault(entry["container"], []).append(entry["proc"].pid)
+        proc = entry["proc"]
+        code = proc.wait() if proc else None
+        if code is not None and code < 0:
+            code = 128 - code
+        return {"ExitCode": code}
+
+class FakeDockerClient:
+    def __init__(self, start_latency: float = 0.4, exec_latency: float = 0.01):
+        self.start_latency = start_latency
+        self.exec_latency = exec_latency
+        self.images = FakeImages()
+        self.containers = FakeContainers(self)
+        self.api = FakeAPI(self)
@@ -0,0 +1,101 @@
+"""
+Throughput of the agent endpoints against the offline fake provider.
+
+Start the API with every agent forced onto the fake provider, e.g.
+
+    LLM_PROVIDER_OVERRIDE=fake RATE_LIMIT_ENABLED=false \
+        FAKE_LLM_LATENCY=lognormal:300,0.4 FAKE_LLM_TOKENS_PER_SEC=60 uvicorn app.main:app
+
+then run
+
+    python tests/llm_load.py --concurrency 16 --requests 200 --scenario chat
+"""
+import sys
+import json
+import time
+import argparse
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+BASE_URL = "http://localhost:8000"
+HEADERS = {"X-Sandbox-Key": "sandbox-secret"}
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def register_team(size: int) -> List[str]:
+    ids = []
+    for i in range(size):
+        res = requests.post(f"{BASE_URL}/agents/register", json={
+            "name": f"FakeWorker{i}", "role": "You are a load test worker.", "provider": "fake", "model": "fake-worker",
+        }, headers=HEADERS)
+        res.raise_for_status()
+        ids.append(res.json()["agent_id"])
+    return ids
+
+def scenario(name: str, team: List[str]) -> Callable[[int], requests.Response]:
+    def chat(i: int):
+        return requests.post(f"{BASE_URL}/chat", json={
+            "message": f"Load test message {i}", "provider": "fake", "model": "fake-chat", "temperature": 0.7,
+        }, headers=HEADERS)
+
+    def parallel(i: int):
+        return requests.post(f"{BASE_URL}/agents/workflow/parallel", json={
+            "steps": [{"agent_id": aid, "instruction": f"Review item {i}"} for aid in team],
+            "initial_input": f"Item {i}",
+        }, headers=HEADERS)
+
+    def supervisor(i: int):
+        return requests.post(f"{BASE_URL}/agents/workflow/supervisor", json={
+            "goal": f"Load test goal {i}", "team": team,
+        }, headers=HEADERS)
+
+    return {"chat": chat, "parallel": parallel, "supervisor": supervisor}[name]
+
+def run(name: str, total: int, concurrency: int, team_size: int) -> Dict[str, Any]:
+    call = scenario(name, register_team(team_size) if name != "chat" else [])
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+
+    def one(i: int):
+        start = time.perf_counter()
+        try:
+            status = call(i).status_code
+        except requests.RequestException:
+            status = 0
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests_per_s": round(total / elapsed, 2),
+        "statuses": statuses,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "scheduler": requests.get(f"{BASE_URL}/observability/scheduler", headers=HEADERS).json(),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="chat", choices=["chat", "parallel", "supervisor"])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--team-size", type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        print(json.dumps(run(args.scenario, args.requests, args.concurrency, args.team_size), indent=2))
+    except requests.RequestException as e:
+        print(f"Backend not reachable: {e}")
+        sys.exit(1)
@@ -0,0 +1,197 @@
+"""
+Sandbox latency and throughput benchmark.
+
+Runs against the real Docker daemon when one is reachable, otherwise against
+tests/fake_docker.py (local subprocesses plus a simulated container start),
+and prints a JSON report:
+
+    python -m tests.sandbox_bench --runs 20 --concurrency 8 --duration 10
+    SANDBOX_PROCESS_INSECURE=true python -m tests.sandbox_bench --backend process --out bench.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.sandbox.executor import SandboxExecutor
+from app.sandbox.docker_backend import DockerBackend
+from app.sandbox.limits import get_profile
+from tests.fake_docker import FakeDockerClient
+
+SNIPPETS = {
+    "python": "print('ok')",
+    "javascript": "console.log('ok')",
+    "bash": "echo ok",
+}
+
+# Prints n bytes in one write per language
+OUTPUT_SNIPPETS = {
+    "python": "import sys; sys.stdout.write('x' * {n})",
+    "javascript": "process.stdout.write('x'.repeat({n}))",
+    "bash": "head -c {n} /dev/zero | tr '\\\\0' x",
+}
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples), 2),
+        "p50_ms": round(percentile(samples, 0.50), 2),
+        "p95_ms": round(percentile(samples, 0.95), 2),
+        "p99_ms": round(percentile(samples, 0.99), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+def build_executor(backend: str, start_latency: float) -> SandboxExecutor:
+    executor = SandboxExecutor(backend=backend)
+    if backend == "docker" and executor.backend.unavailable_reason():
+        executor.backend = DockerBackend(executor.configs, client=FakeDockerClient(start_latency=start_latency))
+    return executor
+
+def timed(executor: SandboxExecutor, language: str, code: str) -> float:
+    start = time.perf_counter()
+    result = executor.execute(language, code, no_cache=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if result["status"] == "error":
+        raise RuntimeError(f"{language}: {result['output']}")
+    return elapsed
+
+def bench_latency(executor: SandboxExecutor, languages: List[str], runs: int) -> Dict[str, Any]:
+    report: Dict[str, Any] = {}
+    pool = getattr(executor.backend, "pool", None)
+    for language in languages:
+        try:
+            cold = []
+            for _ in range(runs):
+                # An empty pool forces every run onto a fresh container
+                if pool:
+                    pool.shutdown()
+                cold.append(timed(executor, language, SNIPPETS[language]))
+
+            executor.backend.prewarm(language, get_profile())
+            warm = [timed(executor, language, SNIPPETS[language]) for _ in range(runs)]
+            report[language] = {"cold": summarize(cold), "warm": summarize(warm)}
+        except RuntimeError as e:
+            report[language] = {"error": str(e)}
+    return report
+
+def bench_throughput(executor: SandboxExecutor, language: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    # Admission caps are read when the queue is built; open them up to the requested concurrency
+    os.environ["SANDBOX_MAX_CONCURRENCY"] = str(concurrency)
+    os.environ["SANDBOX_MAX_PER_LANGUAGE"] = str(concurrency)
+    os.environ["SANDBOX_MAX_QUEUE_DEPTH"] = str(concurrency * 2)
+    from app.sandbox.queue import SandboxJobQueue
+
+    pool = getattr(executor.backend, "pool", None)
+    if pool:
+        pool.size = max(pool.size, concurrency)
+        executor.backend.prewarm(language, get_profile())
+
+    async def drive() -> Dict[str, Any]:
+        queue = SandboxJobQueue(executor)
+        samples: List[float] = []
+        errors = 0
+        deadline = time.perf_counter() + duration
+
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                result = await queue.run(language, SNIPPETS[language], no_cache=True)
+                if result["status"] == "error":
+                    errors += 1
+                else:
+                    samples.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return {
+            "language": language,
+            "concurrency": concurrency,
+            "duration_s": round(elapsed, 2),
+            "completed": len(samples),
+            "errors": errors,
+            "runs_per_s": round(len(samples) / elapsed, 2),
+            "latency": summarize(samples),
+        }
+
+    return asyncio.run(drive())
+
+def bench_output(executor: SandboxExecutor, languages: List[str], sizes: List[int], runs: int) -> List[Dict[str, Any]]:
+    rows = []
+    for language in languages:
+        # The latency phase empties the pool; measure transfer cost, not container start
+        executor.backend.prewarm(language, get_profile())
+        for size in sizes:
+            code = OUTPUT_SNIPPETS[language].format(n=size)
+            samples = []
+            output_bytes = 0
+            for _ in range(runs):
+                start = time.perf_counter()
+                result = executor.execute(language, code, no_cache=True)
+                samples.append((time.perf_counter() - start) * 1000)
+                output_bytes = result.get("output_bytes", len(result.get("output", "")))
+            rows.append({
+                "language": language,
+                "size_bytes": size,
+                "output_bytes": output_bytes,
+                **summarize(samples),
+                "mb_per_s": round(size / (1024 * 1024) / (percentile(samples, 0.50) / 1000), 2),
+            })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="docker", choices=["docker", "process"])
+    parser.add_argument("--languages", default="python,javascript,bash")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--sizes", default="1024,65536,524288")
+    parser.add_argument("--fake-start-latency", type=float, default=0.4,
+                        help="Simulated container start (seconds) when Docker is not available")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    executor = build_executor(args.backend, args.fake_start_latency)
+    languages = args.languages.split(",")
+    fake = isinstance(getattr(executor.backend, "client", None), FakeDockerClient)
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "backend": executor.backend.name,
+            "fake_docker": fake,
+            "runs": args.runs,
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "host": platform.platform(),
+        },
+    }
+    try:
+        report["latency"] = bench_latency(executor, languages, args.runs)
+        report["throughput"] = bench_throughput(executor, languages[0], args.concurrency, args.duration)
+        report["output_scaling"] = bench_output(executor, languages, [int(s) for s in args.sizes.split(",")], max(1, args.runs // 4))
+    finally:
+        executor.backend.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
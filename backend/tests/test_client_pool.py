@@ -0,0 +1,61 @@
+"""
+LLM client pool: one shared Agent per (provider, model, temperature, toolset),
+least recently used first out:
+
+    python -m pytest tests/test_client_pool.py
+"""
+import types
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from app.agent import client_pool as client_pool_module
+from app.agent.client_pool import LLMClientPool
+
+@pytest.fixture
+def pool(monkeypatch) -> LLMClientPool:
+    monkeypatch.setenv("LLM_PROVIDER_OVERRIDE", "fake")
+    monkeypatch.setenv("LLM_CLIENT_POOL_SIZE", "2")
+    return LLMClientPool()
+
+def test_same_config_shares_one_client(pool):
+    first = pool.get("openai", "pool-shared", 0.0)
+    assert pool.get("openai", "pool-shared", 0.0) is first
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+def test_each_key_part_gets_its_own_client(pool, monkeypatch):
+    pool.max_size = 10
+    base = pool.get("openai", "pool-key", 0.0)
+    others = [
+        pool.get("groq", "pool-key", 0.0),
+        pool.get("openai", "pool-key-2", 0.0),
+        pool.get("openai", "pool-key", 0.5),
+    ]
+    assert all(other is not base for other in others)
+    assert pool.stats()["misses"] == 4
+
+    # A newly registered tool changes the toolset, so the tool-enabled client is rebuilt
+    tools = [types.SimpleNamespace(name="search")]
+    monkeypatch.setattr(client_pool_module.tool_registry, "get_all_tools", lambda: tools)
+    before = pool._key("openai", "pool-key", 0.0, True)
+    tools.append(types.SimpleNamespace(name="calculator"))
+    after = pool._key("openai", "pool-key", 0.0, True)
+    assert before != after
+    assert after[3] == ("calculator", "search")
+    assert pool._key("openai", "pool-key", 0.0, False)[3] == ()
+
+def test_least_recently_used_client_is_evicted(pool):
+    a = pool.get("openai", "pool-a", 0.0)
+    pool.get("openai", "pool-b", 0.0)
+    assert pool.get("openai", "pool-a", 0.0) is a # a is now the most recently used
+    pool.get("openai", "pool-c", 0.0)
+
+    stats = pool.stats()
+    assert stats["evictions"] == 1
+    assert [client["model"] for client in stats["clients"]] == ["pool-a", "pool-c"]
+    assert pool.get("openai", "pool-a", 0.0) is a
+    assert pool.get("openai", "pool-b", 0.0) is not None
+    assert pool.stats()["misses"] == 4
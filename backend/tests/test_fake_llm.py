@@ -0,0 +1,40 @@
+"""
+Fake LLM provider: same seed and script, same run, so load tests replay.
+
+    python -m pytest tests/test_fake_llm.py
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_core")
+from langchain_core.tools import tool
+
+from app.agent.fake_llm import FakeChatModel
+
+@tool
+def lookup(query: str) -> str:
+    """Looks a query up."""
+    return query
+
+def run(model_name: str):
+    model = FakeChatModel(model_name=model_name)
+    judge = [model.invoke("Rate the Actual Output").content for _ in range(5)]
+    delays = [model._first_token_delay() for _ in range(5)]
+    calls = [asyncio.run(model.bind_tools([lookup]).ainvoke("find it")).tool_calls[0]["id"] for _ in range(3)]
+    return judge, delays, calls
+
+def test_runs_repeat_without_a_seed(monkeypatch):
+    monkeypatch.delenv("FAKE_LLM_SEED", raising=False)
+    monkeypatch.setenv("FAKE_LLM_LATENCY", "uniform:0,1")
+    first = run("repeat")
+    assert run("repeat") == first
+    # Tool call ids stay unique within a run
+    assert len(set(first[2])) == 3
+
+def test_seed_changes_the_run(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_LATENCY", "uniform:0,1")
+    monkeypatch.setenv("FAKE_LLM_SEED", "1")
+    first = run("seeded")
+    monkeypatch.setenv("FAKE_LLM_SEED", "2")
+    assert run("seeded")[1] != first[1]
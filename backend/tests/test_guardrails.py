@@ -0,0 +1,47 @@
+"""
+Streaming guardrails: PII is redacted and blocked terms are caught even when
+they are split across token chunks.
+
+    python -m pytest tests/test_guardrails.py
+"""
+from app.safety.guardrails import SafetyGuardrails, StreamGuard
+
+def run(chunks):
+    guard = StreamGuard(SafetyGuardrails())
+    emitted = [guard.feed(chunk) for chunk in chunks]
+    emitted.append(guard.flush())
+    return "".join(emitted), guard
+
+def test_plain_text_passes_through_unchanged():
+    text, guard = run(["Hello", " there,", " how are", " you?"])
+    assert text == "Hello there, how are you?"
+    assert guard.blocked is None
+
+def test_text_is_held_back_until_a_word_boundary():
+    guard = StreamGuard(SafetyGuardrails())
+    assert guard.feed("partial") == ""
+    assert guard.feed("word next") == "partialword "
+    assert guard.flush() == "next"
+
+def test_email_split_across_chunks_is_redacted():
+    text, _ = run(["Write to jo", "hn.doe@exa", "mple.com today"])
+    assert "john.doe" not in text
+    assert "[EMAIL_REDACTED]" in text
+    assert text.endswith("today")
+
+def test_ssn_in_final_chunk_is_redacted_on_flush():
+    text, _ = run(["SSN is 123-", "45-6789"])
+    assert text == "SSN is [SSN_REDACTED]"
+
+def test_blocked_term_split_across_chunks_stops_the_stream():
+    text, guard = run(["fine words ", "unsafe_te", "rm_1 and more ", "after"])
+    assert guard.blocked == "Blocked content detected: unsafe_term_1"
+    assert "unsafe" not in text
+    assert "after" not in text
+    assert text == "fine words "
+
+def test_nothing_is_emitted_after_a_block():
+    guard = StreamGuard(SafetyGuardrails())
+    guard.feed("unsafe_term_2 ")
+    assert guard.feed("clean text ") == ""
+    assert guard.flush() == ""
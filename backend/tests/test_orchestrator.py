@@ -0,0 +1,220 @@
+"""
+Workflow engines run against stub agents with controlled delays, so
+scheduling and failure handling can be checked without a provider:
+
+    python -m pytest tests/test_orchestrator.py
+"""
+import asyncio
+from typing import Any, Callable, Dict, List, Union
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from app.agent.orchestrator import (
+    DagNode, InvalidWorkflowError, Orchestrator, critical_path, topological_order,
+)
+from app.agent.registry import AgentDefinition, registry
+
+Reply = Union[str, Exception, Callable[[str], str]]
+
+class StubAgents:
+    """Agents that answer after a fixed delay, recording prompts and peak concurrency."""
+
+    def __init__(self):
+        self.behaviour: Dict[str, tuple] = {}
+        self.prompts: Dict[str, List[str]] = {}
+        self.running = 0
+        self.peak = 0
+        self.cancelled: List[str] = []
+
+    def add(self, agent_id: str, reply: Reply, delay: float = 0.0) -> str:
+        registry.register_agent(AgentDefinition(id=agent_id, name=agent_id, role="stub"))
+        self.behaviour[agent_id] = (reply, delay)
+        return agent_id
+
+    def agent(self, agent_def: AgentDefinition):
+        stubs = self
+
+        class StubAgent:
+            async def chat(self, prompt: str, *args: Any, **kwargs: Any) -> str:
+                reply, delay = stubs.behaviour[agent_def.id]
+                stubs.prompts.setdefault(agent_def.id, []).append(prompt)
+                stubs.running += 1
+                stubs.peak = max(stubs.peak, stubs.running)
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    stubs.cancelled.append(agent_def.id)
+                    raise
+                finally:
+                    stubs.running -= 1
+                if isinstance(reply, Exception):
+                    raise reply
+                return reply(prompt) if callable(reply) else reply
+
+        return StubAgent()
+
+@pytest.fixture
+def stubs(monkeypatch) -> StubAgents:
+    stubs = StubAgents()
+    monkeypatch.setattr(Orchestrator, "_get_or_create_agent", lambda self, agent_def: stubs.agent(agent_def))
+    return stubs
+
+def node(node_id: str, agent_id: str, *depends_on: str, template: str = None) -> DagNode:
+    return DagNode(id=node_id, agent_id=agent_id, instruction=f"Do {node_id}", depends_on=list(depends_on), input_template=template)
+
+# --- DAG ---
+
+def test_topological_order_respects_dependencies():
+    nodes = [node("report", "x", "left", "right"), node("left", "x", "fetch"), node("right", "x", "fetch"), node("fetch", "x")]
+    order = topological_order(nodes)
+    assert order[0] == "fetch" and order[-1] == "report"
+    assert set(order[1:3]) == {"left", "right"}
+
+@pytest.mark.parametrize("nodes, error", [
+    ([], "no nodes"),
+    ([node("a", "x", "b"), node("b", "x", "a")], "cycle among: a, b"),
+    ([node("a", "x"), node("b", "x", "c"), node("c", "x", "b")], "cycle among: b, c"),
+    ([node("a", "x", "missing")], "unknown node missing"),
+    ([node("a", "x"), node("a", "x")], "Duplicate"),
+    ([node("input", "x")], "reserved"),
+])
+def test_invalid_graphs_are_rejected(nodes, error):
+    with pytest.raises(InvalidWorkflowError, match=error):
+        topological_order(nodes)
+
+def test_critical_path_follows_the_slowest_chain():
+    nodes = [node("fetch", "x"), node("fast", "x", "fetch"), node("slow", "x", "fetch"), node("join", "x", "fast", "slow")]
+    timings = {"fetch": {"duration_ms": 10.0}, "fast": {"duration_ms": 5.0}, "slow": {"duration_ms": 50.0}, "join": {"duration_ms": 1.0}}
+    path = critical_path(nodes, topological_order(nodes), timings)
+    assert path == {"nodes": ["fetch", "slow", "join"], "duration_ms": 61.0}
+
+def test_dag_runs_branches_concurrently_and_reports_the_critical_path(stubs):
+    stubs.add("dag-fast", "fast result", delay=0.02)
+    stubs.add("dag-slow", "slow result", delay=0.2)
+    stubs.add("dag-join", lambda prompt: "joined", delay=0.01)
+    nodes = [node("fast", "dag-fast"), node("slow", "dag-slow"), node("join", "dag-join", "fast", "slow")]
+
+    result = asyncio.run(Orchestrator().run_dag(nodes, "the input"))
+
+    assert result["status"] == "completed"
+    assert result["final_output"] == "joined" and result["output_node"] == "join"
+    assert result["timing"]["critical_path"]["nodes"] == ["slow", "join"]
+    # Both branches overlapped, so the wall time is well under the serial time
+    assert result["timing"]["wall_ms"] < result["timing"]["serial_ms"]
+    # Several dependencies are labelled in the default context
+    assert "[fast]\nfast result\n\n[slow]\nslow result" in stubs.prompts["dag-join"][0]
+
+def test_dag_template_substitution(stubs):
+    stubs.add("dag-source", "42")
+    stubs.add("dag-sink", lambda prompt: prompt)
+    nodes = [
+        node("source", "dag-source"),
+        node("sink", "dag-sink", "source", template="Answer {source} to {input}; keep {literal} braces"),
+    ]
+    result = asyncio.run(Orchestrator().run_dag(nodes, "the question"))
+    assert result["final_output"] == "Do sink\n\nInput Context:\nAnswer 42 to the question; keep {literal} braces"
+    # A root node without a template gets the workflow input
+    assert stubs.prompts["dag-source"][0].endswith("Input Context:\nthe question")
+
+def test_failed_node_skips_only_its_descendants(stubs):
+    stubs.add("dag-broken", RuntimeError("provider down"))
+    stubs.add("dag-ok", "fine")
+    nodes = [node("broken", "dag-broken"), node("after", "dag-ok", "broken"), node("other", "dag-ok")]
+    result = asyncio.run(Orchestrator().run_dag(nodes, "x", output_node="other"))
+
+    by_node = {r["node"]: r for r in result["results"]}
+    assert result["status"] == "partial"
+    assert by_node["broken"]["status"] == "failed" and by_node["broken"]["error"] == "provider down"
+    assert by_node["after"]["status"] == "skipped"
+    assert by_node["other"]["status"] == "completed"
+    assert result["final_output"] == "fine"
+
+def test_dag_honours_max_concurrency(stubs):
+    stubs.add("dag-worker", "done", delay=0.05)
+    nodes = [node(f"n{i}", "dag-worker") for i in range(6)]
+    result = asyncio.run(Orchestrator().run_dag(nodes, "x", max_concurrency=2))
+    assert result["status"] == "completed"
+    assert stubs.peak == 2
+    assert max(r["queued_ms"] for r in result["results"]) > 0
+
+def test_dag_rejects_unknown_output_node(stubs):
+    stubs.add("dag-ok", "fine")
+    with pytest.raises(InvalidWorkflowError, match="Unknown output node"):
+        asyncio.run(Orchestrator().run_dag([node("a", "dag-ok")], "x", output_node="b"))
+
+# --- Parallel ---
+
+def steps(*agent_ids: str, timeouts: Dict[str, float] = {}):
+    from app.agent.orchestrator import WorkflowStep
+    return [WorkflowStep(agent_id=a, instruction="Answer", timeout=timeouts.get(a)) for a in agent_ids]
+
+def test_parallel_all_collects_every_step(stubs):
+    stubs.add("par-a", "A", delay=0.02)
+    stubs.add("par-b", "B", delay=0.01)
+    result = asyncio.run(Orchestrator().run_parallel(steps("par-a", "par-b"), "x"))
+    assert result["status"] == "completed"
+    assert [r["output"] for r in result["results"]] == ["A", "B"]
+
+def test_first_k_returns_early_and_cancels_the_rest(stubs):
+    stubs.add("par-quick1", "one", delay=0.01)
+    stubs.add("par-quick2", "two", delay=0.02)
+    stubs.add("par-slow", "late", delay=5)
+    result = asyncio.run(Orchestrator().run_parallel(steps("par-quick1", "par-quick2", "par-slow"), "x", mode="first_k", k=2))
+
+    assert result["status"] == "completed"
+    assert result["duration_ms"] < 1000
+    assert [r["status"] for r in result["results"]] == ["completed", "completed", "cancelled"]
+    assert stubs.cancelled == ["par-slow"]
+
+def test_quorum_agrees_on_a_normalized_answer_and_cancels_the_rest(stubs):
+    stubs.add("par-v1", "Paris.", delay=0.01)
+    stubs.add("par-v2", "rome", delay=0.01)
+    stubs.add("par-v3", "  paris ", delay=0.02)
+    stubs.add("par-v4", "Paris", delay=5)
+    result = asyncio.run(Orchestrator().run_parallel(steps("par-v1", "par-v2", "par-v3", "par-v4"), "x", mode="quorum", quorum=2))
+
+    assert result["status"] == "completed"
+    assert result["final_output"] == "Paris."
+    assert result["votes"] == {"paris": 2, "rome": 1}
+    assert stubs.cancelled == ["par-v4"]
+
+def test_quorum_gives_up_once_it_cannot_be_reached(stubs):
+    stubs.add("par-x", "yes", delay=0.01)
+    stubs.add("par-y", "no", delay=0.01)
+    stubs.add("par-z", RuntimeError("boom"), delay=0.01)
+    result = asyncio.run(Orchestrator().run_parallel(steps("par-x", "par-y", "par-z"), "x", mode="quorum"))
+    assert result["status"] == "partial"
+    assert result["final_output"] is None
+
+def test_step_timeout_gives_a_partial_result(stubs):
+    stubs.add("par-ok", "done", delay=0.01)
+    stubs.add("par-hang", "never", delay=5)
+    stubs.add("par-patient", "eventually", delay=0.1)
+    workflow = steps("par-ok", "par-hang", "par-patient", timeouts={"par-patient": 1.0})
+    result = asyncio.run(Orchestrator().run_parallel(workflow, "x", step_timeout=0.05))
+
+    assert result["status"] == "partial"
+    by_agent = {r["agent"]: r for r in result["results"]}
+    assert by_agent["par-ok"]["status"] == "completed"
+    assert by_agent["par-hang"]["status"] == "timeout" and "0.05s" in by_agent["par-hang"]["error"]
+    # A per-step timeout overrides the workflow's
+    assert by_agent["par-patient"]["status"] == "completed"
+    assert result["counts"] == {"completed": 2, "timeout": 1}
+
+def test_parallel_honours_max_concurrency(stubs):
+    stubs.add("par-w", "done", delay=0.03)
+    result = asyncio.run(Orchestrator().run_parallel(steps(*["par-w"] * 5), "x", max_concurrency=2))
+    assert result["status"] == "completed"
+    assert stubs.peak == 2
+
+@pytest.mark.parametrize("kwargs, error", [
+    ({"mode": "vote"}, "Unknown parallel mode"),
+    ({"mode": "first_k", "k": 3}, "between 1 and 2"),
+    ({"mode": "quorum", "quorum": 0}, "between 1 and 2"),
+])
+def test_parallel_rejects_bad_modes(stubs, kwargs, error):
+    stubs.add("par-a", "A")
+    with pytest.raises(InvalidWorkflowError, match=error):
+        asyncio.run(Orchestrator().run_parallel(steps("par-a", "par-a"), "x", **kwargs))
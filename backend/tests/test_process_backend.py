@@ -0,0 +1,56 @@
+"""
+The process backend runs snippets on the API host, so it must not run them
+with the server's own privileges by accident:
+
+    python -m pytest tests/test_process_backend.py
+"""
+import os
+import pwd
+import pytest
+
+from app.sandbox.executor import SandboxExecutor
+
+def test_refuses_server_uid_without_opt_in(monkeypatch):
+    monkeypatch.delenv("SANDBOX_PROCESS_USER", raising=False)
+    monkeypatch.delenv("SANDBOX_PROCESS_INSECURE", raising=False)
+    result = SandboxExecutor(backend="process").execute("python", "print('ok')", no_cache=True)
+    assert result["status"] == "error"
+    assert "SANDBOX_PROCESS_USER" in result["output"]
+
+def test_rlimits_are_applied(monkeypatch):
+    monkeypatch.setenv("SANDBOX_PROCESS_INSECURE", "true")
+    monkeypatch.setenv("SANDBOX_PROCESS_FSIZE", "1m")
+    code = "import resource; print(resource.getrlimit(resource.RLIMIT_FSIZE)[0])"
+    result = SandboxExecutor(backend="process").execute("python", code, no_cache=True)
+    assert result["status"] == "success", result
+    assert int(result["output"]) == 1024 * 1024
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="switching uid needs root")
+def test_runs_as_dedicated_user(monkeypatch):
+    nobody = pwd.getpwnam("nobody")
+    monkeypatch.setenv("SANDBOX_PROCESS_USER", "nobody")
+    monkeypatch.delenv("SANDBOX_PROCESS_INSECURE", raising=False)
+    # $PPID is the API process itself: the exec wrapper replaces itself with bash
+    code = "id -u; cat /proc/$PPID/environ > /dev/null 2>&1 && echo leaked || echo denied"
+    result = SandboxExecutor(backend="process").execute("bash", code, no_cache=True)
+    assert result["status"] == "success", result
+    uid, verdict = result["output"].split()
+    assert int(uid) == nobody.pw_uid
+    assert verdict == "denied"
+
+def test_snippet_sigkill_is_not_an_oom(monkeypatch):
+    monkeypatch.setenv("SANDBOX_PROCESS_INSECURE", "true")
+    result = SandboxExecutor(backend="process").execute("bash", "kill -9 $$", no_cache=True)
+    assert result["exit_code"] == 137
+    assert result["oom_killed"] is False
+    assert result["usage"]["peak_memory_source"] == "unavailable"
+
+def test_peak_memory_is_not_the_servers(monkeypatch):
+    monkeypatch.setenv("SANDBOX_PROCESS_INSECURE", "true")
+    executor = SandboxExecutor(backend="process")
+    before = executor.execute("bash", "true", no_cache=True)["usage"]["peak_memory_bytes"]
+    ballast = bytearray(300 * 1024 * 1024)
+    after = executor.execute("bash", "true", no_cache=True)["usage"]["peak_memory_bytes"]
+    del ballast
+    # A trivial snippet's peak must not follow the API process's RSS
+    assert after is None or before is not None and after < before + 100 * 1024 * 1024
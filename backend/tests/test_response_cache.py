@@ -0,0 +1,92 @@
+"""
+LLM response cache: the exact tier, the semantic tier and what bypasses both.
+
+    python -m pytest tests/test_response_cache.py
+"""
+import asyncio
+
+import pytest
+
+from app.agent.response_cache import ResponseCache
+
+IDENTITY = {"provider": "fake", "model": "cache-test", "temperature": 0.0, "tools": []}
+
+def make_cache(monkeypatch, **env) -> ResponseCache:
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return ResponseCache()
+
+def roundtrip(cache: ResponseCache, identity=IDENTITY, message="What is 2+2?", history=(), lookup=None):
+    """Stores an answer for `message`, then looks up `lookup` (default: the same message)."""
+    async def scenario():
+        await cache.store(identity, message, list(history), "4")
+        return await cache.lookup(identity, lookup or message, list(history))
+    return asyncio.run(scenario())
+
+def test_exact_hit(monkeypatch):
+    cache = make_cache(monkeypatch)
+    assert roundtrip(cache) == "4"
+    assert cache.stats()["exact_hits"] == 1
+
+def test_different_history_is_a_different_entry(monkeypatch):
+    cache = make_cache(monkeypatch)
+    asyncio.run(cache.store(IDENTITY, "And doubled?", [{"role": "user", "content": "2+2"}], "8"))
+    assert asyncio.run(cache.lookup(IDENTITY, "And doubled?", [{"role": "user", "content": "3+3"}])) is None
+
+def test_expired_entries_miss(monkeypatch):
+    cache = make_cache(monkeypatch, LLM_CACHE_TTL="-1")
+    assert roundtrip(cache) is None
+    assert cache.stats()["exact_entries"] == 0
+
+def test_sampled_calls_bypass(monkeypatch):
+    cache = make_cache(monkeypatch)
+    assert roundtrip(cache, identity=dict(IDENTITY, temperature=0.7)) is None
+    assert cache.stats()["stores"] == 0 and cache.stats()["bypassed"] == 1
+
+def test_tool_runs_bypass_unless_opted_in(monkeypatch):
+    with_tools = dict(IDENTITY, tools=["sandbox"])
+    assert roundtrip(make_cache(monkeypatch), identity=with_tools) is None
+    assert roundtrip(make_cache(monkeypatch, LLM_CACHE_TOOLS="true"), identity=with_tools) == "4"
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    cache = make_cache(monkeypatch, LLM_CACHE_MAX_ENTRIES="2")
+
+    async def scenario():
+        await cache.store(IDENTITY, "a", [], "A")
+        await cache.store(IDENTITY, "b", [], "B")
+        await cache.lookup(IDENTITY, "a", []) # a is now the most recently used
+        await cache.store(IDENTITY, "c", [], "C")
+        return [await cache.lookup(IDENTITY, m, []) for m in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == ["A", None, "C"]
+    assert cache.stats()["evictions"] == 1
+
+def keyword_embedding(texts):
+    """Stands in for the sentence model: one dimension per keyword."""
+    keywords = ("capital", "france", "weather")
+    return [[float(word in text.lower()) for word in keywords] for text in texts]
+
+def semantic_cache(monkeypatch) -> ResponseCache:
+    pytest.importorskip("numpy")
+    cache = make_cache(monkeypatch, LLM_CACHE_SEMANTIC="true", LLM_CACHE_SIMILARITY="0.9")
+    cache._embedding_fn = keyword_embedding
+    return cache
+
+def test_semantic_hit_for_a_paraphrase(monkeypatch):
+    cache = semantic_cache(monkeypatch)
+    hit = roundtrip(cache, message="What is the capital of France?", lookup="Capital city of france, please")
+    assert hit == "4"
+    assert cache.stats()["semantic_hits"] == 1
+
+def test_semantic_miss_for_an_unrelated_prompt(monkeypatch):
+    cache = semantic_cache(monkeypatch)
+    assert roundtrip(cache, message="What is the capital of France?", lookup="How is the weather?") is None
+
+def test_semantic_tier_is_scoped_to_the_model(monkeypatch):
+    cache = semantic_cache(monkeypatch)
+
+    async def scenario():
+        await cache.store(IDENTITY, "What is the capital of France?", [], "Paris")
+        return await cache.lookup(dict(IDENTITY, model="other"), "Capital city of france, please", [])
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,77 @@
+"""
+Sandbox result cache: hits are served without queue capacity, and cache
+keys follow a re-pushed image tag.
+
+    python -m pytest tests/test_sandbox_cache.py
+"""
+import asyncio
+
+from app.sandbox.executor import SandboxExecutor
+from app.sandbox.docker_backend import DockerBackend
+from app.sandbox.queue import QueueFullError, SandboxJobQueue
+from tests.fake_docker import FakeDockerClient, FakeImage
+
+class RetaggedImages:
+    """Images where every lookup of a tag may find a newly pushed image."""
+
+    def __init__(self):
+        self.pushes = 0
+        self.lookups = 0
+
+    def get(self, reference: str) -> FakeImage:
+        self.lookups += 1
+        return FakeImage(f"{reference}#{self.pushes}")
+
+def backend_with_images(monkeypatch, ttl: str) -> DockerBackend:
+    monkeypatch.setenv("SANDBOX_IMAGE_ID_TTL", ttl)
+    client = FakeDockerClient(start_latency=0)
+    client.images = RetaggedImages()
+    return DockerBackend(SandboxExecutor(backend="process").configs, client=client)
+
+def test_image_id_is_memoized_within_the_ttl(monkeypatch):
+    backend = backend_with_images(monkeypatch, "3600")
+    first = backend.image_id("python")
+    backend.client.images.pushes += 1
+    assert backend.image_id("python") == first
+    assert backend.client.images.lookups == 1
+
+def test_repushed_tag_is_seen_after_the_ttl(monkeypatch):
+    backend = backend_with_images(monkeypatch, "0")
+    first = backend.image_id("python")
+    backend.client.images.pushes += 1
+    assert backend.image_id("python") != first
+
+def test_digest_reference_is_never_looked_up_again(monkeypatch):
+    backend = backend_with_images(monkeypatch, "0")
+    backend.configs["python"]["image"] = "python@sha256:" + "0" * 64
+    backend.image_id("python")
+    backend.image_id("python")
+    assert backend.client.images.lookups == 1
+
+def test_cache_hit_needs_no_queue_capacity(monkeypatch, tmp_path):
+    monkeypatch.setenv("SANDBOX_PROCESS_INSECURE", "true")
+    monkeypatch.setenv("SANDBOX_CACHE_ENABLED", "true")
+    monkeypatch.setenv("SANDBOX_CACHE_DIR", str(tmp_path))
+    executor = SandboxExecutor(backend="process")
+    queue = SandboxJobQueue(executor)
+
+    async def scenario():
+        first = await queue.run("python", "print(6 * 7)")
+        # Full queue: anything that still needs a run is turned away
+        queue.max_queue_depth = 0
+        again = await queue.run("python", "print(6 * 7)")
+        try:
+            await queue.run("python", "print('not cached')")
+        except QueueFullError:
+            rejected = True
+        else:
+            rejected = False
+        return first, again, rejected
+
+    first, again, rejected = asyncio.run(scenario())
+    assert first["output"].strip() == "42" and not first.get("cached")
+    assert again["output"].strip() == "42" and again["cached"] is True
+    assert rejected
+    stats = executor.cache.stats()
+    # One lookup per run: the executor does not look a miss up a second time
+    assert stats["misses"] == 2 and stats["memory_hits"] == 1
@@ -0,0 +1,124 @@
+"""
+Pooled containers are reused across runs, so nothing one snippet leaves
+behind may reach the next:
+
+    python -m pytest tests/test_sandbox_pool.py
+"""
+import threading
+
+import pytest
+
+from app.sandbox.executor import SandboxExecutor
+from app.sandbox.docker_backend import DockerBackend
+from app.sandbox.limits import get_profile
+from app.sandbox.pool import PoolExhaustedError
+from tests.fake_docker import FakeDockerClient
+from tests.test_sandbox_stream import wait_gone
+
+# Leaves a background process running after the snippet itself exits
+ORPHAN = "import subprocess as s; print(s.Popen(['sleep', '60'], stdout=s.DEVNULL, stderr=s.DEVNULL).pid)"
+
+def build_executor() -> SandboxExecutor:
+    executor = SandboxExecutor(backend="docker")
+    executor.backend = DockerBackend(executor.configs, client=FakeDockerClient(start_latency=0))
+    return executor
+
+def idle(executor: SandboxExecutor) -> int:
+    return sum(executor.backend.pool.stats()["idle"].values())
+
+def test_clean_run_is_reused():
+    executor = build_executor()
+    assert executor.execute("python", "print('ok')", no_cache=True)["status"] == "success"
+    assert idle(executor) == 1
+    assert executor.execute("python", "print('ok')", no_cache=True)["warm"] is True
+    executor.backend.pool.shutdown()
+
+def test_leftover_process_is_killed_and_container_recycled():
+    executor = build_executor()
+    result = executor.execute("python", ORPHAN, no_cache=True)
+    assert result["status"] == "success"
+    assert wait_gone(int(result["output"].split()[0]))
+    assert idle(executor) == 0
+    executor.backend.pool.shutdown()
+
+def test_failed_run_recycles_container():
+    executor = build_executor()
+    assert executor.execute("python", "raise SystemExit(2)", no_cache=True)["exit_code"] == 2
+    assert idle(executor) == 0
+    executor.backend.pool.shutdown()
+
+def test_peak_memory_and_oom_come_from_cgroup_counters():
+    executor = build_executor()
+    first = executor.execute("python", "print('ok')", no_cache=True)
+    container = executor.backend.pool._idle[("python", first["profile"])][0].container
+
+    # This run raises the container's high-water mark, so the mark is its own peak
+    container.memory_peak = 64 * 1024 * 1024
+    usage = executor.execute("python", "print('ok')", no_cache=True)["usage"]
+    assert usage["peak_memory_bytes"] == 64 * 1024 * 1024
+    assert usage["peak_memory_source"] == "memory.peak"
+    assert usage["peak_memory_scope"] == "run"
+
+    # This one stays under it: the mark is only an upper bound left by an earlier run
+    usage = executor.execute("python", "print('ok')", no_cache=True)["usage"]
+    assert usage["peak_memory_scope"] == "container"
+
+    container.oom_kills = 1
+    result = executor.execute("python", "print('ok')", no_cache=True)
+    assert result["oom_killed"] is True
+    assert result["usage"]["oom_source"] == "memory.events"
+    executor.backend.pool.shutdown()
+
+def test_snippet_sigkill_is_not_an_oom():
+    executor = build_executor()
+    result = executor.execute("bash", "kill -9 $$", no_cache=True)
+    assert result["exit_code"] == 137
+    assert result["oom_killed"] is False
+    executor.backend.pool.shutdown()
+
+def build_pool(monkeypatch, max_live: int) -> SandboxExecutor:
+    monkeypatch.setenv("SANDBOX_POOL_MAX", str(max_live))
+    monkeypatch.setenv("SANDBOX_POOL_ACQUIRE_TIMEOUT", "0.2")
+    return build_executor()
+
+def test_live_containers_are_capped(monkeypatch):
+    executor = build_pool(monkeypatch, 2)
+    pool = executor.backend.pool
+    profile = get_profile(None)
+    held = [pool.acquire("python", profile)[0] for _ in range(2)]
+
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire("python", profile)
+    # Tool workers draw on the same budget
+    with pytest.raises(PoolExhaustedError):
+        executor.backend.spawn("python", ["sleep", "60"], profile)
+    assert executor.execute("python", "print('ok')", no_cache=True)["status"] == "error"
+    assert pool.stats()["counters"]["exhausted"] == 3
+
+    # A release wakes up a waiting acquire
+    threading.Timer(0.05, pool.release, args=(held.pop(),)).start()
+    held.append(pool.acquire("python", profile)[0])
+    assert pool.stats()["live"] == 2
+    for pc in held:
+        pool.release(pc)
+    pool.shutdown()
+    assert pool.stats()["live"] == 0
+
+def test_idle_containers_make_room_at_the_cap(monkeypatch):
+    executor = build_pool(monkeypatch, 1)
+    pool = executor.backend.pool
+    assert executor.execute("python", "print('ok')", no_cache=True)["status"] == "success"
+    assert idle(executor) == 1
+
+    # Warming never pushes past the cap
+    pool.warm("javascript", get_profile(None), count=2)
+    assert pool.stats()["live"] == 1
+
+    # The idle python container is removed to make room for a worker
+    pool.claim()
+    assert idle(executor) == 0
+    assert pool.stats()["live"] == 1
+    assert pool.stats()["counters"]["evicted"] == 1
+    pool.unclaim()
+    assert pool.stats()["live"] == 0
+    pool.shutdown()
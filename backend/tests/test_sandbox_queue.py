@@ -0,0 +1,87 @@
+"""
+Sandbox queue batches: results come back per item and in input order, and
+every item counts against the queue depth.
+
+    python -m pytest tests/test_sandbox_queue.py
+"""
+import asyncio
+
+import pytest
+
+from app.sandbox.executor import SandboxExecutor
+from app.sandbox.queue import QueueFullError, SandboxJobQueue
+
+@pytest.fixture
+def queue(monkeypatch) -> SandboxJobQueue:
+    monkeypatch.setenv("SANDBOX_PROCESS_INSECURE", "true")
+    monkeypatch.setenv("SANDBOX_CACHE_ENABLED", "false")
+    return SandboxJobQueue(SandboxExecutor(backend="process"))
+
+def test_batch_keeps_input_order_and_reports_each_item(queue):
+    items = [
+        ("python", "print('first')", {}),
+        ("cobol", "DISPLAY 'HI'.", {}),
+        ("python", "raise SystemExit(3)", {}),
+        ("bash", "echo fourth", {}),
+        ("python", "print('fifth')", {}),
+    ]
+    results = asyncio.run(queue.run_batch(items))
+
+    assert len(results) == len(items)
+    assert results[0]["output"].strip() == "first"
+    assert results[1]["status"] == "error" and "cobol" in results[1]["output"].lower()
+    assert results[2]["exit_code"] == 3
+    # A failed item neither stops nor leaks into the ones after it
+    assert results[3]["output"].strip() == "fourth"
+    assert results[4]["output"].strip() == "fifth" and results[4]["status"] == "success"
+    assert queue.stats()["pending"] == 0
+
+def test_many_items_split_across_workers_stay_in_order(queue):
+    queue.max_per_language = 3
+    items = [("python", f"print({i})", {}) for i in range(12)]
+    results = asyncio.run(queue.run_batch(items))
+    assert [int(r["output"]) for r in results] == list(range(12))
+
+def test_each_batch_item_takes_queue_capacity(queue):
+    queue.max_queue_depth = 4
+    slow = [("python", "import time; time.sleep(0.3)", {})] * 3
+
+    async def scenario():
+        batch = asyncio.create_task(queue.run_batch(slow))
+        await asyncio.sleep(0.1)
+        pending = queue.stats()["pending"]
+        # One slot is left: a single run fits, a second batch of two does not
+        with pytest.raises(QueueFullError):
+            await queue.run_batch(slow[:2])
+        single = await queue.run("python", "print('fits')")
+        await batch
+        return pending, single
+
+    pending, single = asyncio.run(scenario())
+    assert pending == 3
+    assert single["output"].strip() == "fits"
+    assert queue.stats()["pending"] == 0
+
+def test_batch_deeper_than_the_queue_is_a_bad_request(queue):
+    queue.max_queue_depth = 2
+    with pytest.raises(ValueError):
+        asyncio.run(queue.run_batch([("python", "print(1)", {})] * 3))
+    assert queue.stats()["rejected"] == 0
+
+def test_expired_jobs_are_pruned_on_lookup(queue):
+    queue.job_ttl = 60
+
+    async def scenario():
+        job = queue.submit("python", "print('done')")
+        while job.finished_at is None:
+            await asyncio.sleep(0.01)
+        return job
+
+    job = asyncio.run(scenario())
+    assert queue.get(job.id) is job
+    assert queue.stats()["jobs"] == 1
+
+    # Nothing else is submitted: polling alone must drop the expired job
+    queue._finished[job.id] = job.finished_at = job.finished_at - 120
+    assert queue.get(job.id) is None
+    assert queue.stats()["jobs"] == 0
@@ -0,0 +1,81 @@
+"""
+Sandbox queue slots: a client that drops a /sandbox/run/stream connection
+mid-run must not leave the snippet running or hold a slot, and unsupported
+languages must not get a slot of their own:
+
+    python -m pytest tests/test_sandbox_stream.py
+"""
+import os
+import time
+import asyncio
+
+from app.sandbox.executor import SandboxExecutor
+from app.sandbox.docker_backend import DockerBackend
+from app.sandbox.queue import SandboxJobQueue
+from tests.fake_docker import FakeDockerClient
+
+# Reports its pid, then would run far past the test unless it is killed
+SNIPPET = "import os, time; print(os.getpid(), flush=True); time.sleep(60)"
+
+def alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # A zombie has already exited; it is just waiting for its parent to reap it
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+def wait_gone(pid: int, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not alive(pid):
+            return True
+        time.sleep(0.05)
+    return False
+
+async def disconnect_after_first_chunk(queue: SandboxJobQueue) -> int:
+    stream = queue.stream("python", SNIPPET)
+    event = await stream.__anext__()
+    assert event["type"] == "stdout"
+    # What Starlette does when the client goes away
+    await stream.aclose()
+    return int(event["data"].split()[0])
+
+def test_disconnect_kills_process_run(monkeypatch):
+    monkeypatch.setenv("SANDBOX_PROCESS_INSECURE", "true")
+    queue = SandboxJobQueue(SandboxExecutor(backend="process"))
+    start = time.monotonic()
+    pid = asyncio.run(disconnect_after_first_chunk(queue))
+
+    assert wait_gone(pid)
+    assert time.monotonic() - start < 10
+    stats = queue.stats()
+    assert stats["running"] == 0 and stats["pending"] == 0
+
+def test_disconnect_kills_docker_run_and_drops_container():
+    executor = SandboxExecutor(backend="docker")
+    executor.backend = DockerBackend(executor.configs, client=FakeDockerClient())
+    queue = SandboxJobQueue(executor)
+    pid = asyncio.run(disconnect_after_first_chunk(queue))
+
+    assert wait_gone(pid)
+    stats = queue.stats()
+    assert stats["running"] == 0 and stats["pending"] == 0
+    # The container was dirty, so it was discarded instead of going back to the pool
+    assert sum(executor.backend.pool.stats()["idle"].values()) == 0
+    executor.backend.pool.shutdown()
+
+def test_unknown_languages_do_not_grow_the_slot_table(monkeypatch):
+    monkeypatch.setenv("SANDBOX_PROCESS_INSECURE", "true")
+    queue = SandboxJobQueue(SandboxExecutor(backend="process"))
+
+    async def scenario():
+        results = [await queue.run(f"lang{i}", "print(1)") for i in range(50)]
+        events = [event async for event in queue.stream("cobol", "DISPLAY 1")]
+        return results, events
+
+    results, events = asyncio.run(scenario())
+    assert all(r["status"] == "error" and "not supported" in r["output"] for r in results)
+    assert events[0]["type"] == "error"
+    assert queue._per_language == {}
+    assert queue.stats()["pending"] == 0
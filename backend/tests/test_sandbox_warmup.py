@@ -0,0 +1,67 @@
+"""
+Readiness and retry behaviour of the sandbox warmup:
+
+    python -m pytest tests/test_sandbox_warmup.py
+"""
+import pytest
+
+from app.sandbox.warmup import SandboxWarmup
+
+class FlakyBackend:
+    """Fails the first `failures` prepare() calls, like a registry hiccup."""
+    name = "flaky"
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.prepares = 0
+
+    def unavailable_reason(self):
+        return None
+
+    def prepare(self, language):
+        self.prepares += 1
+        if self.prepares <= self.failures:
+            raise RuntimeError("pull failed")
+        return {"image_id": "sha256:test"}
+
+    def prewarm(self, language, profile):
+        pass
+
+class StubExecutor:
+    configs = {"python": {}, "bash": {}}
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def execute(self, language, code, no_cache=False):
+        return {"status": "success", "output": "ok\n"}
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setenv("SANDBOX_WARMUP_BACKOFF", "0")
+    monkeypatch.setenv("SANDBOX_WARMUP_LANGUAGES", "python")
+
+def test_disabled_warmup_is_ready(monkeypatch):
+    monkeypatch.setenv("SANDBOX_WARMUP", "false")
+    warmup = SandboxWarmup(StubExecutor(FlakyBackend(0)))
+    assert warmup.ready
+    assert warmup.status()["state"] == "disabled"
+
+def test_unknown_language_fails_at_startup(monkeypatch):
+    monkeypatch.setenv("SANDBOX_WARMUP_LANGUAGES", "python, cobol")
+    with pytest.raises(ValueError, match="cobol"):
+        SandboxWarmup(StubExecutor(FlakyBackend(0)))
+
+def test_failed_pull_is_retried():
+    backend = FlakyBackend(2)
+    warmup = SandboxWarmup(StubExecutor(backend))
+    warmup.run()
+    assert warmup.ready
+    assert warmup.results["python"]["attempts"] == 3
+
+def test_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setenv("SANDBOX_WARMUP_MAX_ATTEMPTS", "2")
+    warmup = SandboxWarmup(StubExecutor(FlakyBackend(5)))
+    warmup.run()
+    assert warmup.state == "failed" and not warmup.ready
+    assert warmup.results["python"] == {"ready": False, "error": "pull failed", "attempts": 2}
@@ -0,0 +1,140 @@
+"""
+LLM scheduler: token buckets, AIMD concurrency and per-call retries.
+
+    python -m pytest tests/test_scheduler.py
+"""
+import asyncio
+import types
+
+import pytest
+
+from app.agent import scheduler as scheduler_module
+from app.agent.scheduler import LLMScheduler, ProviderLimiter, TokenBucket
+
+class FakeClock:
+    """Stands in for time.monotonic and asyncio.sleep so waits take no real time."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(scheduler_module.asyncio, "sleep", clock.sleep)
+    return clock
+
+class RateLimited(Exception):
+    status_code = 429
+
+class BadRequest(Exception):
+    status_code = 400
+
+def test_bucket_waits_for_refill(clock):
+    bucket = TokenBucket(60) # one per second
+
+    async def take():
+        await bucket.take(60)
+        start = clock.now
+        await bucket.take(30)
+        return clock.now - start
+
+    assert asyncio.run(take()) == pytest.approx(30)
+    assert bucket.waits == 1
+
+def test_oversized_request_only_needs_a_full_bucket(clock):
+    bucket = TokenBucket(60)
+    asyncio.run(bucket.take(10_000))
+    assert clock.slept == []
+    assert bucket.level == 0
+
+def test_zero_rate_is_unlimited(clock):
+    bucket = TokenBucket(0)
+    asyncio.run(bucket.take(10 ** 9))
+    assert clock.slept == []
+
+def test_aimd_adds_on_success_and_halves_once_per_burst(clock, monkeypatch):
+    monkeypatch.setenv("LLM_CONCURRENCY_INITIAL", "4")
+    monkeypatch.setenv("LLM_CONCURRENCY_COOLDOWN", "1.0")
+    limiter = ProviderLimiter("fake", "aimd")
+
+    async def scenario():
+        await limiter.acquire(0)
+        await limiter.release(0.1, "ok")
+        after_success = limiter.limit
+        # A burst of 429s inside the cooldown counts once
+        for _ in range(3):
+            await limiter.acquire(0)
+            await limiter.release(0.1, "throttled")
+        after_burst = limiter.limit
+        clock.now += 2
+        await limiter.acquire(0)
+        await limiter.release(0.1, "throttled")
+        return after_success, after_burst, limiter.limit
+
+    after_success, after_burst, after_second = asyncio.run(scenario())
+    assert after_success == pytest.approx(4.25)
+    assert after_burst == pytest.approx(4.25 / 2)
+    assert after_second == pytest.approx(4.25 / 4)
+    assert limiter.inflight == 0
+
+def test_slow_calls_trim_concurrency(clock, monkeypatch):
+    monkeypatch.setenv("LLM_CONCURRENCY_INITIAL", "10")
+    monkeypatch.setenv("LLM_LATENCY_TARGET_MS", "500")
+    limiter = ProviderLimiter("fake", "latency")
+
+    async def scenario():
+        await limiter.acquire(0)
+        await limiter.release(2.0, "ok")
+
+    asyncio.run(scenario())
+    assert limiter.limit == pytest.approx(9)
+
+def test_run_retries_throttled_calls(clock):
+    scheduler = LLMScheduler()
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimited()
+        return "ok"
+
+    assert asyncio.run(scheduler.run("fake", "retry", call)) == "ok"
+    assert len(attempts) == 3
+    assert scheduler.retries == 2
+    assert scheduler.limiter("fake", "retry").stats()["throttled"] == 2
+
+def test_run_does_not_retry_client_errors(clock):
+    scheduler = LLMScheduler()
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        raise BadRequest()
+
+    with pytest.raises(BadRequest):
+        asyncio.run(scheduler.run("fake", "no-retry", call))
+    assert len(attempts) == 1
+
+def test_fake_model_rate_limits_are_retried_per_call(clock, monkeypatch):
+    pytest.importorskip("langchain_core")
+    from app.agent.fake_llm import FakeChatModel, FakeRateLimitError
+
+    monkeypatch.setenv("FAKE_LLM_RATE_LIMIT_RATE", "1")
+    model = FakeChatModel(model_name="always-429")
+    scheduler = LLMScheduler()
+    scheduler.max_retries = 2
+
+    with pytest.raises(FakeRateLimitError):
+        asyncio.run(scheduler.run("fake", "always-429", lambda: model.ainvoke("hi")))
+    assert scheduler.retries == 2
+    assert scheduler.limiter("fake", "always-429").stats()["throttled"] == 3
@@ -0,0 +1,138 @@
+"""
+Chat session history: schema migration, the token-budgeted window and
+summaries persisted next to the chat logs.
+
+    python -m pytest tests/test_session_history.py
+"""
+import os
+import json
+import uuid
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+# app.db.session builds its engine at import; these tests bring their own database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import ChatLog, ChatSummary, migrate
+from app.memory import history as history_module
+from app.memory.history import SessionHistory
+from app.observability.costs import count_tokens
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    """A fresh SQLite database behind history's get_db."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    migrate(engine)
+    Session = sessionmaker(bind=engine)
+
+    def get_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    monkeypatch.setattr(history_module, "get_db", get_db)
+    return Session
+
+@pytest.fixture
+def fake_summarizer(monkeypatch, tmp_path):
+    """Routes summaries to the fake provider under a model name no other test shares."""
+    script = tmp_path / "script.json"
+    script.write_text(json.dumps([{"match": "Update the running summary", "response": "Alice is planning a trip to Rome."}]))
+    monkeypatch.setenv("FAKE_LLM_SCRIPT", str(script))
+    monkeypatch.setenv("LLM_PROVIDER_OVERRIDE", "fake")
+    return f"summarizer-{uuid.uuid4().hex[:8]}"
+
+def log(Session, session_id: str, role: str, content: str) -> int:
+    with Session() as session:
+        row = ChatLog(session_id=session_id, role=role, content=content, provider="fake", model="test")
+        session.add(row)
+        session.commit()
+        return row.id
+
+def test_migrate_adds_session_column_to_an_old_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE chat_logs (id INTEGER PRIMARY KEY, role VARCHAR, content TEXT, "
+                          "provider VARCHAR, model VARCHAR, timestamp DATETIME)"))
+        conn.execute(text("INSERT INTO chat_logs (role, content) VALUES ('user', 'hello')"))
+
+    migrate(engine)
+    migrate(engine) # a second start must be a no-op
+
+    inspector = inspect(engine)
+    assert "session_id" in {c["name"] for c in inspector.get_columns("chat_logs")}
+    assert "ix_chat_logs_session_id" in {i["name"] for i in inspector.get_indexes("chat_logs")}
+    assert "chat_summaries" in inspector.get_table_names()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT content FROM chat_logs")).scalar() == "hello"
+
+def test_window_loads_the_session_from_the_logs(db):
+    session_id = str(uuid.uuid4())
+    log(db, session_id, "user", "Hi, I am Alice")
+    log(db, session_id, "assistant", "Hello Alice")
+    log(db, "someone-else", "user", "Unrelated")
+
+    window = asyncio.run(SessionHistory().window(session_id))
+    assert window == [{"role": "user", "content": "Hi, I am Alice"}, {"role": "assistant", "content": "Hello Alice"}]
+
+def test_summary_is_persisted_and_used_after_a_reload(db, fake_summarizer, monkeypatch):
+    monkeypatch.setenv("CHAT_HISTORY_TOKEN_BUDGET", "60")
+    history = SessionHistory()
+    session_id = str(uuid.uuid4())
+    history.start(session_id)
+
+    async def converse():
+        for i in range(6):
+            user, reply = f"Question {i}: " + "travel " * 10, f"Answer {i}: " + "plans " * 10
+            await history.window(session_id)
+            history.append(session_id, "user", user, log(db, session_id, "user", user))
+            history.append(session_id, "assistant", reply, log(db, session_id, "assistant", reply))
+            history.schedule_summary(session_id, "fake", fake_summarizer)
+            await asyncio.gather(*history._tasks)
+
+    asyncio.run(converse())
+    assert history.stats()["summaries"] >= 1
+
+    with db() as session:
+        saved = session.get(ChatSummary, session_id)
+    assert saved.summary == "Alice is planning a trip to Rome."
+    assert saved.through_id is not None
+
+    # A new worker (empty cache) starts from the saved summary and only the turns after it
+    window = asyncio.run(SessionHistory().window(session_id))
+    assert window[0] == {"role": "system", "content": "Summary of the earlier conversation:\nAlice is planning a trip to Rome."}
+    assert "Question 0" not in json.dumps(window)
+    assert window[-1]["content"].startswith("Answer 5")
+
+def turns(history: SessionHistory, session_id: str, *contents: str):
+    for i, content in enumerate(contents):
+        history.append(session_id, "user" if i % 2 == 0 else "assistant", content)
+
+def test_window_stays_within_budget_while_no_summary_is_written(monkeypatch):
+    monkeypatch.setenv("CHAT_HISTORY_TOKEN_BUDGET", "50")
+    history = SessionHistory()
+    history.start("s")
+    # Nothing is summarized (no schedule_summary), so only the budget keeps the window small
+    turns(history, "s", *[f"turn {i} " + "word " * 8 for i in range(40)])
+
+    window = asyncio.run(history.window("s"))
+    assert sum(count_tokens(m["content"]) for m in window) <= 50
+    assert window[-1]["content"].startswith("turn 39")
+
+def test_window_starts_on_a_user_turn(monkeypatch):
+    monkeypatch.setenv("CHAT_HISTORY_TOKEN_BUDGET", "40")
+    history = SessionHistory()
+    history.start("s")
+    # The long question does not fit, but its short answer would on its own
+    turns(history, "s", "question " * 50, "short answer", "next question", "next answer")
+
+    window = asyncio.run(history.window("s"))
+    assert [m["content"] for m in window] == ["next question", "next answer"]
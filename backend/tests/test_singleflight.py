@@ -0,0 +1,120 @@
+"""
+Request coalescing: identical concurrent calls share one upstream request,
+and the upstream call is cancelled only when its last waiter goes away.
+
+    python -m pytest tests/test_singleflight.py
+"""
+import asyncio
+
+import pytest
+
+from app.agent.singleflight import SingleFlight
+
+class Upstream:
+    """An LLM call that blocks until released, counting starts and cancellations."""
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        try:
+            await self.release.wait()
+            return "answer"
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        callers = [asyncio.create_task(flights.do("k", upstream)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return await asyncio.gather(*callers), upstream, flights
+
+    results, upstream, flights = asyncio.run(scenario())
+    assert results == ["answer"] * 3
+    assert upstream.calls == 1
+    assert flights.stats()["leaders"] == 1 and flights.stats()["coalesced"] == 2
+    assert flights.stats()["in_flight"] == 0
+
+def test_cancelled_leader_does_not_cancel_other_waiters():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        leader = asyncio.create_task(flights.do("k", upstream))
+        follower = asyncio.create_task(flights.do("k", upstream))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower, upstream, flights
+
+    result, upstream, flights = asyncio.run(scenario())
+    assert result == "answer"
+    assert upstream.cancelled == 0
+    assert flights.stats()["cancelled"] == 0
+
+def test_last_waiter_cancels_upstream():
+    async def scenario():
+        flights, upstream = SingleFlight(), Upstream()
+        callers = [asyncio.create_task(flights.do("k", upstream)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        # A new caller after that starts a fresh flight rather than joining the dead one
+        upstream.release.set()
+        again = await flights.do("k", upstream)
+        return again, upstream, flights
+
+    again, upstream, flights = asyncio.run(scenario())
+    assert upstream.cancelled == 1
+    assert again == "answer" and upstream.calls == 2
+    assert flights.stats()["cancelled"] == 1
+    assert flights.stats()["in_flight"] == 0
+
+def test_only_deterministic_calls_are_shared(monkeypatch):
+    monkeypatch.setenv("LLM_COALESCE_MAX_TEMPERATURE", "0.0")
+    flights = SingleFlight()
+    assert flights.applies({"temperature": 0.0})
+    assert not flights.applies({"temperature": 0.7})
+
+def test_call_options_are_part_of_the_key():
+    identity = {"provider": "fake", "model": "m", "temperature": 0.0, "tools": []}
+    base = SingleFlight.make_key(identity, "hi", [])
+    assert SingleFlight.make_key(identity, "hi", [], use_cache=False) != base
+    assert SingleFlight.make_key(identity, "hi", [], json_mode=True) != base
+    assert SingleFlight.make_key(identity, "hi", [], use_cache=True, json_mode=False) == base
+
+def test_agent_does_not_share_calls_with_different_options(monkeypatch):
+    pytest.importorskip("langchain_core")
+    from app.agent.core import Agent
+
+    monkeypatch.setenv("LLM_PROVIDER_OVERRIDE", "fake")
+    agent = Agent(model_name="singleflight-options", temperature=0.0)
+    calls = []
+
+    async def generate(message, history, json_mode=False):
+        calls.append(json_mode)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    monkeypatch.setattr(agent, "_generate", generate)
+
+    async def scenario():
+        await asyncio.gather(
+            agent.chat("hi", use_cache=False),
+            agent.chat("hi", use_cache=False),
+            agent.chat("hi", use_cache=False, json_mode=True),
+            agent.chat("hi", use_cache=False, cache_if=lambda reply: True),
+        )
+
+    asyncio.run(scenario())
+    # The two plain calls share one; json_mode and cache_if each get their own
+    assert sorted(calls) == [False, False, True]
@@ -0,0 +1,148 @@
+"""
+Supervisor decisions: parsing, the repair path for malformed replies (against
+the fake provider) and the bounded step history.
+
+    python -m pytest tests/test_supervisor.py
+"""
+import json
+import uuid
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("pydantic")
+
+from app.agent.response_cache import response_cache
+from app.agent.supervisor import SupervisorAgent, SupervisorContext, parse_decision
+from app.observability.costs import count_tokens
+from app.observability.tracer import tracer
+
+TEAM = ["researcher", "writer"]
+
+def test_parse_plain_and_fenced_decisions():
+    assert parse_decision('{"next_agent_id": "writer", "instruction": "Draft it"}', TEAM).next_agent_id == "writer"
+    fenced = 'Sure:\n```json\n{"next_agent_id": "FINISH", "instruction": "Done"}\n```'
+    assert parse_decision(fenced, TEAM).next_agent_id == "FINISH"
+
+def test_parse_delegations():
+    raw = json.dumps({"delegations": [{"agent_id": "researcher", "instruction": "a"}, {"agent_id": "writer", "instruction": "b"}]})
+    assert [d.agent_id for d in parse_decision(raw, TEAM).delegations] == TEAM
+
+@pytest.mark.parametrize("raw, error", [
+    ("I think the writer should go next.", "no JSON object"),
+    ('{"next_agent_id": "writer", ', "no JSON object"),
+    ('{"instruction": "something"}', "next_agent_id"),
+    ('{"next_agent_id": "editor"}', "Unknown agent IDs"),
+    ('{"delegations": [{"agent_id": "editor"}]}', "Unknown agent IDs"),
+])
+def test_parse_rejects_unusable_replies(raw, error):
+    with pytest.raises(ValueError, match=error):
+        parse_decision(raw, TEAM)
+
+def supervisor(monkeypatch, tmp_path, rules) -> SupervisorAgent:
+    """A supervisor on the fake provider, scripted by `rules`, with a model name no other test shares."""
+    script = tmp_path / "script.json"
+    script.write_text(json.dumps(rules))
+    monkeypatch.setenv("FAKE_LLM_SCRIPT", str(script))
+    monkeypatch.setenv("LLM_PROVIDER_OVERRIDE", "fake")
+    return SupervisorAgent(model_name=f"supervisor-{uuid.uuid4().hex[:8]}")
+
+VALID = '{{"next_agent_id": "writer", "instruction": "Write it up", "reasoning": "Research is done"}}'
+
+def decide(agent: SupervisorAgent, context: str = "History:\n"):
+    span = tracer.start_trace("supervisor_test")
+    return asyncio.run(agent._decide("Team: researcher, writer", context, TEAM, span)), span
+
+def test_malformed_reply_is_repaired_and_not_cached(monkeypatch, tmp_path):
+    agent = supervisor(monkeypatch, tmp_path, [
+        {"match": "not a valid decision", "response": VALID},
+        {"match": "What is the next step", "response": "The writer, I suppose."},
+    ])
+    repairs = tracer.counters.get("supervisor_repairs", 0)
+    decision, span = decide(agent)
+
+    assert decision.next_agent_id == "writer"
+    assert tracer.counters["supervisor_repairs"] == repairs + 1
+    assert span.attributes["repairs"] == 1
+    # The malformed first reply must not be replayed from the cache on the next identical step
+    identity = dict(agent.supervisor_model.cache_identity(), json_mode=True)
+    cached = asyncio.run(response_cache.lookup(identity, "History:\n\n\nWhat is the next step?",
+                                               [{"role": "system", "content": "Team: researcher, writer"}]))
+    assert cached is None
+
+def test_valid_reply_needs_no_repair(monkeypatch, tmp_path):
+    agent = supervisor(monkeypatch, tmp_path, [{"match": "What is the next step", "response": VALID}])
+    decision, span = decide(agent)
+    assert decision.instruction == "Write it up"
+    assert "repairs" not in span.attributes
+
+def test_gives_up_after_repair_retries(monkeypatch, tmp_path):
+    monkeypatch.setenv("SUPERVISOR_REPAIR_RETRIES", "1")
+    agent = supervisor(monkeypatch, tmp_path, [{"match": ".", "response": '{{"next_agent_id": "editor"}}'}])
+    with pytest.raises(ValueError, match="after 1 repairs"):
+        decide(agent)
+
+def record(step: int, output: str):
+    return {"step": step, "agent": "researcher", "output": output}
+
+def test_context_keeps_recent_steps_in_full():
+    context = SupervisorContext(token_budget=10_000, recent_steps=2, digest_chars=20)
+    for step in range(1, 5):
+        context.add(record(step, f"finding number {step} " * 10))
+    rendered = context.render()
+
+    assert "Earlier steps (summarized):" in rendered
+    assert rendered.count("finding number 4") == 10
+    # Step 1 survives only as a digest of at most digest_chars characters
+    assert "Step 1 - Agent researcher: finding number 1 fin\n" in rendered
+    assert context.omitted == 0
+
+def test_context_stays_within_budget():
+    context = SupervisorContext(token_budget=300, recent_steps=3, digest_chars=80)
+    for step in range(1, 41):
+        context.add(record(step, f"step {step} output " * 30))
+        assert context.tokens <= 300
+    rendered = context.render()
+
+    assert context.omitted > 0
+    assert f"({context.omitted} earlier steps omitted)" in rendered
+    assert "Step 40 - Agent researcher:" in rendered
+    # The running count matches what is actually rendered, give or take the headers
+    assert abs(count_tokens(rendered) - context.tokens) < 30
+
+def test_single_huge_output_is_truncated():
+    context = SupervisorContext(token_budget=200, recent_steps=3, digest_chars=80)
+    context.add(record(1, "x" * 100_000))
+    assert len(context.render()) < 1_000
+
+def test_delegations_run_in_parallel_and_all_reach_the_context(monkeypatch):
+    from tests.test_orchestrator import StubAgents
+    # The fake supervisor delegates to the whole team twice, then finishes
+    monkeypatch.setenv("LLM_PROVIDER_OVERRIDE", "fake")
+    monkeypatch.setenv("FAKE_LLM_SUPERVISOR_FANOUT", "0")
+    monkeypatch.setenv("FAKE_LLM_SUPERVISOR_STEPS", "2")
+    monkeypatch.setenv("SUPERVISOR_MAX_PARALLEL", "3")
+    stubs = StubAgents()
+    team = [stubs.add(f"fanout-{name}", f"{name} findings", delay=0.1) for name in ("alpha", "beta", "gamma", "delta")]
+    resolved = []
+
+    def worker(self, agent_def):
+        resolved.append(agent_def.id)
+        return stubs.agent(agent_def)
+
+    monkeypatch.setattr(SupervisorAgent, "_worker", worker)
+    agent = SupervisorAgent(model_name=f"supervisor-{uuid.uuid4().hex[:8]}")
+    result = asyncio.run(agent.run("Survey the field", team))
+
+    assert [s["step"] for s in result["steps"]] == [1] * 4 + [2] * 4
+    assert all(s["status"] == "completed" for s in result["steps"])
+    assert result["final_output"] == "Final answer after 2 steps."
+    # Four workers at once would exceed SUPERVISOR_MAX_PARALLEL
+    assert stubs.peak == 3
+    # Each worker is resolved once per run, not once per delegation
+    assert sorted(resolved) == sorted(team)
+    # Every output of the first fan-out was folded into the context the second round saw
+    second_round = stubs.prompts["fanout-alpha"][1]
+    for name in ("alpha", "beta", "gamma", "delta"):
+        assert f"Step 1 - Agent fanout-{name}:\n{name} findings" in second_round
@@ -0,0 +1,63 @@
+"""
+Persistent tool workers on the process backend: the frame stream survives
+anything the tool writes, and an idle sweep never kills a worker mid-call.
+
+    python -m pytest tests/test_tool_workers.py
+"""
+import time
+import threading
+
+import pytest
+
+from app.sandbox.executor import SandboxExecutor
+from app.sandbox.workers import ToolWorkerPool
+
+NOISY_TOOL = '''
+import os, sys, subprocess
+
+def run(x):
+    print("print goes to stderr")
+    sys.__stdout__.write("so does the original sys.stdout\\n")
+    os.write(1, b"\\x00\\x00\\x00\\x05junk")
+    subprocess.run(["echo", "child output"])
+    return x * 2
+'''
+
+SLOW_TOOL = '''
+import time
+
+def run(seconds):
+    time.sleep(seconds)
+    return "done"
+'''
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setenv("SANDBOX_PROCESS_INSECURE", "true")
+    monkeypatch.setenv("SANDBOX_TOOL_WORKER_IDLE_TIMEOUT", "0")
+    pool = ToolWorkerPool(SandboxExecutor(backend="process"))
+    yield pool
+    pool.shutdown()
+
+def test_tool_output_cannot_corrupt_frames(pool):
+    pool.register("noisy", NOISY_TOOL)
+    assert pool.call("noisy", [21]) == 42
+    # The same worker answers the next call, so the stream is still in sync
+    assert pool.call("noisy", {"x": 5}) == 10
+    assert pool.stats()["restarts"] == 0
+
+def test_idle_sweep_skips_workers_in_a_call(pool):
+    pool.register("slow", SLOW_TOOL)
+    results = []
+    caller = threading.Thread(target=lambda: results.append(pool.call("slow", [1.0])))
+    caller.start()
+    while "slow" not in pool.stats()["workers"]:
+        time.sleep(0.01)
+    # With a zero idle timeout every worker that is not in use is due for eviction
+    pool.evict_idle()
+    caller.join()
+
+    assert results == ["done"]
+    assert pool.stats()["evicted"] == 0 and pool.stats()["restarts"] == 0
+    pool.evict_idle()
+    assert pool.stats()["evicted"] == 1
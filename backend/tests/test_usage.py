@@ -0,0 +1,59 @@
+"""
+Token usage recorded on a span must add up over every LLM call in it:
+
+    python -m pytest tests/test_usage.py
+"""
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from app.agent.usage import UsageCollector, record_usage
+from app.observability.costs import PRICES, price_for
+from app.observability.tracer import tracer
+
+def collector(prompt: int, completion: int) -> UsageCollector:
+    c = UsageCollector()
+    c.prompt_tokens, c.completion_tokens, c.reported = prompt, completion, True
+    return c
+
+def test_two_calls_on_one_span_accumulate():
+    span = tracer.start_trace("two_calls")
+    with tracer.activate(span):
+        first = record_usage("openai", "gpt-4o", collector(100, 20), "", "")
+        second = record_usage("openai", "gpt-4o", collector(50, 10), "", "")
+
+    assert span.attributes["prompt_tokens"] == 150
+    assert span.attributes["completion_tokens"] == 30
+    assert span.attributes["llm_calls"] == 2
+    assert span.attributes["cost_usd"] == pytest.approx(first["cost_usd"] + second["cost_usd"])
+    assert span.attributes["model"] == "gpt-4o"
+
+def test_mixed_models_are_labelled():
+    span = tracer.start_trace("mixed")
+    with tracer.activate(span):
+        record_usage("openai", "gpt-4o", collector(10, 1), "", "")
+        record_usage("groq", "llama3-8b-8192", collector(10, 1), "", "")
+    assert span.attributes["provider"] == "mixed"
+    assert span.attributes["model"] == "mixed"
+
+@pytest.mark.parametrize("model, priced_as", [
+    ("gpt-4o", "gpt-4o"),
+    ("gpt-4o-2024-08-06", "gpt-4o"),
+    ("gpt-4o-mini-2024-07-18", "gpt-4o-mini"),
+    ("gpt-4-0613", "gpt-4"),
+    ("gpt-3.5-turbo-0125", "gpt-3.5-turbo"),
+    ("gemini-1.5-pro-002", "gemini-1.5-pro"),
+    ("llama3-8b-8192", "llama3-8b"),
+    ("gpt-4.1", None),
+    ("gpt-4o-realtime-preview", None),
+    ("gpt-4-32k", None),
+])
+def test_models_are_priced_by_name_not_prefix(model, priced_as):
+    assert price_for(model) == (PRICES[priced_as] if priced_as else None)
+
+def test_unknown_model_is_unpriced():
+    span = tracer.start_trace("unpriced")
+    with tracer.activate(span):
+        entry = record_usage("openai", "gpt-4.1", collector(10, 1), "", "")
+    assert entry["cost_usd"] is None
+    assert span.attributes["cost_usd"] is None
@@ -0,0 +1,97 @@
+"""
+Background workflow jobs: bounded event logs, bounded follower queues and
+expiry of finished jobs.
+
+    python -m pytest tests/test_workflow_jobs.py
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from app.agent.jobs import WorkflowJobQueue
+
+def make_queue(monkeypatch, **env) -> WorkflowJobQueue:
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return WorkflowJobQueue()
+
+def burst(count: int, release: asyncio.Event = None):
+    """A runner that publishes `count` step events in one go, optionally after `release`."""
+    async def runner(on_event):
+        if release is not None:
+            await release.wait()
+        for step in range(count):
+            on_event({"type": "step_finished", "step": step})
+        return {"steps": count}
+    return runner
+
+def test_event_outputs_are_clipped_but_the_result_is_not(monkeypatch):
+    jobs = make_queue(monkeypatch, WORKFLOW_EVENT_MAX_CHARS="100")
+    output = "x" * 10_000
+
+    async def runner(on_event):
+        on_event({"type": "step_finished", "step": 1, "output": output})
+        return {"output": output}
+
+    async def scenario():
+        job = jobs.submit("sequential", {}, runner)
+        await job.task
+        return job
+
+    job = asyncio.run(scenario())
+    step = next(e for e in job.events if e["type"] == "step_finished")
+    assert step["truncated"] is True
+    assert step["output"].startswith("x" * 100) and "9900 more chars" in step["output"]
+    assert job.result["output"] == output
+
+def test_event_log_keeps_only_the_newest_events(monkeypatch):
+    jobs = make_queue(monkeypatch, WORKFLOW_MAX_JOB_EVENTS="10")
+
+    async def scenario():
+        job = jobs.submit("sequential", {}, burst(50))
+        await job.task
+        return job
+
+    job = asyncio.run(scenario())
+    summary = job.to_dict(include_events=True)
+    # job_started + 50 steps + job_finished
+    assert job.published == 52
+    assert summary["events_dropped"] == 42
+    assert [e["seq"] for e in summary["events"]] == list(range(42, 52))
+    assert summary["events"][-1]["type"] == "job_finished"
+
+def test_slow_follower_catches_up_from_the_log(monkeypatch):
+    jobs = make_queue(monkeypatch, WORKFLOW_SUBSCRIBER_QUEUE_SIZE="4")
+
+    async def scenario():
+        release = asyncio.Event()
+        job = jobs.submit("sequential", {}, burst(100, release))
+        follower = jobs.events(job)
+        first = await follower.__anext__() # job_started; now subscribed
+        release.set()
+        await job.task # all 100 steps published while the follower was not reading
+        rest = [event async for event in follower]
+        return job, [first] + rest
+
+    job, seen = asyncio.run(scenario())
+    assert [e["seq"] for e in seen] == list(range(job.published))
+    assert seen[-1]["type"] == "job_finished"
+    assert not job._subscribers
+
+def test_finished_jobs_expire_on_lookup(monkeypatch):
+    jobs = make_queue(monkeypatch, WORKFLOW_JOB_TTL="0")
+
+    async def scenario():
+        done = jobs.submit("sequential", {}, burst(1))
+        await done.task
+        running = jobs.submit("sequential", {}, burst(1, asyncio.Event()))
+        await asyncio.sleep(0)
+        lookups = jobs.get(done.id), jobs.get(running.id)
+        running.task.cancel()
+        return lookups
+
+    expired, running = asyncio.run(scenario())
+    assert expired is None
+    assert running is not None